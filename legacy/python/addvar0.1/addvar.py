@@ -1,13 +1,208 @@
+"""
+Reconcile coherence vectors against deltas.
+
+reconcile() is the original stateless call: it summarises the vector it is
+given and records only that summary and the deltas, never the vector. Callers
+that keep a coherence set across calls use reconcile_incremental() (POST
+/reconcile/deltas in the API): ReconcileEngine holds the set, so each call only
+sends deltas.
+
+ReconcileEngine keeps the current coherence set keyed by id (in vector order)
+and applies `added` / `removed` / `changed` deltas in O(delta). Instead of
+rewriting the whole vector on every call, each applied delta is appended as one
+compact JSON line to a change log:
+
+    {"seq": 3, "at": "20250101T120000", "added": [...], "removed": ["id", ...], "changed": [...]}
+
+A record with "base" holds a full vector (written when the engine is seeded and
+whenever the log is compacted), so replaying the log from its last base record
+restores the state. Once more than `compact_every` change records follow the
+last base, the log is rewritten as a single base record. A torn last line (an
+interrupted append) is cut off on replay so later appends follow a whole record;
+a damaged record anywhere else raises ValueError, since the records after it
+would be applied to the wrong state.
+"""
 import json
+import os
 from datetime import datetime
 
+CHANGES_PATH = 'reconciliation_changes.jsonl'
+RESULT_PATH = 'reconciliation_result.json'
+COMPACT_EVERY = 1000
+
+
+def _now():
+    return datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+
+
+def _item_id(item):
+    """Deltas may carry whole items ({'id': ...}) or bare ids."""
+    return item['id'] if isinstance(item, dict) else item
+
+
+def _dumps(record):
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+
+
+class ReconcileEngine:
+    def __init__(self, path=CHANGES_PATH, compact_every=COMPACT_EVERY):
+        """
+        path: JSONL change log (None keeps the state in memory only); an existing
+        log is replayed so the engine resumes where it left off.
+        compact_every: change records after the last base before compacting.
+        """
+        self.path = path
+        self.compact_every = compact_every
+        self.items = {}  # id -> item, in coherence-vector order
+        self.seq = 0
+        self._since_base = 0
+        self.seeded = False
+        if path and os.path.exists(path):
+            self._replay()
+
+    def _replay(self):
+        with open(self.path, 'rb') as f:
+            lines = f.read().split(b'\n')
+        # after the final newline: b'' normally, the torn tail of an interrupted append otherwise
+        torn = lines.pop()
+        good = 0  # offset just past the last whole record
+        for n, line in enumerate(lines, 1):
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    if n < len(lines) or torn:
+                        raise ValueError(f'{self.path}: corrupt change record on line {n}')
+                    torn = line  # the newline made it to disk but the record is damaged
+                    break
+                if 'base' in record:
+                    self.items = {item['id']: item for item in record['base']}
+                    self.seeded = True
+                    self._since_base = 0
+                else:
+                    self._apply(record)
+                    self._since_base += 1
+                self.seq = record.get('seq', self.seq)
+            good += len(line) + 1
+        if torn:
+            # drop it, or the next append would follow the torn bytes and never replay
+            try:
+                with open(self.path, 'r+b') as f:
+                    f.truncate(good)
+            except OSError:
+                self.path = None
+
+    def __len__(self):
+        return len(self.items)
+
+    def top_ids(self):
+        return list(self.items)
+
+    def vector(self):
+        return list(self.items.values())
+
+    def seed(self, coherence_vector):
+        """Replace the state with a full vector and log it as a base record."""
+        self.items = {item['id']: item for item in coherence_vector}
+        self.seeded = True
+        self.seq += 1
+        self._since_base = 0
+        self._rewrite({'seq': self.seq, 'at': _now(), 'base': coherence_vector})
+
+    def _apply(self, deltas):
+        items = self.items
+        removed = [i for i in map(_item_id, deltas.get('removed', ())) if items.pop(i, None) is not None]
+        added = []
+        for item in deltas.get('added', ()):
+            if item['id'] not in items:
+                added.append(item['id'])
+            items[item['id']] = item
+        changed = []
+        for item in deltas.get('changed', ()):
+            if item['id'] in items:
+                items[item['id']] = item
+                changed.append(item['id'])
+        return added, removed, changed
+
+    def apply(self, deltas):
+        """Apply one set of deltas and append it to the change log; returns the applied ids."""
+        added, removed, changed = self._apply(deltas)
+        self.seq += 1
+        self._since_base += 1
+        if self.path:
+            if self._since_base > self.compact_every:
+                self.compact()
+            else:
+                record = {'seq': self.seq, 'at': _now()}
+                for key in ('added', 'removed', 'changed'):
+                    if deltas.get(key):
+                        record[key] = deltas[key] if key != 'removed' else [_item_id(i) for i in deltas[key]]
+                self._write(record, 'a')
+        return {'added': added, 'removed': removed, 'changed': changed}
+
+    def compact(self):
+        """Rewrite the change log as one base record holding the current vector."""
+        self._since_base = 0
+        self._rewrite({'seq': self.seq, 'at': _now(), 'base': self.vector()})
+
+    def _rewrite(self, record):
+        self._write(record, 'w')
+
+    def _write(self, record, mode):
+        if not self.path:
+            return
+        try:
+            if mode == 'a':
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(_dumps(record) + '\n')
+                return
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(_dumps(record) + '\n')
+            os.replace(tmp, self.path)
+        except OSError:
+            # the change log is best effort, as the old result file was
+            self.path = None
+
+    def reconcile(self, deltas, coherence_vector=None):
+        """Apply deltas to the held set (seeded from coherence_vector on first use); returns a summary.
+
+        O(delta): the summary counts the set instead of listing it; call top_ids()
+        when the full ordering is needed.
+        """
+        if not self.seeded:
+            self.seed(coherence_vector or [])
+        applied = self.apply(deltas)
+        return {
+            'generated_at': _now(),
+            'seq': self.seq,
+            'counts': {
+                'top': len(self.items),
+                'added': len(deltas.get('added', [])),
+                'removed': len(deltas.get('removed', [])),
+                'changed': len(deltas.get('changed', []))
+            },
+            'applied': applied
+        }
+
+
+_engine = None
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        _engine = ReconcileEngine()
+    return _engine
+
+
 def reconcile(coherence_vector, deltas):
     """
     Minimal reconcile() for development.
-    Returns a summary dict and writes reconciliation_result.json nearby.
+    Returns a summary dict and writes it, with the deltas, to reconciliation_result.json nearby.
     """
     summary = {
-        'generated_at': datetime.utcnow().strftime("%Y%m%dT%H%M%S"),
+        'generated_at': _now(),
         'top_ids': [item['id'] for item in coherence_vector],
         'counts': {
             'top': len(coherence_vector),
@@ -17,8 +212,17 @@ def reconcile(coherence_vector, deltas):
         }
     }
     try:
-        with open('reconciliation_result.json', 'w', encoding='utf-8') as f:
-            json.dump({'summary': summary, 'deltas': deltas, 'coherence_vector': coherence_vector}, f, indent=2, ensure_ascii=False)
+        with open(RESULT_PATH, 'w', encoding='utf-8') as f:
+            f.write(_dumps({'summary': summary, 'deltas': deltas}))
     except Exception:
         pass
-    return summary
\ No newline at end of file
+    return summary
+
+
+def reconcile_incremental(deltas, coherence_vector=None):
+    """
+    Opt-in stateful reconcile: applies deltas to the process-wide engine, which
+    persists to reconciliation_changes.jsonl and is seeded from coherence_vector
+    the first time. Later vectors are ignored; use get_engine().seed() to reset.
+    """
+    return get_engine().reconcile(deltas, coherence_vector)
@@ -1,18 +1,56 @@
+import asyncio
+import hashlib
 import importlib.util
+import os
 import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
-LEGACY_PATH = Path(__file__).parents[1].parent / 'legacy base' / 'addvar.py'
+LEGACY_PATH = Path(os.getenv('ADDVAR_LEGACY_PATH') or Path(__file__).parents[1].parent / 'legacy base' / 'addvar.py')
+RECONCILE_WORKERS = int(os.getenv('ADDVAR_RECONCILE_WORKERS', '1'))
+RECONCILE_TIMEOUT = float(os.getenv('ADDVAR_RECONCILE_TIMEOUT', '30'))
+
+_module_lock = threading.Lock()
+_module_cache = None  # (mtime_ns, size, sha1, module) of the loaded source
+# 'reconcile': stateless calls, RECONCILE_WORKERS processes; 'engine': the one process
+# holding the incremental ReconcileEngine (one engine, one change log)
+_POOL_SIZES = {'reconcile': RECONCILE_WORKERS, 'engine': 1}
+_pools: Dict[str, ProcessPoolExecutor] = {}
+_pool_lock = threading.Lock()
+
+
+def _file_digest(path: Path) -> str:
+    return hashlib.sha1(path.read_bytes()).hexdigest()
 
 
 def _load_legacy_module():
-    """Dynamically load the legacy addvar.py as a module and return it."""
-    spec = importlib.util.spec_from_file_location('legacy_addvar', str(LEGACY_PATH))
-    module = importlib.util.module_from_spec(spec)
-    sys.modules['legacy_addvar'] = module
-    spec.loader.exec_module(module)
-    return module
+    """Return the legacy addvar.py as a module, executing it only when its source changed.
+
+    A changed mtime or size alone does not reload it: the file is re-hashed and
+    the cached module is kept if the content is the same.
+    """
+    global _module_cache
+    st = LEGACY_PATH.stat()
+    cached = _module_cache
+    if cached and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[3]
+    with _module_lock:
+        cached = _module_cache
+        if cached and cached[:2] == (st.st_mtime_ns, st.st_size):
+            return cached[3]
+        digest = _file_digest(LEGACY_PATH)
+        if cached and cached[2] == digest:
+            module = cached[3]
+        else:
+            spec = importlib.util.spec_from_file_location('legacy_addvar', str(LEGACY_PATH))
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            sys.modules['legacy_addvar'] = module
+        _module_cache = (st.st_mtime_ns, st.st_size, digest, module)
+        return module
 
 
 def reconcile_adapter(coherence_vector: List[Dict[str, Any]], deltas: Dict[str, Any]) -> Dict[str, Any]:
@@ -31,3 +69,104 @@ def reconcile_adapter(coherence_vector: List[Dict[str, Any]], deltas: Dict[str,
     except Exception as e:
         # Don't let legacy errors crash the main app; return an error dict
         return {'error': str(e)}
+
+
+def _call_in_worker(coherence_vector, deltas):
+    # runs in the pool process, which keeps its own module cache
+    try:
+        return reconcile_adapter(coherence_vector, deltas)
+    except Exception as e:
+        return {'error': str(e)}
+
+
+def reconcile_deltas_adapter(deltas: Dict[str, Any],
+                             coherence_vector: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Call legacy reconcile_incremental(): apply deltas to the engine's held coherence set."""
+    try:
+        module = _load_legacy_module()
+        if not hasattr(module, 'reconcile_incremental'):
+            raise AttributeError('Legacy module missing reconcile_incremental function')
+        return module.reconcile_incremental(deltas, coherence_vector)
+    except Exception as e:
+        return {'error': str(e)}
+
+
+def _get_pool(name: str = 'reconcile') -> ProcessPoolExecutor:
+    with _pool_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = _pools[name] = ProcessPoolExecutor(max_workers=_POOL_SIZES[name])
+        return pool
+
+
+def _discard_pool(name: str = 'reconcile'):
+    with _pool_lock:
+        _pools.pop(name, None)
+
+
+def _kill_pool(name: str):
+    """Terminate a pool's worker processes and drop it; the next call starts a fresh pool.
+
+    A job already running in a worker cannot be cancelled, so after a timeout this
+    is the only way to free the worker instead of queueing every later call behind
+    it. Other calls running in the same pool fail with BrokenProcessPool.
+    """
+    with _pool_lock:
+        pool = _pools.pop(name, None)
+    if pool is None:
+        return
+    for process in list((getattr(pool, '_processes', None) or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _submit(name: str, fn, *args) -> Future:
+    """Submit to a pool; a dead pool is replaced once."""
+    try:
+        return _get_pool(name).submit(fn, *args)
+    except BrokenProcessPool:
+        _discard_pool(name)
+        return _get_pool(name).submit(fn, *args)
+
+
+def submit_reconcile(coherence_vector: List[Dict[str, Any]], deltas: Dict[str, Any]) -> Future:
+    """Run reconcile_adapter() in the worker pool."""
+    return _submit('reconcile', _call_in_worker, coherence_vector, deltas)
+
+
+async def _await_pooled(name: str, future: Future, timeout: Optional[float], what: str) -> Dict[str, Any]:
+    fut = asyncio.wrap_future(future)
+    try:
+        return await asyncio.wait_for(fut, timeout)
+    except asyncio.TimeoutError:
+        if not future.done():
+            _kill_pool(name)  # the stuck job would keep its worker busy for every later call
+        return {'error': f'{what} timed out after {timeout}s', 'timeout': True}
+    except BrokenProcessPool as e:
+        _discard_pool(name)
+        return {'error': f'{what} worker died: {e}'}
+
+
+async def reconcile_async(coherence_vector: List[Dict[str, Any]], deltas: Dict[str, Any],
+                          timeout: Optional[float] = RECONCILE_TIMEOUT) -> Dict[str, Any]:
+    """Await a pooled reconcile without blocking the event loop.
+
+    Returns an error dict (with 'timeout': True when it took longer than
+    `timeout` seconds) instead of raising, like reconcile_adapter().
+    """
+    return await _await_pooled('reconcile', submit_reconcile(coherence_vector, deltas), timeout, 'reconcile')
+
+
+async def reconcile_deltas_async(deltas: Dict[str, Any], coherence_vector: Optional[List[Dict[str, Any]]] = None,
+                                 timeout: Optional[float] = RECONCILE_TIMEOUT) -> Dict[str, Any]:
+    """Like reconcile_async(), for reconcile_deltas_adapter() in the engine's process."""
+    future = _submit('engine', reconcile_deltas_adapter, deltas, coherence_vector)
+    return await _await_pooled('engine', future, timeout, 'reconcile')
+
+
+def shutdown_pool():
+    with _pool_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,91 @@
+# python
+"""
+Micro-benchmark: single-pass scan_text() against the original three-pass matcher.
+
+Builds a deterministic synthetic chat-export corpus in memory, runs both
+matchers over it, checks the rows are identical and prints timings.
+
+    python bench_scan_file.py --size-mb 100
+"""
+import argparse, random, re, time
+
+from collect_tangents import TANGENT_ID_RE, TANGENT_CALL_RE, TIMESTAMP_RE, scan_text
+
+WORDS = ('the', 'memory', 'ledger', 'voice', 'journal', 'semantic', 'we', 'my', 'pipeline',
+         'resonance', 'translation', 'index', 'with', 'and', 'of', 'note', 'café', 'naïve')
+
+def scan_text_multipass(path, full_text):
+    # the matcher scan_file used before the single-pass engine, kept as the reference
+    results = []
+    for m in TANGENT_ID_RE.finditer(full_text):
+        start = max(0, m.start() - 120)
+        snippet = full_text[start:m.end() + 120].replace('\n', ' ')
+        ts_match = TIMESTAMP_RE.search(snippet)
+        results.append({'file': path, 'type': 'id', 'id': m.group(1),
+                        'timestamp': ts_match.group(1) if ts_match else '', 'snippet': snippet.strip()})
+    for m in TANGENT_CALL_RE.finditer(full_text):
+        start = max(0, m.start() - 120)
+        snippet = full_text[start:m.end() + 120].replace('\n', ' ')
+        ts_match = TIMESTAMP_RE.search(snippet)
+        results.append({'file': path, 'type': 'call', 'id': m.group(0),
+                        'timestamp': ts_match.group(1) if ts_match else '', 'snippet': snippet.strip()})
+    table_row_re = re.compile(r'^\|.*Tangent_[A-Za-z0-9_-]+.*$', re.MULTILINE)
+    for m in table_row_re.finditer(full_text):
+        row = m.group(0).replace('\n', ' ')
+        tid = TANGENT_ID_RE.search(row)
+        results.append({'file': path, 'type': 'table_row', 'id': tid.group(1) if tid else '',
+                        'timestamp': TIMESTAMP_RE.search(row).group(1) if TIMESTAMP_RE.search(row) else '',
+                        'snippet': row.strip()})
+    return results
+
+def synthetic_corpus(size_mb, seed=0, density=0.02):
+    """Markdown-ish transcript text with tangent ids, calls, timestamps and table rows."""
+    rnd = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    lines, size = [], 0
+    while size < target:
+        r = rnd.random()
+        if r < density:
+            tid = f'Tangent_{rnd.randint(1, 5000)}'
+            line = f'| {tid} | 2025{rnd.randint(1, 12):02d}{rnd.randint(1, 28):02d}T{rnd.randint(0, 235959):06d} | open |'
+        else:
+            words = [rnd.choice(WORDS) for _ in range(rnd.randint(4, 24))]
+            if r < 3 * density:
+                words.insert(rnd.randrange(len(words)), f'Tangent_{rnd.choice("ABCDEFG")}{rnd.randint(1, 99)}')
+            if r < 2 * density:
+                words.insert(rnd.randrange(len(words)), rnd.choice(('tangent.commit', 'tangent.scan', 'Tangent.Resolve')))
+            if r < 4 * density:
+                words.insert(rnd.randrange(len(words)), f'2025{rnd.randint(1, 12):02d}{rnd.randint(1, 28):02d}T{rnd.randint(0, 2359):04d}')
+            line = rnd.choice(('user: ', 'assistant: ', '')) + ' '.join(words)
+        lines.append(line)
+        size += len(line) + 1
+    return '\n'.join(lines)
+
+def best_of(fn, repeat):
+    best, out = None, None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, out
+
+def main():
+    p = argparse.ArgumentParser(description='Benchmark the single-pass tangent matcher.')
+    p.add_argument('--size-mb', type=float, default=100)
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--density', type=float, default=0.02, help='fraction of lines carrying tangent hits')
+    p.add_argument('--repeat', type=int, default=3)
+    args = p.parse_args()
+    text = synthetic_corpus(args.size_mb, args.seed, args.density)
+    mb = len(text) / (1024 * 1024)
+    t_old, old = best_of(lambda: scan_text_multipass('bench', text), args.repeat)
+    t_new, new = best_of(lambda: scan_text('bench', text), args.repeat)
+    if old != new:
+        raise SystemExit('MISMATCH: single-pass rows differ from the reference matcher')
+    print(f'corpus {mb:.1f} MB, {len(new)} rows (identical)')
+    print(f'multi-pass  {t_old:8.3f}s  {mb / t_old:8.1f} MB/s')
+    print(f'single-pass {t_new:8.3f}s  {mb / t_new:8.1f} MB/s  ({t_old / t_new:.2f}x)')
+
+if __name__ == '__main__':
+    main()
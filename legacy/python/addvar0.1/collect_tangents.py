@@ -1,95 +1,218 @@
 # python
 import argparse, os, re, json, csv
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from tangent_json import iter_json_file_events, iter_object_events, iter_text_nodes
+from tangent_manifest import Manifest
+from tangent_reader import FALLBACK_ENCODING, MappedFile, iter_joined, iter_windows
 
 TANGENT_ID_RE = re.compile(r'\b(Tangent_[A-Za-z0-9_-]+)\b')
 TANGENT_CALL_RE = re.compile(r'\btangent\.(commit|scan|resolve|index)\b', re.IGNORECASE)
 TIMESTAMP_RE = re.compile(r'\b(\d{8}T\d{4,6})\b')  # e.g. 20251016T1825 or with seconds
 
+# Single-pass matcher: one scan finds every Tangent_ occurrence, tangent.<verb> call
+# and timestamp. All three start on a [tT] (timestamps are matched from their 'T' and
+# checked backwards), which lets the regex engine skip quickly between candidates, and
+# the kinds can never overlap, so this sees exactly what the separate regexes would.
+SCAN_RE = re.compile(
+    r'[tT](?:'
+    r'(?<=T)(?P<tangent>angent_)(?=[A-Za-z0-9_-])'
+    r'|(?<!\w.)(?P<call>(?i:angent\.(?:commit|scan|resolve|index))\b)'
+    r'|(?<=(?<!\w)\d{8}T)(?P<ts>\d{4,6}\b)'
+    r')'
+)
+WORD_RE = re.compile(r'\w')
+SNIPPET_CONTEXT = 120
+# Byte-level prefilter run on the mmap before decoding: every hit needs one of these.
+PREFILTER_RE = re.compile(rb'Tangent_|(?i:tangent\.)')
+# JSON \u escapes of ASCII chars could hide a hit from the byte prefilter
+JSON_ASCII_ESCAPE_RE = re.compile(rb'\\u00[2-7][0-9A-Fa-f]')
+
+SCAN_EXTENSIONS = ('.json', '.md', '.txt', '.html', '.htm')
+CSV_KEYS = ['file', 'type', 'id', 'timestamp', 'snippet']
+SCANNER_TAG = 'collect_tangents/4'  # bump when scan_file output changes to invalidate manifests
+
 def extract_text_from_json(obj):
-    if isinstance(obj, str):
-        return [obj]
-    if isinstance(obj, dict):
-        texts = []
-        for v in obj.values():
-            texts += extract_text_from_json(v)
-        return texts
-    if isinstance(obj, list):
-        texts = []
-        for item in obj:
-            texts += extract_text_from_json(item)
-        return texts
-    return []
+    return list(iter_text_nodes(iter_object_events(obj)))
+
+def _may_have_hits(mapped, is_json):
+    if not mapped.ascii_compatible:
+        return True
+    if is_json and mapped.search(JSON_ASCII_ESCAPE_RE):
+        return True
+    return mapped.search(PREFILTER_RE) is not None
+
+def scan_chunks(path, chunks):
+    """Scan a stream of text chunks window by window; same rows as scan_text on the joined text."""
+    ids, calls, rows = [], [], []
+    for text, lo, hi in iter_windows(chunks, SNIPPET_CONTEXT + 1):
+        window_ids, window_calls, window_rows = scan_window(path, text, lo, hi)
+        ids.extend(window_ids)
+        calls.extend(window_calls)
+        rows.extend(window_rows)
+    return ids + calls + rows
 
 def scan_file(path):
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            raw = f.read()
+        mapped = MappedFile(path)
     except Exception:
         return []
-    results = []
-    # If looks like JSON, try to parse and extract text nodes
-    if path.lower().endswith('.json'):
+    with mapped:
+        is_json = path.lower().endswith('.json')
+        if not _may_have_hits(mapped, is_json):
+            return []
+        # If looks like JSON, try to parse and stream out its text nodes
+        # (a UTF-8 BOM-prefixed file never parsed as JSON; it is scanned as raw text)
+        if is_json and not mapped.utf8_bom:
+            try:
+                events = iter_json_file_events(mapped.data, mapped.encoding, mapped.size)
+                return scan_chunks(path, iter_joined(iter_text_nodes(events)))
+            except Exception:
+                pass  # not valid JSON: scan the raw text instead
         try:
-            obj = json.loads(raw)
-            texts = extract_text_from_json(obj)
-            full_text = "\n".join(texts)
-        except Exception:
-            full_text = raw
-    else:
-        full_text = raw
-
-    # find tangent ids and calls
-    for m in TANGENT_ID_RE.finditer(full_text):
-        start = max(0, m.start() - 120)
-        snippet = full_text[start:m.end() + 120].replace('\n', ' ')
-        ts_match = TIMESTAMP_RE.search(snippet)
-        results.append({
-            'file': path,
-            'type': 'id',
-            'id': m.group(1),
-            'timestamp': ts_match.group(1) if ts_match else '',
-            'snippet': snippet.strip()
-        })
-    for m in TANGENT_CALL_RE.finditer(full_text):
-        start = max(0, m.start() - 120)
-        snippet = full_text[start:m.end() + 120].replace('\n', ' ')
-        ts_match = TIMESTAMP_RE.search(snippet)
-        results.append({
-            'file': path,
-            'type': 'call',
-            'id': m.group(0),
-            'timestamp': ts_match.group(1) if ts_match else '',
-            'snippet': snippet.strip()
-        })
-    # also try to capture tabular rows that mention Tangent_ (common in your md)
-    table_row_re = re.compile(r'^\|.*Tangent_[A-Za-z0-9_-]+.*$', re.MULTILINE)
-    for m in table_row_re.finditer(full_text):
-        row = m.group(0).replace('\n', ' ')
-        tid = TANGENT_ID_RE.search(row)
-        results.append({
+            return scan_chunks(path, mapped.iter_chunks())
+        except UnicodeDecodeError:
+            # the prefix looked like UTF-8 but the rest is not
+            mapped.encoding = FALLBACK_ENCODING
+            return scan_chunks(path, mapped.iter_chunks())
+
+def _cuts_word(text, i):
+    # True when a slice boundary at i splits a \w run, so \b differs from the full text
+    return 0 < i < len(text) and WORD_RE.match(text, i - 1) is not None and WORD_RE.match(text, i) is not None
+
+def _first_in_range(starts, values, lo, hi):
+    # first indexed hit starting in [lo, hi), or ''
+    i = bisect_left(starts, lo)
+    return values[i] if i < len(starts) and starts[i] < hi else ''
+
+def scan_text(path, full_text):
+    """
+    Find tangent ids, calls and table rows in one pass over full_text.
+    Rows come out in the same order and with the same content as running
+    TANGENT_ID_RE, TANGENT_CALL_RE and the table-row regex one after another.
+    """
+    ids, calls, rows = scan_window(path, full_text, 0, len(full_text))
+    return ids + calls + rows
+
+def scan_window(path, text, lo, hi):
+    """
+    Single-pass scan of text, reporting only hits that start in text[lo:hi].
+    lo and hi must be line boundaries (or iter_windows() cuts inside an overlong
+    line), with SNIPPET_CONTEXT + 1 chars of context around them (or the real
+    start/end of the text). Returns (ids, calls, rows).
+    """
+    tangent_starts, call_matches = [], []
+    ts_starts, ts_values = [], []
+    for m in SCAN_RE.finditer(text):
+        kind = m.lastgroup
+        if kind == 'tangent':
+            if lo <= m.start() < hi:
+                tangent_starts.append(m.start())
+        elif kind == 'ts':
+            ts_starts.append(m.start() - 8)
+            ts_values.append(text[m.start() - 8:m.end()])
+        elif lo <= m.start() < hi:
+            call_matches.append(m)
+
+    def snippet_row(kind, ident, m_start, m_end):
+        start = max(0, m_start - SNIPPET_CONTEXT)
+        end = m_end + SNIPPET_CONTEXT
+        snippet = text[start:end].replace('\n', ' ')
+        if _cuts_word(text, start) or _cuts_word(text, end):
+            # the snippet edge splits a word; only a search on the snippet itself is exact
+            ts_match = TIMESTAMP_RE.search(snippet)
+            ts = ts_match.group(1) if ts_match else ''
+        else:
+            # timestamps are whole words, so the first one inside the window is the answer
+            ts = _first_in_range(ts_starts, ts_values, start, end)
+        return {'file': path, 'type': kind, 'id': ident, 'timestamp': ts, 'snippet': snippet.strip()}
+
+    ids, row_starts = [], []
+    id_starts, id_values = [], []
+    id_end = 0
+    row_start = -1
+    line_start = seen = lo
+    for pos in tangent_starts:
+        if pos >= id_end:
+            m = TANGENT_ID_RE.match(text, pos)
+            if m:
+                ids.append(snippet_row('id', m.group(1), m.start(), m.end()))
+                id_starts.append(m.start())
+                id_values.append(m.group(1))
+                id_end = m.end()
+        # also capture tabular rows that mention Tangent_ (common in your md)
+        nl = text.rfind('\n', seen, pos)
+        if nl >= 0:
+            line_start = nl + 1
+        seen = pos
+        if line_start != row_start and text.startswith('|', line_start):
+            row_start = line_start
+            row_starts.append(line_start)
+
+    calls = [snippet_row('call', m.group(0), m.start(), m.end()) for m in call_matches]
+    rows = []
+    for line_start in row_starts:
+        line_end = text.find('\n', line_start)
+        if line_end < 0:
+            line_end = len(text)
+        rows.append({
             'file': path,
             'type': 'table_row',
-            'id': tid.group(1) if tid else '',
-            'timestamp': TIMESTAMP_RE.search(row).group(1) if TIMESTAMP_RE.search(row) else '',
-            'snippet': row.strip()
+            'id': _first_in_range(id_starts, id_values, line_start, line_end),
+            'timestamp': _first_in_range(ts_starts, ts_values, line_start, line_end),
+            'snippet': text[line_start:line_end].strip()
         })
-    return results
+    return ids, calls, rows
 
-def walk_and_collect(root):
-    collected = []
+def iter_candidate_files(root):
     for dirpath, _, filenames in os.walk(root):
         for fn in filenames:
-            if fn.lower().endswith(('.json', '.md', '.txt', '.html', '.htm')):
-                collected += scan_file(os.path.join(dirpath, fn))
-    return collected
+            if fn.lower().endswith(SCAN_EXTENSIONS):
+                yield os.path.join(dirpath, fn)
+
+def iter_scanned(paths, workers=1, window=None):
+    """
+    Yield (path, rows) for each path, in input order.
+    With workers > 1 scan_file runs in a process pool; at most `window` files are
+    in flight at once, so memory stays bounded however large the tree is.
+    """
+    if workers <= 1:
+        for path in paths:
+            yield path, scan_file(path)
+        return
+    window = window or workers * 4
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for path in paths:
+            pending.append((path, pool.submit(scan_file, path)))
+            if len(pending) >= window:
+                done, fut = pending.popleft()
+                yield done, fut.result()
+        while pending:
+            done, fut = pending.popleft()
+            yield done, fut.result()
+
+def iter_rows(root, workers=1, manifest=None):
+    paths = iter_candidate_files(root)
+    if manifest is None:
+        results = iter_scanned(paths, workers)
+    else:
+        # incremental: only new or changed files reach the scanner
+        results = manifest.refresh(paths, lambda stale: iter_scanned(stale, workers))
+    for _, rows in results:
+        yield from rows
+
+def walk_and_collect(root, workers=1, manifest=None):
+    return list(iter_rows(root, workers, manifest))
 
 def write_csv(rows, out):
-    keys = ['file', 'type', 'id', 'timestamp', 'snippet']
     with open(out, 'w', newline='', encoding='utf-8') as f:
-        w = csv.DictWriter(f, keys)
+        w = csv.DictWriter(f, CSV_KEYS)
         w.writeheader()
         for r in rows:
-            w.writerow({k: r.get(k, '') for k in keys})
+            w.writerow({k: r.get(k, '') for k in CSV_KEYS})
 
 def write_json(path, rows):
     try:
@@ -98,16 +221,65 @@ def write_json(path, rows):
     except Exception as e:
         print(f"Failed to write JSON: {e}")
 
+def _json_array_item(row):
+    # same layout json.dump(rows, indent=2) gives each list item
+    return '\n'.join('  ' + line for line in json.dumps(row, indent=2, ensure_ascii=False).split('\n'))
+
+def _open_optional(path):
+    if not path:
+        return None
+    try:
+        return open(path, 'w', encoding='utf-8')
+    except Exception as e:
+        print(f"Failed to write {path}: {e}")
+        return None
+
+def write_outputs(rows, out, out_json=None, out_jsonl=None):
+    """
+    Stream rows into the CSV and the optional JSON / JSONL outputs in one pass.
+    Nothing is buffered, and the JSON file is byte-identical to write_json().
+    Returns the number of rows written.
+    """
+    fj = _open_optional(out_json)
+    fl = _open_optional(out_jsonl)
+    count = 0
+    try:
+        with open(out, 'w', newline='', encoding='utf-8') as f:
+            w = csv.DictWriter(f, CSV_KEYS)
+            w.writeheader()
+            for r in rows:
+                w.writerow({k: r.get(k, '') for k in CSV_KEYS})
+                if fj:
+                    fj.write(('[\n' if count == 0 else ',\n') + _json_array_item(r))
+                if fl:
+                    fl.write(json.dumps(r, ensure_ascii=False) + '\n')
+                count += 1
+        if fj:
+            fj.write('\n]' if count else '[]')
+    finally:
+        if fj:
+            fj.close()
+        if fl:
+            fl.close()
+    return count
+
 def main():
     p = argparse.ArgumentParser(description='Collect tangent entries across exported chat files.')
     p.add_argument('root', help='folder with exports or chat files')
     p.add_argument('--out', default='tangents.csv', help='CSV output path')
     p.add_argument('--out-json', default='tangents.json', help='JSON output path')
+    p.add_argument('--out-jsonl', default=None, help='optional JSONL output path (one row per line)')
+    p.add_argument('--workers', type=int, default=1, help='scan processes; 0 = one per CPU core')
+    p.add_argument('--manifest', default=None, help='manifest path; enables incremental mode (only new/changed files are scanned)')
     args = p.parse_args()
-    rows = walk_and_collect(args.root)
-    write_csv(rows, args.out)
-    write_json(args.out_json, rows)
-    print(f'Found {len(rows)} candidate tangents. Written CSV to {args.out} and JSON to {args.out_json}')
+    workers = args.workers or os.cpu_count() or 1
+    manifest = Manifest(args.manifest, SCANNER_TAG) if args.manifest else None
+    count = write_outputs(iter_rows(args.root, workers, manifest), args.out, args.out_json, args.out_jsonl)
+    if manifest is not None:
+        manifest.save()
+        st = manifest.stats
+        print(f"Incremental: scanned {st['scanned']}, cached {st['cached']}, removed {st['removed']} files.")
+    print(f'Found {count} candidate tangents. Written CSV to {args.out} and JSON to {args.out_json}')
 
 if __name__ == '__main__':
     main()
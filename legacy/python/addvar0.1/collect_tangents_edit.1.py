@@ -7,6 +7,9 @@ import argparse
 from collections import defaultdict, Counter
 from datetime import datetime
 
+from tangent_json import iter_json_file_events, iter_messages, iter_object_events
+from tangent_reader import MappedFile
+
 TANGENT_ID_RE = re.compile(r'\b(Tangent_[A-Za-z0-9_-]+)\b')
 TANGENT_CALL_RE = re.compile(r'\btangent\.(commit|scan|resolve|index)\b', re.IGNORECASE)
 TIMESTAMP_RE = re.compile(r'\b(\d{8}T\d{4,6})\b')  # e.g. 20251016T1825 or with seconds
@@ -15,49 +18,30 @@ FIRST_PERSON = re.compile(r'\b(I|me|my|mine|we|our|us)\b', re.I)
 SPEAKER_LABEL = re.compile(r'^\s*([A-Za-z0-9 _@.-]{1,40}):\s*', re.M)
 
 def load_file_text(path):
+    # one mmap'd read; the encoding is detected from the prefix (latin-1 fallback)
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            return f.read()
+        with MappedFile(path) as mapped:
+            return mapped.text()
     except Exception:
-        try:
-            with open(path, 'r', encoding='latin-1') as f:
-                return f.read()
-        except Exception:
-            return ''
+        return ''
 
 def extract_text_from_json(obj):
     """
     Recursively find message-like dicts in JSON exports.
     Returns list of dicts: {'speaker': label_or_role, 'text': content, 'timestamp': maybe}
     """
-    out = []
-    if isinstance(obj, dict):
-        # common forms: {'role': 'user', 'content': '...'} or {'author': {'role':'user'}, 'content': {'text':'...'}}
-        if ('role' in obj and ('content' in obj or 'text' in obj)) or ('author' in obj and 'content' in obj):
-            speaker = obj.get('role') or (obj.get('author') and (obj['author'].get('role') if isinstance(obj['author'], dict) else str(obj['author'])))
-            # try a few keys for text
-            text = ''
-            if isinstance(obj.get('content'), str):
-                text = obj['content']
-            elif isinstance(obj.get('content'), dict):
-                # often {'content': {'text': '...'}} or {'content': {'parts': [... ]}}
-                if 'text' in obj['content']:
-                    text = obj['content']['text']
-                elif 'parts' in obj['content'] and isinstance(obj['content']['parts'], list):
-                    text = '\n'.join([p for p in obj['content']['parts'] if isinstance(p, str)])
-            elif 'message' in obj:
-                text = obj['message']
-            elif 'text' in obj:
-                text = obj['text']
-            ts = obj.get('created') or obj.get('timestamp') or obj.get('date')
-            out.append({'speaker': str(speaker) if speaker is not None else None, 'text': str(text or ''), 'timestamp': str(ts or '')})
-        else:
-            for v in obj.values():
-                out.extend(extract_text_from_json(v))
-    elif isinstance(obj, list):
-        for item in obj:
-            out.extend(extract_text_from_json(item))
-    return out
+    # common forms: {'role': 'user', 'content': '...'} or {'author': {'role':'user'}, 'content': {'text':'...'}}
+    return list(iter_messages(iter_object_events(obj)))
+
+def load_json_messages(path):
+    """
+    Stream message-like dicts out of a JSON export file without loading the whole tree.
+    Yields the same dicts as extract_text_from_json(json.load(f)) and raises if the file is not valid JSON.
+    """
+    with MappedFile(path) as mapped:
+        if mapped.utf8_bom:
+            raise ValueError(f'{path}: BOM-prefixed file is not parsed as JSON')
+        yield from iter_messages(iter_json_file_events(mapped.data, mapped.encoding, mapped.size))
 
 def parse_plain_text_messages(text):
     """
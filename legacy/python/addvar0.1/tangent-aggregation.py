@@ -1,9 +1,12 @@
 # python
 import argparse, os, re, json, csv
 
+from tangent_manifest import Manifest
+
 TANGENT_ID_RE = re.compile(r'\b(Tangent_[A-Za-z0-9_-]+)\b')
 TANGENT_CALL_RE = re.compile(r'\btangent\.(commit|scan|resolve|index)\b', re.IGNORECASE)
 TIMESTAMP_RE = re.compile(r'\b(\d{8}T\d{4,6})\b')  # e.g. 20251016T1825 or with seconds
+SCANNER_TAG = 'tangent-aggregation/1'
 
 def extract_text_from_json(obj):
     if isinstance(obj, str): return [obj]
@@ -74,12 +77,21 @@ def scan_file(path):
         })
     return results
 
-def walk_and_collect(root):
-    collected=[]
+def iter_candidate_files(root):
     for dirpath, _, filenames in os.walk(root):
         for fn in filenames:
             if fn.lower().endswith(('.json','.md','.txt','.html','.htm')):
-                collected += scan_file(os.path.join(dirpath, fn))
+                yield os.path.join(dirpath, fn)
+
+def walk_and_collect(root, manifest=None):
+    paths = iter_candidate_files(root)
+    if manifest is None:
+        results = ((path, scan_file(path)) for path in paths)
+    else:
+        results = manifest.refresh(paths, lambda stale: ((path, scan_file(path)) for path in stale))
+    collected=[]
+    for _, rows in results:
+        collected += rows
     return collected
 
 def write_csv(rows, out):
@@ -94,9 +106,13 @@ def main():
     p = argparse.ArgumentParser(description='Collect tangent entries across exported chat files.')
     p.add_argument('root', help='folder with exports or chat files')
     p.add_argument('--out', default='tangents.csv')
+    p.add_argument('--manifest', default=None, help='manifest path; enables incremental mode')
     args = p.parse_args()
-    rows = walk_and_collect(args.root)
+    manifest = Manifest(args.manifest, SCANNER_TAG) if args.manifest else None
+    rows = walk_and_collect(args.root, manifest)
     write_csv(rows, args.out)
+    if manifest is not None:
+        manifest.save()
     print(f'Found {len(rows)} candidate tangents. Written to {args.out}')
 
 if __name__ == '__main__':
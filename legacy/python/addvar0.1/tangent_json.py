@@ -0,0 +1,329 @@
+# python
+"""
+Event-based JSON walking for chat exports.
+
+Everything here works on a flat stream of (event, value) pairs in the ijson
+`basic_parse` vocabulary: start_map / map_key / end_map, start_array / end_array,
+string / number / boolean / null. The walkers are generators, so text nodes and
+message dicts come out one at a time without building the parsed tree or
+concatenating lists.
+
+Large files are parsed incrementally (with ijson when it is installed, otherwise
+with the pure-Python tokenizer below), so peak memory stays flat even for 1-2 GB
+conversations.json exports. Small files still go through json.loads, which is
+faster when the whole tree fits comfortably in memory. A string value is always
+held whole; reading one that runs past the buffer stops at the chunk holding its
+closing quote.
+
+Message records (not the tree) are held while an enclosing dict is open: with
+a top-level array of conversations they come out conversation by conversation,
+but an export whose top level is a dict yields all its records when it closes.
+"""
+import codecs, json, os, re
+
+try:
+    import ijson
+except Exception:
+    ijson = None
+
+STREAM_MIN_BYTES = 64 * 1024 * 1024  # files at least this big are parsed incrementally
+CHUNK_SIZE = 1 << 16
+
+# values under these keys are kept while walking, message_record() reads them
+MESSAGE_KEYS = frozenset(('role', 'author', 'content', 'message', 'text', 'created', 'timestamp', 'date'))
+
+_WS_RE = re.compile(r'[ \t\n\r]*')
+# a '"' after an even (possibly empty) run of backslashes
+_UNESCAPED_QUOTE_RE = re.compile(r'(?<!\\)(?:\\\\)*"')
+_NUMBER_RE = re.compile(r'-?(?:0|[1-9]\d*)(\.\d+)?([eE][-+]?\d+)?')
+_CONSTANTS = {'true': ('boolean', True), 'false': ('boolean', False), 'null': ('null', None),
+              'NaN': ('number', float('nan')), 'Infinity': ('number', float('inf')),
+              '-Infinity': ('number', float('-inf'))}
+_CONSTANT_RE = re.compile('|'.join(re.escape(k) for k in sorted(_CONSTANTS, key=len, reverse=True)))
+
+# parser states
+_VALUE, _VALUE_OR_END, _KEY, _KEY_OR_END, _COLON, _COMMA_OR_END, _DONE = range(7)
+
+
+def _iter_chunks(fp, encoding='utf-8', chunk_size=CHUNK_SIZE):
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for block in iter(lambda: fp.read(chunk_size), b''):
+        text = decoder.decode(block)
+        if text:
+            yield text
+    text = decoder.decode(b'', final=True)
+    if text:
+        yield text
+
+
+def _has_closing_quote(s, start):
+    """True if s[start:] holds an unescaped '"' (s[start - 1], if any, is an escaped char)."""
+    if '"' not in s:
+        return False
+    return _UNESCAPED_QUOTE_RE.search(s[start:] if start else s) is not None
+
+
+def _ends_escaped(s, start):
+    """1 if s[start:] ends in an odd run of backslashes (the next char is escaped), else 0."""
+    return min(len(s) - len(s.rstrip('\\')), len(s) - start) % 2
+
+
+def iter_text_events(chunks):
+    """
+    Incremental JSON tokenizer over an iterable of str chunks.
+    Accepts exactly what json.loads accepts and raises json.JSONDecodeError otherwise.
+    """
+    chunks = iter(chunks)
+    buf, pos, eof = '', 0, False
+    stack = []  # True for an open map, False for an open array
+    state = _VALUE
+    scanstring = json.decoder.scanstring
+
+    while True:
+        pos = _WS_RE.match(buf, pos).end()
+        if pos >= len(buf):
+            if not eof:
+                more = next(chunks, None)
+                if more is None:
+                    eof = True
+                else:
+                    buf, pos = buf[pos:] + more, 0
+                continue
+            if state == _DONE:
+                return
+            raise json.JSONDecodeError('Expecting value', buf, pos)
+        c = buf[pos]
+
+        if state == _DONE:
+            raise json.JSONDecodeError('Extra data', buf, pos)
+
+        if state == _COLON:
+            if c != ':':
+                raise json.JSONDecodeError("Expecting ':' delimiter", buf, pos)
+            pos += 1
+            state = _VALUE
+            continue
+
+        if state == _COMMA_OR_END:
+            if c == ',':
+                pos += 1
+                state = _KEY if stack[-1] else _VALUE
+                continue
+            if c == ('}' if stack[-1] else ']'):
+                pos += 1
+                yield ('end_map' if stack.pop() else 'end_array'), None
+                state = _COMMA_OR_END if stack else _DONE
+                continue
+            raise json.JSONDecodeError("Expecting ',' delimiter", buf, pos)
+
+        if state == _KEY_OR_END and c == '}':
+            pos += 1
+            stack.pop()
+            yield 'end_map', None
+            state = _COMMA_OR_END if stack else _DONE
+            continue
+        if state == _VALUE_OR_END and c == ']':
+            pos += 1
+            stack.pop()
+            yield 'end_array', None
+            state = _COMMA_OR_END if stack else _DONE
+            continue
+
+        if c == '"':
+            try:
+                value, end = scanstring(buf, pos + 1, True)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # the string runs past the buffer: read one chunk at a time until one holds
+                # its closing quote, then decode it once
+                parts, skip = [buf[pos:]], _ends_escaped(buf, pos + 1)
+                while True:
+                    more = next(chunks, None)
+                    if more is None:
+                        eof = True
+                        break
+                    if not more:
+                        continue
+                    parts.append(more)
+                    # skip: a lone backslash ending the previous chunk escapes more[0]
+                    if _has_closing_quote(more, skip):
+                        break
+                    skip = _ends_escaped(more, skip)
+                buf = ''.join(parts)
+                value, end = scanstring(buf, 1, True)
+            pos = end
+            if state in (_KEY, _KEY_OR_END):
+                yield 'map_key', value
+                state = _COLON
+            else:
+                yield 'string', value
+                state = _COMMA_OR_END if stack else _DONE
+            continue
+
+        if state in (_KEY, _KEY_OR_END):
+            raise json.JSONDecodeError('Expecting property name enclosed in double quotes', buf, pos)
+
+        if c == '{':
+            pos += 1
+            stack.append(True)
+            yield 'start_map', None
+            state = _KEY_OR_END
+            continue
+        if c == '[':
+            pos += 1
+            stack.append(False)
+            yield 'start_array', None
+            state = _VALUE_OR_END
+            continue
+
+        # numbers and constants; read on while the token (or a '.'/'e+' tail the
+        # number regex stopped short of) might continue past the buffer end
+        m = _NUMBER_RE.match(buf, pos) or _CONSTANT_RE.match(buf, pos)
+        if not eof and len(buf) - (m.end() if m else pos) < 16:
+            more = next(chunks, None)
+            if more is None:
+                eof = True
+            else:
+                buf, pos = buf[pos:] + more, 0
+            continue
+        if m is None:
+            raise json.JSONDecodeError('Expecting value', buf, pos)
+        if m.re is _NUMBER_RE:
+            frac, exp = m.groups()
+            value = float(m.group()) if frac or exp else int(m.group())
+            event = 'number'
+        else:
+            event, value = _CONSTANTS[m.group()]
+        pos = m.end()
+        yield event, value
+        state = _COMMA_OR_END if stack else _DONE
+
+
+def iter_json_events(fp, encoding='utf-8'):
+    """Incrementally parse a binary file object into JSON events."""
+    if ijson is not None and codecs.lookup(encoding).name == 'utf-8':
+        return ijson.basic_parse(fp, use_float=True)
+    return iter_text_events(_iter_chunks(fp, encoding))
+
+
+def iter_object_events(obj):
+    """Events for an already-parsed JSON value, walked with an explicit stack."""
+    stack = [(None, iter((obj,)))]
+    while stack:
+        kind, items = stack[-1]
+        for item in items:
+            if kind == 'map':
+                key, item = item
+                yield 'map_key', key
+            if isinstance(item, dict):
+                yield 'start_map', None
+                stack.append(('map', iter(item.items())))
+                break
+            if isinstance(item, list):
+                yield 'start_array', None
+                stack.append(('array', iter(item)))
+                break
+            if isinstance(item, str):
+                yield 'string', item
+            elif item is None:
+                yield 'null', None
+            elif isinstance(item, bool):
+                yield 'boolean', item
+            else:
+                yield 'number', item
+        else:
+            stack.pop()
+            if kind == 'map':
+                yield 'end_map', None
+            elif kind == 'array':
+                yield 'end_array', None
+
+
+def iter_json_file_events(fp, encoding='utf-8', size=None):
+    """
+    Events for a JSON file opened in binary mode (or a read-only mmap).
+    Small files are loaded with json.loads; big ones are parsed incrementally.
+    """
+    if size is None:
+        try:
+            size = os.fstat(fp.fileno()).st_size
+        except (AttributeError, OSError, ValueError):
+            size = STREAM_MIN_BYTES
+    if size < STREAM_MIN_BYTES:
+        return iter_object_events(json.loads(fp.read().decode(encoding)))
+    return iter_json_events(fp, encoding)
+
+
+def iter_text_nodes(events):
+    """Yield every string value (not keys), in document order."""
+    for event, value in events:
+        if event == 'string':
+            yield value
+
+
+def is_message(obj):
+    return ('role' in obj and ('content' in obj or 'text' in obj)) or ('author' in obj and 'content' in obj)
+
+
+def message_record(obj):
+    """Normalise a message-like dict to {'speaker', 'text', 'timestamp'}."""
+    speaker = obj.get('role') or (obj.get('author') and (obj['author'].get('role') if isinstance(obj['author'], dict) else str(obj['author'])))
+    # try a few keys for text
+    text = ''
+    if isinstance(obj.get('content'), str):
+        text = obj['content']
+    elif isinstance(obj.get('content'), dict):
+        # often {'content': {'text': '...'}} or {'content': {'parts': [... ]}}
+        if 'text' in obj['content']:
+            text = obj['content']['text']
+        elif 'parts' in obj['content'] and isinstance(obj['content']['parts'], list):
+            text = '\n'.join([p for p in obj['content']['parts'] if isinstance(p, str)])
+    elif 'message' in obj:
+        text = obj['message']
+    elif 'text' in obj:
+        text = obj['text']
+    ts = obj.get('created') or obj.get('timestamp') or obj.get('date')
+    return {'speaker': str(speaker) if speaker is not None else None, 'text': str(text or ''), 'timestamp': str(ts or '')}
+
+
+def iter_messages(events):
+    """
+    Yield message records for message-like dicts, in document order.
+    A message dict is not searched for nested messages. Only values under
+    MESSAGE_KEYS are materialised. Records are held back only while an enclosing
+    dict is still open, because that dict may itself turn out to be a message;
+    under a top-level dict (e.g. {"conversations": [...]}) that means every
+    record is yielded at the end. Only the small records are held, not the tree.
+    """
+    stack = []  # frames: [is_map, keep_all, container, pending, key]
+    open_maps = 0
+    for event, value in events:
+        if event == 'map_key':
+            stack[-1][4] = value
+            continue
+        if event == 'start_map' or event == 'start_array':
+            keep = bool(stack) and (stack[-1][1] or (stack[-1][0] and stack[-1][4] in MESSAGE_KEYS))
+            is_map = event == 'start_map'
+            open_maps += is_map
+            stack.append([is_map, keep, {} if is_map else [], [], None])
+            continue
+        if event == 'end_map' or event == 'end_array':
+            is_map, keep, value, pending, _ = stack.pop()
+            open_maps -= is_map
+            if is_map and is_message(value):
+                pending = [message_record(value)]
+            if open_maps == 0:
+                yield from pending
+            else:
+                stack[-1][3].extend(pending)
+            if not keep:
+                continue
+        if not stack:
+            continue
+        parent = stack[-1]
+        if parent[0]:
+            if parent[1] or parent[4] in MESSAGE_KEYS:
+                parent[2][parent[4]] = value
+        elif parent[1]:
+            parent[2].append(value)
@@ -0,0 +1,137 @@
+# python
+"""
+Persistent file manifest for incremental tangent collection.
+
+The manifest records path, size, mtime and content hash for every scanned file
+and caches each file's rows under `<manifest>.d/<scanner>/`, keyed by content
+hash. The scanner tag (and manifest version) is part of that directory, so rows
+cached by other scan logic are never replayed, even when two scripts share one
+manifest path.
+refresh() only rescans new or changed files, drops files that disappeared and
+replays cached rows for the rest, all in the caller's walk order, so an
+incremental run produces the same rows as a full rescan.
+"""
+import hashlib, json, os, re
+
+MANIFEST_VERSION = 1
+
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+class Manifest:
+    def __init__(self, path, scanner='default'):
+        """
+        path: manifest JSON file; cached rows live under the `<path>.d` directory.
+        scanner: tag of the scan logic; a manifest written by a different tag
+        (or an older format) is ignored and everything is rescanned.
+        """
+        self.path = path
+        self.root_dir = path + '.d'
+        self.scanner = scanner
+        # one rows directory per scanner tag and format version
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', scanner)
+        tag_hash = hashlib.sha1(f'{MANIFEST_VERSION}:{scanner}'.encode('utf-8')).hexdigest()[:8]
+        self.cache_dir = os.path.join(self.root_dir, f'{slug}-v{MANIFEST_VERSION}-{tag_hash}')
+        self.files = {}
+        self.stats = {'scanned': 0, 'cached': 0, 'removed': 0}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception:
+            return
+        if data.get('version') == MANIFEST_VERSION and data.get('scanner') == self.scanner:
+            self.files = data.get('files', {})
+
+    def _rows_path(self, key):
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def _read_rows(self, key, path):
+        with open(self._rows_path(key), 'r', encoding='utf-8') as f:
+            return [{'file': path, **r} for r in json.load(f)]
+
+    def _write_rows(self, key, rows):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = self._rows_path(key) + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            # rows are cached by content, so the path is re-attached on read
+            json.dump([{k: v for k, v in r.items() if k != 'file'} for r in rows], f, ensure_ascii=False)
+        os.replace(tmp, self._rows_path(key))
+
+    def _plan(self, path):
+        """Return (entry, fresh) for path; entry is None when the file cannot be read."""
+        st = os.stat(path)
+        old = self.files.get(path)
+        if old and old['size'] == st.st_size and old['mtime_ns'] == st.st_mtime_ns \
+                and os.path.exists(self._rows_path(old['key'])):
+            return old, True
+        try:
+            # the extension decides JSON vs plain-text parsing, so it is part of the key
+            key = file_digest(path) + os.path.splitext(path)[1].lower()
+        except OSError:
+            return None, False
+        entry = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'key': key}
+        return entry, os.path.exists(self._rows_path(key))
+
+    def refresh(self, paths, scan_many):
+        """
+        Yield (path, rows) for every path, in order.
+        scan_many(paths) must yield (path, rows) for the given paths in order; it is
+        only handed the files that are new or changed since the last run.
+        """
+        plan = []
+        for path in paths:
+            try:
+                entry, fresh = self._plan(path)
+            except OSError:
+                continue  # vanished between the walk and the stat
+            plan.append((path, entry, fresh))
+
+        scanned = scan_many(path for path, _, fresh in plan if not fresh)
+        files = {}
+        for path, entry, fresh in plan:
+            if fresh:
+                rows = self._read_rows(entry['key'], path)
+                self.stats['cached'] += 1
+            else:
+                _, rows = next(scanned)
+                self.stats['scanned'] += 1
+                if entry is not None:
+                    self._write_rows(entry['key'], rows)
+            if entry is not None:
+                files[path] = entry
+            yield path, rows
+        self.stats['removed'] = len(set(self.files) - set(files))
+        self.files = files
+
+    def save(self):
+        """Write the manifest atomically and prune cached rows no file refers to."""
+        parent = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(parent, exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'scanner': self.scanner, 'files': self.files}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+        if os.path.isdir(self.cache_dir):
+            live = {entry['key'] + '.json' for entry in self.files.values()}
+            for fn in os.listdir(self.cache_dir):
+                if fn not in live:
+                    try:
+                        os.remove(os.path.join(self.cache_dir, fn))
+                    except OSError:
+                        pass
+        if os.path.isdir(self.root_dir):
+            # rows cached directly in `<path>.d/` by the old layout can never be read again
+            for fn in os.listdir(self.root_dir):
+                full = os.path.join(self.root_dir, fn)
+                if fn.endswith('.json') and os.path.isfile(full):
+                    try:
+                        os.remove(full)
+                    except OSError:
+                        pass
@@ -0,0 +1,170 @@
+# python
+"""
+Memory-mapped, encoding-aware file reading for the tangent collectors.
+
+MappedFile maps a file read-only and detects its encoding from a small prefix
+(BOMs first, then "is this prefix valid UTF-8", else latin-1). Byte-level regexes
+run directly on the mapping without copying, which lets scanners skip files that
+cannot contain a hit before decoding anything. Text is decoded once, in chunks,
+with the same newline translation as open(..., 'r').
+
+A UTF-8 BOM is decoded as 'utf-8', so the text keeps its U+FEFF as
+open(..., encoding='utf-8') did, and `utf8_bom` is set: callers treat such files
+as non-JSON, which is what json.loads made of them before. UTF-16/32 BOMs are
+consumed by their codecs and those files parse normally.
+
+iter_windows() cuts a stream of text chunks into line-aligned windows that
+overlap by a fixed number of characters, so per-match context (snippets) stays
+exact at chunk boundaries while only one window is held in memory. A line longer
+than `max_window` is cut inside the line instead, after a separator so that
+identifier-like tokens stay whole; the overlap still carries the context on
+both sides of the cut.
+"""
+import codecs, io, mmap, os
+
+PREFIX_BYTES = 4096
+CHUNK_BYTES = 8 << 20
+FALLBACK_ENCODING = 'latin-1'
+
+# longest BOMs first: the UTF-32 LE BOM starts with the UTF-16 LE one
+_BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8'),  # not utf-8-sig: the U+FEFF stays in the text
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+_ASCII_COMPATIBLE = frozenset(('utf-8', 'utf-8-sig', 'iso8859-1', 'cp1252', 'ascii'))
+
+def detect_encoding(prefix):
+    for bom, encoding in _BOMS:
+        if prefix.startswith(bom):
+            return encoding
+    try:
+        # final=False: a multi-byte sequence cut at the end of the prefix is fine
+        codecs.getincrementaldecoder('utf-8')().decode(prefix, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return FALLBACK_ENCODING
+
+def _text_decoder(encoding):
+    # universal newlines, exactly like reading the file in text mode
+    return io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(encoding)(), translate=True)
+
+class MappedFile:
+    """Read-only memory map of a file plus its detected encoding."""
+
+    def __init__(self, path, encoding=None):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self.size = os.fstat(self._file.fileno()).st_size
+            # mmap cannot map an empty file
+            self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+        except Exception:
+            self._file.close()
+            raise
+        prefix = self.data[:PREFIX_BYTES]
+        self.utf8_bom = prefix.startswith(codecs.BOM_UTF8)
+        self.encoding = encoding or detect_encoding(prefix)
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def ascii_compatible(self):
+        return codecs.lookup(self.encoding).name in _ASCII_COMPATIBLE
+
+    def search(self, pattern):
+        """Run a compiled bytes regex over the mapped bytes (no copy)."""
+        return pattern.search(self.data)
+
+    def text(self):
+        """The whole file decoded; falls back to latin-1 if the detected encoding fails later on."""
+        try:
+            return _text_decoder(self.encoding).decode(self.data, final=True)
+        except UnicodeDecodeError:
+            self.encoding = FALLBACK_ENCODING
+            return _text_decoder(self.encoding).decode(self.data, final=True)
+
+    def iter_chunks(self, chunk_size=CHUNK_BYTES):
+        """
+        Decode the mapping chunk by chunk.
+        Raises UnicodeDecodeError if the detected encoding turns out to be wrong
+        past the prefix; callers restart with FALLBACK_ENCODING.
+        """
+        decoder = _text_decoder(self.encoding)
+        view = memoryview(self.data)
+        try:
+            for off in range(0, len(view), chunk_size):
+                text = decoder.decode(view[off:off + chunk_size])
+                if text:
+                    yield text
+        finally:
+            view.release()
+        text = decoder.decode(b'', final=True)
+        if text:
+            yield text
+
+def iter_joined(pieces, sep='\n', size=CHUNK_BYTES):
+    """Chunks of sep.join(pieces), each at least `size` chars except the last."""
+    buf, n = [], 0
+    for i, piece in enumerate(pieces):
+        if i:
+            buf.append(sep)
+            n += len(sep)
+        buf.append(piece)
+        n += len(piece)
+        if n >= size:
+            yield ''.join(buf)
+            buf, n = [], 0
+    if buf:
+        yield ''.join(buf)
+
+def _is_token_char(ch):
+    return ch.isalnum() or ch in '_.-'
+
+def _token_cut(text, lo, hi):
+    """A cut in text[lo:hi] right after a separator, so no word/dotted token spans it; hi if none is near."""
+    cut = hi
+    floor = lo + (hi - lo) // 2
+    while cut > floor and _is_token_char(text[cut - 1]):
+        cut -= 1
+    return cut if cut > floor else hi
+
+def iter_windows(chunks, overlap, max_window=CHUNK_BYTES):
+    """
+    Yield (text, lo, hi) windows over the concatenation of str chunks.
+    text[lo:hi] is the window's own span and ends at a line boundary, so lines
+    are not split, except that a span reaching `max_window` chars without a
+    newline is cut near there (newline-free input stays bounded in memory). text
+    carries up to `overlap` chars of the previous window before lo and `overlap`
+    chars after hi (fewer only at the start and end of the stream). Own spans are
+    disjoint and cover the whole stream.
+    """
+    pending, lead = '', 0
+    for chunk in chunks:
+        pending += chunk
+        while True:
+            limit = len(pending) - overlap
+            if limit <= lead:
+                break
+            # cut after the last newline that still leaves `overlap` chars of trailing context
+            cut = pending.rfind('\n', lead, limit) + 1
+            if not cut:
+                if limit - lead < max_window:
+                    break
+                cut = _token_cut(pending, lead, lead + max_window)
+            yield pending[:cut + overlap], lead, cut
+            keep = max(0, cut - overlap)
+            pending, lead = pending[keep:], cut - keep
+    if len(pending) > lead:
+        yield pending, lead, len(pending)
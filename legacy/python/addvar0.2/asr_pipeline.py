@@ -0,0 +1,238 @@
+"""Streaming, batched speech recognition over the capture ring.
+
+StreamingASR runs three stages on their own threads, so recording never waits
+for recognition:
+
+    source --CaptureThread--> RingBuffer --VoiceActivityChunker--> windows --batches--> transcriber
+
+Windows (sample ranges, see audio_buffer.Window) are collected into batches of
+up to `batch_size`, or whatever is waiting after `max_wait_ms`. Each batch is
+assembled into one preallocated float32 array straight from the ring views
+(int16 -> float32 scaling writes into the batch row; this is the only copy a
+sample makes after capture), handed to the transcriber in one call, and every
+window's Transcript is delivered to `on_result` and the results queue.
+
+For file sources the ring's `keep` hook is set to the oldest sample the chunker
+or a queued window still needs, so fast replay waits instead of overrunning;
+with a microphone a window that falls a whole ring behind (before or while it
+is copied into the batch) is counted in stats["overruns"] and skipped. If the chunker or the transcriber raises, capture
+stops, the error is kept in `error` and iter_results() raises it once drained.
+
+Transcribers are pluggable: anything with transcribe_batch(audio, lengths,
+sample_rate) -> [str]. WhisperTranscriber wraps faster-whisper when it is
+installed; StubTranscriber describes each window, for tests and benchmarks.
+
+    asr = StreamingASR(WavSource("journal.wav", realtime=True), StubTranscriber())
+    asr.start()
+    for t in asr.iter_results():
+        print(t.start_s, t.end_s, t.final, t.text)
+"""
+from collections import deque
+from typing import Callable, Iterator, List, NamedTuple, Optional
+import queue
+import threading
+import time
+
+from .audio_buffer import CaptureThread, OverrunError, RingBuffer, VoiceActivityChunker, Window, np
+
+BATCH_SIZE = 8
+MAX_WAIT_MS = 200
+
+
+class Transcript(NamedTuple):
+    segment: int
+    start_s: float
+    end_s: float
+    final: bool  # last (complete) window of its speech segment
+    text: str
+
+
+class StubTranscriber:
+    """Offline stand-in: 'speech <seconds>s rms=<level>' per window."""
+
+    def __init__(self, delay_s: float = 0.0):
+        self.delay_s = delay_s  # simulated per-batch model latency
+        self.batches = []  # batch sizes seen
+
+    def transcribe_batch(self, audio, lengths: List[int], sample_rate: int) -> List[str]:
+        self.batches.append(len(lengths))
+        if self.delay_s:
+            time.sleep(self.delay_s)
+        out = []
+        for row, n in zip(audio, lengths):
+            rms = float(np.sqrt(np.mean(row[:n] ** 2))) if n else 0.0
+            out.append(f"speech {n / sample_rate:.2f}s rms={rms:.3f}")
+        return out
+
+
+class WhisperTranscriber:
+    """faster-whisper, loaded once; windows of a batch are decoded back to back by one model."""
+
+    def __init__(self, model_size: str = "base", device: str = "auto", compute_type: str = "default",
+                 language: Optional[str] = None):
+        from .model_registry import optional_import
+        fw = optional_import("faster_whisper")
+        if fw is None:
+            raise RuntimeError("faster-whisper not installed")
+        self.model = fw.WhisperModel(model_size, device=device, compute_type=compute_type)
+        self.language = language
+
+    def transcribe_batch(self, audio, lengths: List[int], sample_rate: int) -> List[str]:
+        texts = []
+        for row, n in zip(audio, lengths):
+            segments, _ = self.model.transcribe(row[:n], language=self.language, beam_size=1)
+            texts.append(" ".join(s.text.strip() for s in segments))
+        return texts
+
+
+class StreamingASR:
+    def __init__(self, source, transcriber, ring: Optional[RingBuffer] = None, batch_size: int = BATCH_SIZE,
+                 max_wait_ms: float = MAX_WAIT_MS, on_result: Optional[Callable[[Transcript], None]] = None,
+                 max_duration: Optional[float] = None, **vad_options):
+        """
+        source: WavSource, SoundDeviceSource or anything with readinto()/sample_rate/channels.
+        ring: defaults to 60 s at the source's rate.
+        vad_options: passed to VoiceActivityChunker (threshold, window_s, hop_s, ...).
+        """
+        self.source = source
+        self.transcriber = transcriber
+        self.ring = ring or RingBuffer(60.0, source.sample_rate, source.channels)
+        self.chunker = VoiceActivityChunker(self.ring, **vad_options)
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.on_result = on_result
+        self.results: "queue.Queue[Optional[Transcript]]" = queue.Queue()
+        self.capture = CaptureThread(source, self.ring, max_duration)
+        self._windows: "queue.Queue[Optional[Window]]" = queue.Queue()
+        self._pending: deque = deque()  # starts of windows queued but not yet transcribed (not sorted)
+        if not getattr(source, "live", True):
+            # capture waits for `needed`, so the ring must hold that far back plus the frame being written
+            if self.ring.capacity < self.chunker.lag + 2 * self.ring.frame_samples:
+                raise ValueError("ring too small for window_s plus hangover_ms/pre_roll_ms")
+            self.ring.keep = self._keep
+        # one float32 batch buffer, reused for every batch (mono: channels are averaged)
+        self._batch = np.zeros((self.batch_size, self.chunker.window), dtype=np.float32)
+        self._threads = [self.capture,
+                         threading.Thread(target=self._chunk, name="addvar-vad", daemon=True),
+                         threading.Thread(target=self._transcribe, name="addvar-asr", daemon=True)]
+        self.stats = {"windows": 0, "batches": 0, "overruns": 0, "asr_s": 0.0}
+        self.error: Optional[BaseException] = None
+
+    def start(self) -> "StreamingASR":
+        for t in self._threads:
+            t.start()
+        return self
+
+    def stop(self):
+        """Stop capturing; windows already queued are still transcribed."""
+        self.capture.stop()
+
+    def join(self, timeout: Optional[float] = None):
+        for t in self._threads:
+            t.join(timeout)
+
+    def iter_results(self) -> Iterator[Transcript]:
+        """Transcripts in completion order until the pipeline has drained."""
+        while True:
+            item = self.results.get()
+            if item is None:
+                if self.error is not None:
+                    raise self.error
+                return
+            yield item
+
+    # ---- stages ----
+
+    def _keep(self) -> int:
+        # every queued window, not just _pending[0]: a segment's final window can
+        # start before the sliding window queued just ahead of it
+        needed = self.chunker.needed
+        return min(min(self._pending, default=needed), needed)
+
+    def _fail(self, exc: BaseException):
+        """A stage died: nothing will advance `keep` any more, so release the ring and stop capturing."""
+        if self.error is None:
+            self.error = exc
+        self.ring.keep = None
+        self.capture.stop()
+        self.ring.notify()
+
+    def _chunk(self):
+        try:
+            for window in self.chunker.windows():
+                self._pending.append(window.start)
+                self._windows.put(window)
+                self.ring.notify()
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._windows.put(None)
+
+    def _next_batch(self) -> List[Window]:
+        first = self._windows.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            try:
+                item = self._windows.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is None:
+                self._windows.put(None)  # seen again by the next _next_batch()
+                break
+            batch.append(item)
+        return batch
+
+    def _fill(self, row, window: Window) -> int:
+        """Scale the window's int16 ring views into a float32 batch row; returns its length in samples.
+
+        Raises OverrunError if the window was overwritten before or during the copy.
+        """
+        n = 0
+        for seg in self.ring.segments(window.start, window.end):
+            m = len(seg)
+            if seg.shape[1] == 1:
+                np.multiply(seg[:, 0], 1.0 / 32768.0, out=row[n:n + m], casting="unsafe")
+            else:
+                np.mean(seg, axis=1, out=row[n:n + m])
+                row[n:n + m] *= 1.0 / 32768.0
+            n += m
+        if not self.ring.intact(window.start):
+            # capture lapped us mid-copy: the row mixes this window with newer audio
+            raise OverrunError(f"window at {window.start} was overwritten while it was copied")
+        return n
+
+    def _transcribe(self):
+        rate = self.ring.sample_rate
+        try:
+            while True:
+                batch = self._next_batch()
+                if not batch:
+                    break
+                kept, lengths = [], []
+                for window in batch:
+                    try:
+                        lengths.append(self._fill(self._batch[len(kept)], window))
+                        kept.append(window)
+                    except OverrunError:
+                        self.stats["overruns"] += 1  # recognition fell a whole ring behind capture
+                    self._pending.popleft()
+                self.ring.notify()
+                if not kept:
+                    continue
+                t0 = time.perf_counter()
+                texts = self.transcriber.transcribe_batch(self._batch[:len(kept)], lengths, rate)
+                self.stats["asr_s"] += time.perf_counter() - t0
+                self.stats["batches"] += 1
+                self.stats["windows"] += len(kept)
+                for window, text in zip(kept, texts):
+                    result = Transcript(window.segment, window.start / rate, window.end / rate, window.final, text)
+                    if self.on_result is not None:
+                        self.on_result(result)
+                    self.results.put(result)
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self.results.put(None)
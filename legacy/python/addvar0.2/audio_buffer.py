@@ -0,0 +1,386 @@
+"""Audio capture into a preallocated ring buffer, plus energy-based voice activity chunking.
+
+The ring holds int16 PCM frames (shape capacity x channels) allocated once.
+Sources write straight into it. A pull source (WavSource) is driven by the
+capture thread: it asks the ring for the free region as a writable view and the
+source readinto()s it, so the file is read from disk directly into the ring. A
+push source (SoundDeviceSource) is attach()ed to the ring and its device
+callback copies each block from the driver's buffer into the ring's view, the
+one copy a live block needs. Either way the ring then publishes the new
+samples. Consumers address samples by absolute
+index (samples since the start of capture) and get views into the ring back,
+never copies; a range that wraps the end of the ring comes back as two views.
+
+A live device cannot wait, so a consumer that falls more than a ring behind gets
+OverrunError. File sources (WavSource.live is False) can: when `ring.keep` is
+set to a callable returning the oldest sample still needed, the capture thread
+waits for consumers instead of overwriting, so replay is lossless at any speed.
+
+Capacity is rounded to a whole number of VAD frames, so a frame never wraps and
+VoiceActivityChunker can compute each frame's energy directly on a view. The
+chunker turns frames into speech segments and those into overlapping windows
+(window_s long, every hop_s while speech continues, plus a final one when it
+ends), which is what the ASR stage in asr_pipeline.py consumes.
+
+WavSource replays a 16-bit PCM WAV file (optionally in real time) so the whole
+pipeline runs without a microphone; SoundDeviceSource captures from one when
+sounddevice is installed.
+"""
+from typing import Iterator, List, NamedTuple, Optional
+import os
+import struct
+import threading
+import time
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+try:
+    import sounddevice
+except Exception:
+    sounddevice = None
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+
+
+class OverrunError(Exception):
+    """The requested samples were already overwritten: the consumer fell more than a ring behind."""
+
+
+class RingBuffer:
+    def __init__(self, seconds: float = 60.0, sample_rate: int = SAMPLE_RATE, channels: int = 1,
+                 frame_samples: Optional[int] = None):
+        if np is None:
+            raise RuntimeError("Numpy not installed")
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.frame_samples = frame_samples or sample_rate * FRAME_MS // 1000
+        frames = max(2, int(seconds * sample_rate) // self.frame_samples)
+        self.capacity = frames * self.frame_samples
+        self.data = np.zeros((self.capacity, channels), dtype=np.int16)
+        self.written = 0  # absolute index one past the newest published sample
+        self.writing = 0  # end of the last writable() view: samples before it minus capacity may be clobbered
+        self.closed = False
+        self.keep = None  # optional callable() -> oldest absolute sample still needed (backpressure)
+        self._cond = threading.Condition()
+
+    # ---- writer side (one writer) ----
+
+    def writable(self, max_samples: int):
+        """View of up to max_samples free slots from the write position, never wrapping."""
+        pos = self.written % self.capacity
+        view = self.data[pos:pos + min(max_samples, self.capacity - pos)]
+        self.writing = self.written + len(view)  # set before the writer touches the view
+        return view
+
+    def reserve(self, n: int, timeout: Optional[float] = None) -> bool:
+        """With `keep` set, wait until n more samples can be written without overwriting needed ones."""
+        def room():
+            keep = self.keep  # may be cleared while we wait (a consumer gave up)
+            return keep is None or self.written + n - self.capacity <= keep()
+        if self.keep is None:
+            return True
+        with self._cond:
+            return self._cond.wait_for(room, timeout)
+
+    def commit(self, n: int):
+        """Publish n samples written into the last writable() view."""
+        with self._cond:
+            self.written += n
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    # ---- reader side ----
+
+    def notify(self):
+        """Wake a writer waiting in reserve(); consumers call it after `keep` advances."""
+        with self._cond:
+            self._cond.notify_all()
+
+    @property
+    def oldest(self) -> int:
+        return max(0, self.written - self.capacity)
+
+    def intact(self, start: int) -> bool:
+        """True if samples from `start` on are neither overwritten nor inside the view being written.
+
+        Check it after copying out of segments() views: the writer may have
+        lapped the reader during the copy.
+        """
+        return start >= max(self.written, self.writing) - self.capacity
+
+    def wait_for(self, end: int, timeout: Optional[float] = None) -> bool:
+        """Block until sample `end - 1` is published (True) or the ring is closed short of it (False)."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.written >= end or self.closed, timeout) and self.written >= end
+
+    def segments(self, start: int, end: int) -> List:
+        """Views covering samples [start, end): one, or two when the range wraps."""
+        if start < self.oldest:
+            raise OverrunError(f"samples from {start} were overwritten (oldest is {self.oldest})")
+        if end > self.written:
+            raise ValueError("range extends past the written samples")
+        if end - start > self.capacity:
+            raise ValueError("range longer than the ring")
+        a, b = start % self.capacity, end % self.capacity
+        if end == start:
+            return []
+        if a < b or b == 0:
+            return [self.data[a:b or self.capacity]]
+        return [self.data[a:], self.data[:b]]
+
+    def frame(self, index: int):
+        """View of VAD frame `index` (frames never wrap)."""
+        start = index * self.frame_samples
+        return self.segments(start, start + self.frame_samples)[0]
+
+
+# ---- sources ----
+
+class WavSource:
+    """16-bit PCM WAV file read straight into the ring; realtime=True paces it like a live device."""
+
+    live = False  # may be made to wait, see RingBuffer.keep
+
+    def __init__(self, path: str, realtime: bool = False):
+        self.path = path
+        self.realtime = realtime
+        self._f = open(path, "rb")
+        self.sample_rate, self.channels, self._remaining = self._parse_header()
+        self._started = None
+        self._delivered = 0
+
+    def _parse_header(self):
+        f = self._f
+        riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave != b"WAVE":
+            raise ValueError(f"{self.path} is not a WAV file")
+        fmt = None
+        while True:
+            head = f.read(8)
+            if len(head) < 8:
+                raise ValueError(f"{self.path} has no data chunk")
+            cid, size = struct.unpack("<4sI", head)
+            if cid == b"fmt ":
+                fmt = struct.unpack("<HHIIHH", f.read(16))
+                f.seek(size - 16 + (size & 1), os.SEEK_CUR)
+            elif cid == b"data":
+                if fmt is None or fmt[0] != 1 or fmt[5] != 16:
+                    raise ValueError(f"{self.path}: only 16-bit PCM is supported")
+                return fmt[2], fmt[1], size
+            else:
+                f.seek(size + (size & 1), os.SEEK_CUR)
+
+    def readinto(self, view) -> int:
+        """Fill `view` (int16, samples x channels) from the file; returns samples read, 0 at EOF."""
+        nbytes = min(view.nbytes, self._remaining)
+        nbytes -= nbytes % (2 * self.channels)
+        if nbytes <= 0:
+            return 0
+        got = self._f.readinto(memoryview(view).cast("B")[:nbytes])
+        self._remaining -= got
+        n = got // (2 * self.channels)
+        if self.realtime:
+            if self._started is None:
+                self._started = time.monotonic()
+            self._delivered += n
+            delay = self._started + self._delivered / self.sample_rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return n
+
+    def close(self):
+        self._f.close()
+
+
+class SoundDeviceSource:
+    """Microphone capture via sounddevice; the device callback writes each block straight into the ring."""
+
+    live = True
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, channels: int = 1, block_ms: int = FRAME_MS, device=None):
+        if sounddevice is None:
+            raise RuntimeError("sounddevice not installed")
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.finished = threading.Event()  # set when the stream stops (limit reached, error, close)
+        self._ring: Optional[RingBuffer] = None
+        self._limit: Optional[int] = None
+        self._stream = sounddevice.RawInputStream(samplerate=sample_rate, channels=channels, dtype="int16",
+                                                  blocksize=sample_rate * block_ms // 1000, device=device,
+                                                  callback=self._callback, finished_callback=self.finished.set)
+
+    def attach(self, ring: RingBuffer, limit: Optional[int] = None):
+        """Start capturing into `ring`, stopping once it holds `limit` samples."""
+        self._ring, self._limit = ring, limit
+        self._stream.start()
+
+    def _callback(self, indata, frames, time_info, status):
+        ring = self._ring
+        if self._limit is not None:
+            frames = min(frames, self._limit - ring.written)
+        src = memoryview(indata).cast("B")
+        frame_bytes = 2 * self.channels
+        done = 0
+        while done < frames:
+            # at most two views: up to the end of the ring, then from its start
+            dst = ring.writable(frames - done)
+            n = len(dst)
+            memoryview(dst).cast("B")[:] = src[done * frame_bytes:(done + n) * frame_bytes]
+            ring.commit(n)
+            done += n
+        if self._limit is not None and ring.written >= self._limit:
+            raise sounddevice.CallbackStop
+
+    def stop(self):
+        self._stream.stop()
+
+    def close(self):
+        self._stream.close()
+        self.finished.set()
+
+
+class CaptureThread(threading.Thread):
+    """Moves audio from a source into a ring until the source ends or stop() is called.
+
+    Pull sources are read here; push sources (with attach()) write from their own
+    callback while this thread waits for them to finish.
+    """
+
+    def __init__(self, source, ring: RingBuffer, max_duration: Optional[float] = None):
+        super().__init__(name="addvar-capture", daemon=True)
+        self.source = source
+        self.ring = ring
+        self.limit = None if max_duration is None else int(max_duration * ring.sample_rate)
+        self._halt = threading.Event()
+
+    def run(self):
+        ring = self.ring
+        try:
+            if hasattr(self.source, "attach"):
+                self.source.attach(ring, self.limit)
+                while not self._halt.wait(0.05) and not self.source.finished.is_set():
+                    pass
+                self.source.stop()
+                return
+            while not self._halt.is_set():
+                want = ring.frame_samples
+                if self.limit is not None:
+                    want = min(want, self.limit - ring.written)
+                    if want <= 0:
+                        break
+                if not ring.reserve(want, 0.1):
+                    continue  # consumers still behind; re-check stop()
+                n = self.source.readinto(ring.writable(want))
+                if n <= 0:
+                    break
+                ring.commit(n)
+        finally:
+            ring.close()
+
+    def stop(self):
+        self._halt.set()
+
+
+# ---- voice activity chunking ----
+
+class Window(NamedTuple):
+    start: int  # absolute sample index
+    end: int
+    final: bool  # last window of its speech segment
+    segment: int  # speech segment number
+
+
+class VoiceActivityChunker:
+    """
+    Energy VAD over ring frames. A segment opens after `min_speech_ms` of frames
+    above `threshold` (RMS of int16 samples) and closes after `hangover_ms`
+    below it; `pre_roll_ms` of audio before the onset is included. While a
+    segment is open a window_s window is emitted every hop_s (so consecutive
+    windows overlap by window_s - hop_s); when it closes, one final window covers
+    its tail. Segments longer than max_segment_s are closed and reopened.
+`needed` is the oldest sample a future window can start at; it trails the
+newest frame by at most `lag` samples. If a live source
+overruns the chunker it skips ahead to the oldest sample still in the ring.
+    """
+
+    def __init__(self, ring: RingBuffer, threshold: float = 500.0, min_speech_ms: int = 90,
+                 hangover_ms: int = 450, pre_roll_ms: int = 150, window_s: float = 8.0, hop_s: float = 6.0,
+                 max_segment_s: float = 30.0):
+        self.ring = ring
+        fs = ring.frame_samples
+        rate = ring.sample_rate
+        self.threshold_sq = float(threshold) ** 2 * fs * ring.channels
+        self.onset = max(1, rate * min_speech_ms // 1000 // fs)
+        self.hangover = max(1, rate * hangover_ms // 1000 // fs)
+        self.pre_roll = rate * pre_roll_ms // 1000
+        self.window = int(window_s * rate)
+        self.hop = int(hop_s * rate)
+        self.max_segment = int(max_segment_s * rate)
+        self.segments = 0
+        self.needed = 0
+        # farthest `needed` trails the newest frame: while waiting for an onset, or for
+        # the final window of a segment in its hangover
+        self.lag = max(self.onset * fs + self.pre_roll, self.window + max(0, self.hangover - 2) * fs)
+
+    @staticmethod
+    def _energy(frame) -> float:
+        # sum of squares accumulated in int64, computed on the ring view itself
+        flat = frame.reshape(-1)
+        return float(np.einsum("i,i->", flat, flat, dtype=np.int64))
+
+    def windows(self, timeout: Optional[float] = None) -> Iterator[Window]:
+        """Yield windows as audio arrives until the ring is closed and drained."""
+        ring, fs = self.ring, self.ring.frame_samples
+        index = ring.oldest // fs
+        loud = quiet = 0
+        start = None  # open segment start (absolute sample)
+        next_end = None  # end of the next sliding window
+        while ring.wait_for((index + 1) * fs, timeout):
+            if ring.keep is not None:
+                ring.notify()  # `needed` moved on during the last frame
+            try:
+                voiced = self._energy(ring.frame(index)) >= self.threshold_sq
+            except OverrunError:
+                index = -(-ring.oldest // fs)  # first whole frame still in the ring
+                if start is not None:
+                    self.segments += 1  # the open segment's audio is gone; drop it
+                start, loud = None, 0
+                continue
+            index += 1
+            now = index * fs
+            if start is None:
+                loud = loud + 1 if voiced else 0
+                if loud >= self.onset:
+                    start = max(ring.oldest, now - loud * fs - self.pre_roll)
+                    next_end = start + self.window
+                    quiet = 0
+                    self.needed = start
+                else:
+                    self.needed = max(0, now - self.onset * fs - self.pre_roll)
+                continue
+            quiet = 0 if voiced else quiet + 1
+            while next_end <= now and next_end - start < self.max_segment:
+                yield Window(next_end - self.window, next_end, False, self.segments)
+                next_end += self.hop
+            if quiet >= self.hangover or now - start >= self.max_segment:
+                end = now - (quiet - 1) * fs if quiet >= self.hangover else now
+                yield Window(max(start, end - self.window), end, True, self.segments)
+                self.segments += 1
+                start, loud = None, 0
+                self.needed = max(0, now - self.onset * fs - self.pre_roll)
+            else:
+                # the next sliding window, or a final one ending where the current quiet run began
+                final_end = now - max(0, quiet - 1) * fs
+                self.needed = max(start, min(next_end, final_end) - self.window)
+        if start is not None and index * fs > start:
+            end = index * fs
+            yield Window(max(start, end - self.window), end, True, self.segments)
+            self.segments += 1
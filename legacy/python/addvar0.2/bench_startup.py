@@ -0,0 +1,93 @@
+"""Import-time / startup benchmark for the addvar service.
+
+Each run happens in a fresh interpreter, so nothing is cached between runs:
+
+    python bench_startup.py --repeat 5
+
+Reports (median over runs, seconds):
+- import:   importing the service module (should not pull in faiss/torch/openai)
+- startup:  running the app's startup handlers with warm-up disabled
+- warm_up:  loading the embedding model and running one encode
+- reload:   asking the registry for the model again (should be ~0)
+plus which heavy modules were already imported after `import main`.
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ("faiss", "torch", "sentence_transformers", "openai")
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _load_package(name="addvar"):
+    # the package directory is not importable by name, so load it explicitly
+    spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, "__init__.py"),
+                                                  submodule_search_locations=[HERE])
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[name] = mod
+    spec.loader.exec_module(mod)
+    return mod
+
+
+async def _run_handlers(handlers):
+    for handler in handlers:
+        result = handler()
+        if asyncio.iscoroutine(result):
+            await result
+
+
+def child():
+    os.environ["ADDVAR_WARMUP"] = "0"
+    result = {}
+    t0 = time.perf_counter()
+    _load_package()
+    main = importlib.import_module("addvar.main")
+    result["import"] = time.perf_counter() - t0
+    result["heavy_imported"] = [m for m in HEAVY_MODULES if m in sys.modules]
+    t0 = time.perf_counter()
+    asyncio.run(_run_handlers(main.app.router.on_startup))
+    result["startup"] = time.perf_counter() - t0
+    registry = importlib.import_module("addvar.model_registry")
+    try:
+        t0 = time.perf_counter()
+        registry.warm_up()
+        result["warm_up"] = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        registry.get_model()
+        result["reload"] = time.perf_counter() - t0
+    except Exception as e:
+        result["model_error"] = str(e)
+    asyncio.run(_run_handlers(main.app.router.on_shutdown))
+    print(json.dumps(result))
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark addvar import and startup time.")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = p.parse_args()
+    if args.child:
+        child()
+        return
+    runs = []
+    for _ in range(args.repeat):
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"],
+                             capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(out.strip().splitlines()[-1]))
+    for key in ("import", "startup", "warm_up", "reload"):
+        values = [r[key] for r in runs if key in r]
+        if values:
+            print(f"{key:8s} {statistics.median(values):8.3f}s")
+    print("heavy modules after import:", ", ".join(runs[-1]["heavy_imported"]) or "none")
+    if "model_error" in runs[-1]:
+        print("model:", runs[-1]["model_error"])
+
+
+if __name__ == "__main__":
+    main()
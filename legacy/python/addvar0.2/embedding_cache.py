@@ -0,0 +1,121 @@
+"""Content-addressed, on-disk embedding cache.
+
+Vectors are keyed by (model, sha1(text)). Each model gets an append-only
+`<model>.f32` file of raw float32 rows, which is memory-mapped for reads, plus a
+`<model>.keys` file with one hex digest per row. A crash between the two
+appends only loses the unmatched tail, which is truncated from both files on the
+next load so new rows line up with their keys again; rows are never rewritten.
+
+Usage:
+    cache = EmbeddingCache("/var/lib/addvar/embeddings", "all-MiniLM-L6-v2")
+    vecs = cache.embed(texts, model_encode_fn)   # only unseen texts reach the model
+"""
+from typing import Callable, Dict, List, Optional
+import hashlib
+import os
+import re
+import threading
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, directory: str, model_name: str):
+        if np is None:
+            raise RuntimeError("Numpy not installed")
+        os.makedirs(directory, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.model_name = model_name
+        self.vec_path = os.path.join(directory, slug + ".f32")
+        self.key_path = os.path.join(directory, slug + ".keys")
+        self.dim: Optional[int] = None
+        self._rows: Dict[str, int] = {}
+        self._mm = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.key_path) or not os.path.exists(self.vec_path):
+            return
+        with open(self.key_path, "r", encoding="ascii") as f:
+            lines = f.read().split("\n")
+        if not lines or not lines[0].startswith("dim "):
+            return
+        self.dim = int(lines[0][4:])
+        # the last element follows the final newline: empty, or a partially written key
+        keys = [k for k in lines[1:-1] if len(k) == 40]
+        # only rows present in both files count; cut both back to them so appends stay aligned
+        row_bytes = 4 * self.dim
+        n = min(len(keys), os.path.getsize(self.vec_path) // row_bytes)
+        keys = keys[:n]
+        if os.path.getsize(self.vec_path) != n * row_bytes:
+            with open(self.vec_path, "r+b") as f:
+                f.truncate(n * row_bytes)
+        if len(lines) != n + 2 or lines[-1]:
+            with open(self.key_path, "w", encoding="ascii") as f:
+                f.write(f"dim {self.dim}\n" + "".join(k + "\n" for k in keys))
+        self._rows = {k: i for i, k in enumerate(keys)}
+        self._remap()
+
+    def _remap(self):
+        n = len(self._rows)
+        self._mm = np.memmap(self.vec_path, dtype="float32", mode="r", shape=(n, self.dim)) if n else None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get(self, text: str):
+        with self._lock:
+            row = self._rows.get(text_key(text))
+            return None if row is None else np.array(self._mm[row])
+
+    def put_many(self, keys: List[str], vecs):
+        vecs = np.ascontiguousarray(vecs, dtype="float32")
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vecs.shape[1])
+                with open(self.key_path, "w", encoding="ascii") as f:
+                    f.write(f"dim {self.dim}\n")
+                open(self.vec_path, "wb").close()
+            fresh = [i for i, k in enumerate(keys) if k not in self._rows]
+            if not fresh:
+                return
+            # vectors first: a key without its vector would be worse than the reverse
+            with open(self.vec_path, "ab") as f:
+                f.write(vecs[fresh].tobytes())
+            with open(self.key_path, "a", encoding="ascii") as f:
+                f.write("".join(keys[i] + "\n" for i in fresh))
+            for i in fresh:
+                self._rows[keys[i]] = len(self._rows)
+            self._remap()
+
+    def embed(self, texts: List[str], encode: Callable[[List[str]], object]):
+        """Embeddings for texts, calling encode() only for texts never seen before.
+
+        Duplicate texts within the batch are encoded once.
+        """
+        keys = [text_key(t) for t in texts]
+        missing: Dict[str, str] = {}
+        for k, t in zip(keys, texts):
+            if k not in self._rows and k not in missing:
+                missing[k] = t
+        self.misses += len(missing)
+        self.hits += len(texts) - len(missing)
+        if missing:
+            new_keys = list(missing)
+            self.put_many(new_keys, encode([missing[k] for k in new_keys]))
+        if not texts:
+            return np.empty((0, self.dim or 0), dtype="float32")
+        # put_many() from another thread may be between growing _rows and remapping
+        with self._lock:
+            rows = [self._rows[k] for k in keys]
+            return np.asarray(self._mm[rows], dtype="float32")
@@ -0,0 +1,181 @@
+"""Bulk log ingestion: NDJSON parsing for POST /logs/bulk and a streaming importer CLI.
+
+The service side is iter_ndjson_batches(): it consumes the request body chunk by
+chunk, splits it into lines, and yields validated entries in batches, so a bulk
+upload is never held in memory as a whole and each batch is stored, journaled
+and indexed in one go before the next part of the body is read (backpressure).
+
+The CLI streams a file to a running service:
+
+    python ingest.py tangents_index.csv --url http://127.0.0.1:8000
+    python ingest.py tangents_index.json --domain tangents
+    python ingest.py journal.jsonl --dry-run > logs.ndjson
+
+CSV/JSON rows produced by collect_tangents.py become {"domain", "text"} entries
+(text = snippet); rows that already carry "text" (and "domain") are sent as-is.
+Rows are posted in requests of --batch lines.
+"""
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+import argparse
+import csv
+import json
+import os
+import sys
+import urllib.request
+
+try:
+    import ijson
+except Exception:
+    ijson = None
+
+BATCH_SIZE = 1000
+MAX_LINE_BYTES = 1 << 20
+DEFAULT_DOMAIN = "unknown"
+
+
+def parse_entry(obj) -> Tuple[str, str]:
+    """(domain, text) for a decoded NDJSON line; raises ValueError if it is not a log entry."""
+    if not isinstance(obj, dict):
+        raise ValueError("expected a JSON object")
+    text = obj.get("text")
+    if not isinstance(text, str):
+        raise ValueError("'text' must be a string")
+    domain = obj.get("domain", DEFAULT_DOMAIN)
+    if not isinstance(domain, str):
+        raise ValueError("'domain' must be a string")
+    return domain, text
+
+
+async def iter_ndjson_batches(chunks: AsyncIterator[bytes], batch_size: int = BATCH_SIZE,
+                              max_line_bytes: int = MAX_LINE_BYTES):
+    """
+    Yield (entries, errors) per batch of up to batch_size lines.
+    entries: [(domain, text)]; errors: [{"line": n, "error": msg}] for rejected lines
+    (1-based line numbers). Blank lines are skipped.
+    """
+    pending = b""
+    line_no = 0
+    entries: List[Tuple[str, str]] = []
+    errors: List[Dict] = []
+
+    def take(line: bytes):
+        nonlocal line_no
+        line_no += 1
+        if not line.strip():
+            return
+        if len(line) > max_line_bytes:
+            errors.append({"line": line_no, "error": f"line longer than {max_line_bytes} bytes"})
+            return
+        try:
+            entries.append(parse_entry(json.loads(line)))
+        except (ValueError, UnicodeDecodeError) as e:
+            errors.append({"line": line_no, "error": str(e)})
+
+    skipping = False  # inside an oversized line, discarding up to its newline
+    async for chunk in chunks:
+        if skipping:
+            cut = chunk.find(b"\n")
+            if cut < 0:
+                continue
+            chunk, skipping = chunk[cut + 1:], False
+        pending += chunk
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            take(line)
+            if len(entries) + len(errors) >= batch_size:
+                yield entries, errors
+                entries, errors = [], []
+        if len(pending) > max_line_bytes:
+            take(pending)  # rejected as too long, without buffering the rest of it
+            pending, skipping = b"", True
+    if pending:
+        take(pending)
+    if entries or errors:
+        yield entries, errors
+
+
+def _iter_json_rows(path: str) -> Iterator[Dict]:
+    with open(path, "rb") as f:
+        if ijson is not None:
+            yield from ijson.items(f, "item")
+        else:
+            yield from json.load(f)
+
+
+def iter_rows(path: str) -> Iterator[Dict]:
+    """Rows of a .csv, .json (array) or .jsonl/.ndjson file, streamed where possible."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            yield from csv.DictReader(f)
+    elif ext == ".json":
+        yield from _iter_json_rows(path)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def row_entry(row: Dict, domain: Optional[str] = None) -> Optional[Dict]:
+    """Log entry for a tangent row ({"snippet", ...}) or an entry-shaped row; None to skip it."""
+    text = row.get("text")
+    if text is None:
+        text = row.get("snippet")
+    if not text:
+        return None
+    return {"domain": domain or row.get("domain") or DEFAULT_DOMAIN, "text": str(text)}
+
+
+def iter_ndjson_requests(entries: Iterable[Dict], batch: int) -> Iterator[bytes]:
+    buf: List[bytes] = []
+    for entry in entries:
+        buf.append(json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n")
+        if len(buf) >= batch:
+            yield b"".join(buf)
+            buf = []
+    if buf:
+        yield b"".join(buf)
+
+
+def post_bulk(url: str, body: bytes, index: bool = True) -> Dict:
+    req = urllib.request.Request(url.rstrip("/") + "/logs/bulk" + ("" if index else "?index=false"), data=body,
+                                 headers={"Content-Type": "application/x-ndjson"}, method="POST")
+    with urllib.request.urlopen(req) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+def main():
+    p = argparse.ArgumentParser(description="Stream tangent rows or log entries into the addvar service.")
+    p.add_argument("path", help=".csv / .json from collect_tangents.py, or .jsonl/.ndjson log entries")
+    p.add_argument("--url", default="http://127.0.0.1:8000")
+    p.add_argument("--domain", default=None, help="domain for every entry (default: the row's, else 'tangents' for tangent rows)")
+    p.add_argument("--batch", type=int, default=5000, help="entries per bulk request")
+    p.add_argument("--no-index", action="store_true", help="do not update the semantic index while importing")
+    p.add_argument("--dry-run", action="store_true", help="write NDJSON to stdout instead of posting")
+    args = p.parse_args()
+
+    def entries():
+        for row in iter_rows(args.path):
+            domain = args.domain or ("tangents" if "snippet" in row and "text" not in row else None)
+            entry = row_entry(row, domain)
+            if entry is not None:
+                yield entry
+
+    accepted = rejected = 0
+    for body in iter_ndjson_requests(entries(), args.batch):
+        if args.dry_run:
+            sys.stdout.buffer.write(body)
+            continue
+        res = post_bulk(args.url, body, index=not args.no_index)
+        accepted += res.get("accepted", 0)
+        rejected += res.get("rejected", 0)
+        for err in res.get("errors", []):
+            print(f"rejected line {err['line']}: {err['error']}", file=sys.stderr)
+    if not args.dry_run:
+        print(f"accepted {accepted}, rejected {rejected}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""Append-only, segmented write-ahead journal.
+
+Records are JSON objects framed as
+
+    <u32 length> <u32 crc32(payload)> <payload: compact UTF-8 JSON>
+
+in segment files `journal-00000001.wal`, `journal-00000002.wal`, ... A new segment
+is started once the current one passes `segment_bytes`.
+
+Writes are group-committed: append() only queues the encoded record, and one
+writer thread writes everything queued since its last commit with a single
+write() and a single fsync(), then completes all the waiting futures. Callers
+that await the future know their record is on disk. Throughput is therefore
+bounded by fsync latency times batch size, not by fsync latency alone.
+
+A commit whose write or fsync fails fails its futures and is cut back off the
+segment, so later records never follow a torn one; if even that fails the
+journal closes itself and further appends raise JournalError.
+
+replay() yields every record in order. A torn or corrupt record at the end of
+the last segment (a crash mid-write) is truncated away; damage anywhere else
+raises JournalError, because records after it cannot be trusted to follow on.
+
+Checkpointing: mark() commits everything queued before it and starts a new
+segment. Once a snapshot holding every record before the mark is safely
+written, retire(seq) deletes the older segments; from then on the snapshot is
+the only copy of those records.
+"""
+from concurrent.futures import Future
+from typing import Dict, Iterator, List, Optional, Tuple
+import asyncio
+import json
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+
+MAGIC = b"AVJ1"
+HEADER = struct.Struct("<II")
+SEGMENT_BYTES = 64 << 20
+_SEGMENT_RE = re.compile(r"^journal-(\d{8})\.wal$")
+
+
+class JournalError(Exception):
+    pass
+
+
+def encode_record(record: Dict) -> bytes:
+    payload = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _scan(data) -> Tuple[List[bytes], int]:
+    """Payloads of the valid records in a segment and the offset just past the last one."""
+    if data[:len(MAGIC)] != MAGIC:
+        return [], 0
+    payloads = []
+    pos, end = len(MAGIC), len(data)
+    while pos + HEADER.size <= end:
+        length, crc = HEADER.unpack_from(data, pos)
+        start = pos + HEADER.size
+        if start + length > end:
+            break
+        payload = bytes(data[start:start + length])
+        if zlib.crc32(payload) != crc:
+            break
+        payloads.append(payload)
+        pos = start + length
+    return payloads, pos
+
+
+class Journal:
+    def __init__(self, directory: str, segment_bytes: int = SEGMENT_BYTES, fsync: bool = True):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+        self._segments = sorted(int(m.group(1)) for m in map(_SEGMENT_RE.match, os.listdir(directory)) if m)
+        self._tail_checked = False
+        self._file = None
+        self._size = 0
+        self._cond = threading.Condition()
+        self._queue: List[Tuple[Optional[bytes], Future]] = []  # data None: a mark()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"records": 0, "commits": 0, "bytes": 0, "fsync_s": 0.0, "segments": len(self._segments),
+                      "retired": 0}
+
+    def _path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"journal-{seq:08d}.wal")
+
+    def replay(self) -> Iterator[Dict]:
+        """Yield every journaled record in order (call before the first append)."""
+        for i, seq in enumerate(self._segments):
+            last = i == len(self._segments) - 1
+            with open(self._path(seq), "rb") as f:
+                data = f.read()
+            payloads, good = _scan(data)
+            if good < len(data):
+                if not last:
+                    raise JournalError(f"corrupt record in {self._path(seq)} at offset {good}")
+                self._truncate(seq, good)
+            if last:
+                self._tail_checked = True
+            for payload in payloads:
+                yield json.loads(payload)
+
+    def _truncate(self, seq: int, size: int):
+        with open(self._path(seq), "r+b") as f:
+            if size == 0:
+                f.write(MAGIC)
+                size = len(MAGIC)
+            f.truncate(size)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _open_segment(self):
+        if self._segments and not self._tail_checked:
+            seq = self._segments[-1]
+            with open(self._path(seq), "rb") as f:
+                data = f.read()
+            _, good = _scan(data)
+            if good < len(data):
+                self._truncate(seq, good)
+            self._tail_checked = True
+        if self._segments and os.path.getsize(self._path(self._segments[-1])) < self.segment_bytes:
+            self._file = open(self._path(self._segments[-1]), "ab")
+            self._size = self._file.tell()
+            return
+        self._rotate()
+
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
+        seq = (self._segments[-1] if self._segments else 0) + 1
+        self._file = open(self._path(seq), "ab")
+        self._file.write(MAGIC)
+        self._size = len(MAGIC)
+        self._segments.append(seq)
+        self.stats["segments"] = len(self._segments)
+        # make the new file's directory entry durable too
+        dir_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def append(self, record: Dict) -> Future:
+        """Queue a record; the returned future completes once it is on disk."""
+        return self._enqueue(encode_record(record))
+
+    def mark(self) -> Future:
+        """Start a new segment once everything queued so far is committed.
+
+        The future's result is the new segment's number: every record appended
+        before the mark lives in an older segment, every later one in it or after.
+        """
+        return self._enqueue(None)
+
+    def retire(self, seq: int) -> int:
+        """Delete the segments numbered below `seq` (from mark()); returns how many went."""
+        removed = 0
+        # only the writer adds segments, at the end, and never one below a marked seq
+        while self._segments and self._segments[0] < seq:
+            os.remove(self._path(self._segments[0]))
+            self._segments.pop(0)
+            removed += 1
+        self.stats["segments"] = len(self._segments)
+        self.stats["retired"] += removed
+        return removed
+
+    def _enqueue(self, data: Optional[bytes]) -> Future:
+        fut: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise JournalError("journal is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="addvar-journal", daemon=True)
+                self._thread.start()
+            self._queue.append((data, fut))
+            self._cond.notify()
+        return fut
+
+    async def append_async(self, record: Dict):
+        await asyncio.wrap_future(self.append(record))
+
+    def _run(self):
+        try:
+            self._open_segment()
+        except Exception as e:
+            self._fail_all(e)
+            return
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    break
+                batch, self._queue = self._queue, []
+            group = []
+            for data, fut in batch:
+                if data is not None:
+                    group.append((data, fut))
+                    continue
+                # a mark: commit what was queued before it, then roll over
+                if group and not self._settle(group):
+                    return
+                group = []
+                self._mark(fut)
+            if group and not self._settle(group):
+                return
+        self._file.close()
+
+    def _settle(self, group) -> bool:
+        """Commit a group and complete its futures; False once the journal had to stop."""
+        try:
+            self._commit(group)
+        except Exception as e:
+            for _, fut in group:
+                fut.set_exception(e)
+            if self._file is None:
+                # could not roll the segment back: stop rather than append after a torn record
+                self._fail_all(e)
+                return False
+            return True
+        for _, fut in group:
+            fut.set_result(None)
+        return True
+
+    def _mark(self, fut: Future):
+        try:
+            # an empty segment already follows every earlier record
+            if self._size > len(MAGIC):
+                self._rotate()
+        except Exception as e:
+            fut.set_exception(e)
+            return
+        fut.set_result(self._segments[-1])
+
+    def _commit(self, batch):
+        # rotate between commits only, so a record never spans two segments
+        if self._size >= self.segment_bytes:
+            self._rotate()
+        data = b"".join(d for d, _ in batch)
+        try:
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                t0 = time.perf_counter()
+                os.fsync(self._file.fileno())
+                self.stats["fsync_s"] += time.perf_counter() - t0
+        except Exception:
+            self._rollback()
+            raise
+        self._size += len(data)
+        self.stats["records"] += len(batch)
+        self.stats["commits"] += 1
+        self.stats["bytes"] += len(data)
+
+    def _rollback(self):
+        """Cut whatever part of a failed commit reached the segment; leaves _file None if that fails too."""
+        seq, file, self._file = self._segments[-1], self._file, None
+        try:
+            file.close()  # may raise again flushing the same bytes; the fd is closed regardless
+        except Exception:
+            pass
+        self._truncate(seq, self._size)
+        self._file = open(self._path(seq), "ab")
+
+    def _fail_all(self, exc):
+        with self._cond:
+            self._closed = True
+            batch, self._queue = self._queue, []
+        for _, fut in batch:
+            fut.set_exception(exc)
+
+    def close(self):
+        """Commit everything queued, then stop the writer."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
@@ -0,0 +1,113 @@
+"""Inverted index for the keyword fallback mapper.
+
+Keeps token -> posting list of log ids (with term counts) for an append-only
+`logs` list, so a query only touches the postings of its own tokens and picks
+the top k with a heap instead of re-tokenising and sorting the whole corpus.
+
+Scoring modes:
+- "overlap": number of distinct query tokens a log shares with the query; same
+  results and order as the original full scan (ties and zero-score logs in id order)
+- "bm25": Okapi BM25 over the same tokens
+"""
+from typing import Dict, List, Optional
+import heapq
+import math
+
+SCORING_MODES = ("overlap", "bm25")
+
+
+def tokenize(text: str) -> List[str]:
+    return [t.lower() for t in text.split()]
+
+
+class InvertedIndex:
+    def __init__(self, logs: List[Optional[Dict]], k1: float = 1.2, b: float = 0.75):
+        # `logs` is append-only; a deleted entry is replaced by None
+        self.logs = logs
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[int]] = {}
+        self.freqs: Dict[str, List[int]] = {}  # parallel to postings: term count per log
+        self.doc_len: List[int] = []  # tokens per log, 0 for deleted
+        self.deleted = set()
+        self.total_len = 0
+        self.indexed = 0  # logs[:indexed] are in the index
+
+    @property
+    def live(self) -> int:
+        return self.indexed - len(self.deleted)
+
+    def update(self) -> int:
+        """Index logs appended since the last update; returns how many were added."""
+        end = len(self.logs)
+        for log_id in range(self.indexed, end):
+            self._add(log_id, self.logs[log_id])
+        added = end - self.indexed
+        self.indexed = end
+        return added
+
+    def _add(self, log_id: int, log: Optional[Dict]):
+        if log is None:
+            self.doc_len.append(0)
+            self.deleted.add(log_id)
+            return
+        tokens = tokenize(log.get("text", ""))
+        counts: Dict[str, int] = {}
+        for t in tokens:
+            counts[t] = counts.get(t, 0) + 1
+        for t, n in counts.items():
+            self.postings.setdefault(t, []).append(log_id)
+            self.freqs.setdefault(t, []).append(n)
+        self.doc_len.append(len(tokens))
+        self.total_len += len(tokens)
+
+    def remove(self, log_id: int) -> bool:
+        """Mark logs[log_id] deleted; its postings are skipped from then on."""
+        if log_id >= self.indexed or log_id in self.deleted:
+            return False
+        self.deleted.add(log_id)
+        self.total_len -= self.doc_len[log_id]
+        return True
+
+    def _scores(self, q_tokens, scoring: str) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        if scoring == "overlap":
+            for t in q_tokens:
+                for log_id in self.postings.get(t, ()):
+                    scores[log_id] = scores.get(log_id, 0) + 1
+        else:
+            n = max(self.live, 1)
+            avgdl = self.total_len / n or 1.0
+            k1, b = self.k1, self.b
+            for t in q_tokens:
+                ids = self.postings.get(t)
+                if not ids:
+                    continue
+                idf = math.log(1 + (n - len(ids) + 0.5) / (len(ids) + 0.5))
+                for log_id, tf in zip(ids, self.freqs[t]):
+                    norm = k1 * (1 - b + b * self.doc_len[log_id] / avgdl)
+                    scores[log_id] = scores.get(log_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+        for log_id in self.deleted.intersection(scores):
+            del scores[log_id]
+        return scores
+
+    def search(self, query: str, top_k: int = 5, scoring: str = "overlap") -> List[int]:
+        """Ids of the top_k logs for query, best first, ties by lower id.
+
+        When fewer than top_k logs share a token with the query, the rest is
+        filled with non-matching logs in id order, like the full-scan mapper.
+        """
+        if scoring not in SCORING_MODES:
+            raise ValueError(f"Unknown scoring mode: {scoring}")
+        self.update()
+        if top_k <= 0:
+            return []
+        scores = self._scores(set(tokenize(query)), scoring)
+        best = heapq.nsmallest(top_k, scores.items(), key=lambda item: (-item[1], item[0]))
+        ids = [log_id for log_id, _ in best]
+        log_id = 0
+        while len(ids) < top_k and log_id < self.indexed:
+            if log_id not in scores and log_id not in self.deleted:
+                ids.append(log_id)
+            log_id += 1
+        return ids
@@ -0,0 +1,173 @@
+"""Compact, domain-sharded log store.
+
+Logs are append-only and addressed by a dense global id (append order), exactly
+like the old in-memory list. Storage is columnar instead of one dict per log:
+
+- each domain is a shard holding its texts as one UTF-8 blob plus an offsets
+  array, and the (ascending) global ids of its logs
+- per global id only the shard number, the position in the shard and a
+  deleted flag are kept (9 bytes)
+
+so a log costs its UTF-8 text plus ~25 bytes, instead of a dict and two str
+objects. Records are materialised as {"domain", "text"} dicts only when read.
+
+LogStore behaves like the list it replaces for readers (len(), store[i] -> dict
+or None for deleted, slicing, iteration, append, clear/extend), so SemanticIndex
+and InvertedIndex use it unchanged. iter_range() serves paginated reads,
+optionally restricted to one domain, without touching other logs. apply()
+replays journal records.
+"""
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class _Shard:
+    __slots__ = ("domain", "ids", "offsets", "blob", "live")
+
+    def __init__(self, domain: str):
+        self.domain = domain
+        self.ids = array("Q")  # global ids, ascending
+        self.offsets = array("Q", [0])  # text i is blob[offsets[i]:offsets[i + 1]]
+        self.blob = bytearray()
+        self.live = 0
+
+    def text(self, pos: int) -> str:
+        return self.blob[self.offsets[pos]:self.offsets[pos + 1]].decode("utf-8")
+
+
+class LogStore:
+    def __init__(self, records: Iterable[Optional[Dict]] = ()):
+        self.clear()
+        self.extend(records)
+
+    def clear(self):
+        self._shards: List[_Shard] = []
+        self._shard_ids: Dict[str, int] = {}  # interned domain -> shard number
+        self._shard = array("I")  # global id -> shard number
+        self._pos = array("I")  # global id -> position in its shard
+        self._deleted = bytearray()
+        self._live = 0
+
+    def _shard_for(self, domain: str) -> int:
+        sid = self._shard_ids.get(domain)
+        if sid is None:
+            sid = self._shard_ids[domain] = len(self._shards)
+            self._shards.append(_Shard(domain))
+        return sid
+
+    def add(self, domain: str, text: str) -> int:
+        """Append a log and return its id."""
+        log_id = len(self._deleted)
+        sid = self._shard_for(domain)
+        shard = self._shards[sid]
+        shard.blob += text.encode("utf-8")
+        shard.offsets.append(len(shard.blob))
+        shard.ids.append(log_id)
+        shard.live += 1
+        self._shard.append(sid)
+        self._pos.append(len(shard.ids) - 1)
+        self._deleted.append(0)
+        self._live += 1
+        return log_id
+
+    def append(self, record: Optional[Dict]) -> int:
+        """List-style append; None appends an already-deleted placeholder (keeps ids aligned)."""
+        if record is None:
+            log_id = self.add("", "")
+            self.delete(log_id)
+            return log_id
+        return self.add(record.get("domain", "unknown"), record.get("text", ""))
+
+    def extend(self, records: Iterable[Optional[Dict]]):
+        for record in records:
+            self.append(record)
+
+    def delete(self, log_id: int) -> bool:
+        if not 0 <= log_id < len(self._deleted) or self._deleted[log_id]:
+            return False
+        self._deleted[log_id] = 1
+        self._shards[self._shard[log_id]].live -= 1
+        self._live -= 1
+        return True
+
+    def apply(self, record: Dict) -> bool:
+        """Apply a journal record ({"op": "add", "id", "domain", "text"} or {"op": "del", "id"}).
+
+        Idempotent, so a journal can be replayed over a snapshot that already
+        holds some of its records. Returns True if the store changed.
+        """
+        log_id = record["id"]
+        if record["op"] == "del":
+            return self.delete(log_id)
+        if log_id < len(self):
+            return False
+        while len(self) < log_id:
+            self.append(None)  # ids lost with an older snapshot stay unused
+        self.add(record.get("domain", "unknown"), record.get("text", ""))
+        return True
+
+    def __len__(self) -> int:
+        return len(self._deleted)
+
+    @property
+    def live_count(self) -> int:
+        return self._live
+
+    def _record(self, log_id: int) -> Optional[Dict]:
+        if self._deleted[log_id]:
+            return None
+        shard = self._shards[self._shard[log_id]]
+        return {"domain": shard.domain, "text": shard.text(self._pos[log_id])}
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self._record(i) for i in range(*key.indices(len(self)))]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("log id out of range")
+        return self._record(key)
+
+    def __iter__(self) -> Iterator[Optional[Dict]]:
+        for log_id in range(len(self)):
+            yield self._record(log_id)
+
+    def domains(self) -> Dict[str, int]:
+        """Live log count per domain."""
+        return {s.domain: s.live for s in self._shards if s.live}
+
+    def count(self, domain: Optional[str] = None) -> int:
+        if domain is None:
+            return self._live
+        sid = self._shard_ids.get(domain)
+        return 0 if sid is None else self._shards[sid].live
+
+    def iter_range(self, start: int = 0, domain: Optional[str] = None) -> Iterator[Tuple[int, Dict]]:
+        """Yield (id, record) for live logs with id >= start, in id order.
+
+        With `domain`, only that shard is read (starting with a bisect on its ids).
+        """
+        start = max(start, 0)
+        if domain is None:
+            for log_id in range(start, len(self)):
+                if not self._deleted[log_id]:
+                    yield log_id, self._record(log_id)
+            return
+        sid = self._shard_ids.get(domain)
+        if sid is None:
+            return
+        shard = self._shards[sid]
+        for pos in range(bisect_left(shard.ids, start), len(shard.ids)):
+            log_id = shard.ids[pos]
+            if not self._deleted[log_id]:
+                yield log_id, {"domain": shard.domain, "text": shard.text(pos)}
+
+    def page(self, start: int = 0, limit: int = 100, domain: Optional[str] = None):
+        """Up to `limit` live logs from id `start`: ([{"id", "domain", "text"}], next_start or None)."""
+        items = []
+        for log_id, record in self.iter_range(start, domain):
+            if len(items) == limit:
+                return items, log_id
+            items.append({"id": log_id, **record})
+        return items, None
@@ -1,12 +1,40 @@
-from fastapi import FastAPI
+from collections import deque
+from concurrent.futures import Future
+import asyncio
+import os
+import time
+
+from fastapi import BackgroundTasks, FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import Deque, List, Dict, Literal, Optional, Tuple
 from fastapi import HTTPException
 
+from .ingest import iter_ndjson_batches
+from .journal import Journal, SEGMENT_BYTES
+from .keyword_index import InvertedIndex
+from .log_store import LogStore
+from .metrics import (ERRORS, FALLBACKS, REQUEST_SECONDS, REQUESTS, RequestProfile, recent_profiles, render,
+                      should_profile, stage)
+from .result_cache import MISSING, RESULT_CACHE_SIZE, RESULT_CACHE_TTL, LRUCache, normalize_query
+
 app = FastAPI(title="addvar")
 
-# In-memory store of logs
-LOGS: List[Dict] = []
+# In-memory store of logs; append-only, a deleted entry reads as None so ids stay stable
+LOGS = LogStore()
+# token -> log id postings for the keyword fallback, kept in step with LOGS
+KEYWORDS = InvertedIndex(LOGS)
+# ADDVAR_JOURNAL_DIR: write-ahead journal that POST/DELETE /logs commit to before answering
+JOURNAL_DIR = os.getenv("ADDVAR_JOURNAL_DIR")
+JOURNAL: Optional[Journal] = None
+# journaled records not yet applied to LOGS, in journal order: (record, commit future); see _publish()
+_UNPUBLISHED: Deque[Tuple[Dict, Future]] = deque()
+# /map results keyed by (normalised query, top_k, mode, version); see _cache_version()
+RESULTS = LRUCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+# bumped on every change to LOGS and on POST /build_index; the semantic index keeps its own counter
+DATA_VERSION = 0
+# src.legacy.addvar_adapter, imported by the first /reconcile
+_ADAPTER = None
 
 class LogEntry(BaseModel):
     domain: str = "unknown"
@@ -15,55 +43,394 @@ class LogEntry(BaseModel):
 class MapRequest(BaseModel):
     query: str
     top_k: int = 5
+    scoring: Literal["overlap", "bm25"] = "overlap"  # keyword fallback only
+
+class MapBatchRequest(BaseModel):
+    queries: List[str]
+    top_k: int = 5
+    scoring: Literal["overlap", "bm25"] = "overlap"
+
+class SearchParams(BaseModel):
+    nprobe: Optional[int] = None  # IVF index types
+    ef_search: Optional[int] = None  # HNSW
+
+@app.middleware("http")
+async def instrument(request: Request, call_next):
+    t0 = time.perf_counter()
+    status = "500"
+    try:
+        if should_profile(request.headers.get("x-addvar-profile") == "1"):
+            with RequestProfile(f"{request.method} {request.url.path}"):
+                response = await call_next(request)
+        else:
+            response = await call_next(request)
+        status = str(response.status_code)
+        return response
+    finally:
+        # label by route template (/logs/{log_id}), not the raw path, to keep series bounded
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        REQUEST_SECONDS.observe(time.perf_counter() - t0, route=route, method=request.method)
+        REQUESTS.inc(route=route, method=request.method, status=status)
+
+def _journal_record(record: Dict) -> Future:
+    """Queue a record; it is applied to LOGS by _publish() once committed."""
+    commit = JOURNAL.append(record)
+    _UNPUBLISHED.append((record, commit))
+    return commit
+
+def _journal_add(domain: str, text: str) -> Tuple[int, Future]:
+    """Reserve the next log id and queue its add record."""
+    log_id = len(LOGS)
+    for record, _ in reversed(_UNPUBLISHED):
+        if record["op"] == "add":
+            log_id = record["id"] + 1
+            break
+    return log_id, _journal_record({"op": "add", "id": log_id, "domain": domain, "text": text})
+
+def _publish():
+    """Apply records whose commit finished to LOGS, in journal order.
+
+    Commits finish in append order, so after awaiting its own commit a request
+    can publish everything up to and including its record. An add whose commit
+    failed becomes a deleted placeholder, as replay leaves it; a failed delete
+    is dropped.
+    """
+    while _UNPUBLISHED and _UNPUBLISHED[0][1].done():
+        record, commit = _UNPUBLISHED.popleft()
+        if commit.exception() is None:
+            LOGS.apply(record)
+        elif record["op"] == "add":
+            LOGS.append(None)
+
+def _replay_journal(journal: Journal) -> int:
+    replayed = sum(1 for record in journal.replay() if LOGS.apply(record))
+    if replayed:
+        _bump_data_version()
+    return replayed
+
+def _bump_data_version():
+    global DATA_VERSION
+    DATA_VERSION += 1
+
+def _cache_version():
+    return (DATA_VERSION, index_version() if SEMANTIC_AVAILABLE else 0)
+
+def _index_new_logs():
+    # background batch: embeds everything posted since the last update in one call
+    try:
+        update_index()
+    except Exception:
+        ERRORS.inc(stage="index_update")
 
 @app.post("/logs")
-async def add_log(entry: LogEntry):
-    LOGS.append({"domain": entry.domain, "text": entry.text})
-    return {"status": "ok", "count": len(LOGS)}
+async def add_log(entry: LogEntry, background_tasks: BackgroundTasks):
+    if JOURNAL is None:
+        log_id = LOGS.add(entry.domain, entry.text)
+    else:
+        # commit first, then publish: a log is never visible before it is durable
+        log_id, commit = _journal_add(entry.domain, entry.text)
+        try:
+            with stage("journal_commit"):
+                await asyncio.wrap_future(commit)
+        finally:
+            _publish()
+    KEYWORDS.update()
+    _bump_data_version()
+    if SEMANTIC_AVAILABLE:
+        background_tasks.add_task(_index_new_logs)
+    return {"status": "ok", "id": log_id, "count": len(LOGS)}
+
+@app.post("/logs/bulk")
+async def add_logs_bulk(request: Request, index: bool = True):
+    """Ingest an NDJSON/JSONL body of {"domain", "text"} lines.
+
+    The body is parsed as it arrives. Each batch is stored, committed to the
+    journal and (with index=true) embedded before more of the body is read, so a
+    slow index slows the upload down instead of queueing unbounded work.
+    """
+    accepted = rejected = 0
+    first_id = None
+    errors: List[Dict] = []
+    async for entries, bad in iter_ndjson_batches(request.stream()):
+        rejected += len(bad)
+        errors.extend(bad[:max(0, 100 - len(errors))])
+        if not entries:
+            continue
+        if JOURNAL is None:
+            ids = [LOGS.add(domain, text) for domain, text in entries]
+        else:
+            ids, commits = zip(*(_journal_add(domain, text) for domain, text in entries))
+            # the batch may span several group commits; any of them can fail on its own
+            with stage("journal_commit"):
+                outcomes = await asyncio.gather(*map(asyncio.wrap_future, commits), return_exceptions=True)
+            _publish()
+            failed = next((o for o in outcomes if isinstance(o, BaseException)), None)
+            if failed is not None:
+                raise HTTPException(status_code=503, detail=f"journal commit failed after {accepted} accepted "
+                                                            f"logs: {failed}")
+        if first_id is None:
+            first_id = ids[0]
+        accepted += len(entries)
+        KEYWORDS.update()
+        _bump_data_version()
+        if SEMANTIC_AVAILABLE and index:
+            try:
+                await run_blocking(update_index)
+            except Exception:
+                ERRORS.inc(stage="index_update")
+    return {"status": "ok", "accepted": accepted, "rejected": rejected, "errors": errors,
+            "first_id": first_id, "count": len(LOGS)}
+
+@app.delete("/logs/{log_id}")
+async def delete_log(log_id: int):
+    if JOURNAL is None:
+        if not LOGS.delete(log_id):
+            raise HTTPException(status_code=404, detail="Log not found")
+    else:
+        pending = any(r["op"] == "del" and r["id"] == log_id for r, _ in _UNPUBLISHED)
+        if pending or not 0 <= log_id < len(LOGS) or LOGS[log_id] is None:
+            raise HTTPException(status_code=404, detail="Log not found")
+        # like adds: commit first, then apply, so the log never disappears unless the delete is durable
+        commit = _journal_record({"op": "del", "id": log_id})
+        try:
+            with stage("journal_commit"):
+                await asyncio.wrap_future(commit)
+        finally:
+            _publish()
+    KEYWORDS.remove(log_id)
+    _bump_data_version()
+    if SEMANTIC_AVAILABLE:
+        await run_blocking(remove_from_index, log_id)
+    return {"status": "ok"}
 
 # keyword-overlap fallback
-def map_query(query: str, logs: List[Dict], top_k: int = 5):
-    """Simple keyword-overlap mapper: returns logs sorted by number of shared tokens with query."""
-    q_tokens = set([t.lower() for t in query.split() if t.strip()])
-    scored = []
-    for i, l in enumerate(logs):
-        tokens = set([t.lower() for t in l.get("text", "").split() if t.strip()])
-        score = len(q_tokens & tokens)
-        scored.append((score, i, l))
-    scored.sort(key=lambda x: (-x[0], x[1]))
-    return [item[2] for item in scored[:top_k]]
+def map_query(query: str, logs: List[Dict], top_k: int = 5, scoring: str = "overlap"):
+    """Simple keyword-overlap mapper: returns logs sorted by number of shared tokens with query.
+
+    Served from the inverted index; scoring="bm25" ranks by BM25 instead.
+    """
+    index = KEYWORDS if logs is LOGS else InvertedIndex(logs)
+    with stage("keyword_search"):
+        return [logs[i] for i in index.search(query, top_k, scoring)]
 
 # Semantic integration (optional)
 try:
-    from .semantic_integration import build_index, query_index
+    from .semantic_integration import (build_status, index_recall, index_version, load_snapshot,
+                                      query_cache_stats, query_index_batch, remove_from_index, run_blocking,
+                                      save_snapshot, set_search_params, shutdown, start_build, start_warm_up,
+                                      sync_index, update_index)
+    from .model_registry import loaded_models, timings
+    from .query_batcher import QueryBatcher
+    # concurrent /map requests share one encode call and one index search
+    BATCHER = QueryBatcher(query_index_batch, run=run_blocking)
     SEMANTIC_AVAILABLE = True
 except Exception:
     SEMANTIC_AVAILABLE = False
 
+async def _snapshot() -> bool:
+    """Save a snapshot, then retire the journal segments it covers.
+
+    The journal is marked first and everything committed before the mark is
+    published, so LOGS holds every record of the older segments by the time the
+    snapshot reads it; they are only deleted once the snapshot is written.
+    """
+    mark = None
+    if JOURNAL is not None:
+        mark = await asyncio.wrap_future(JOURNAL.mark())
+        _publish()
+    if not await run_blocking(save_snapshot):
+        return False
+    if mark is not None:
+        await asyncio.get_running_loop().run_in_executor(None, JOURNAL.retire, mark)
+    return True
+
+@app.on_event("startup")
+async def restore_state():
+    global JOURNAL
+    loaded = replayed = False
+    # ADDVAR_SNAPSHOT_DIR: reload logs and the built index instead of re-embedding
+    if SEMANTIC_AVAILABLE:
+        if os.getenv("ADDVAR_WARMUP", "1") != "0":
+            # not awaited: the API is up before the model has finished loading
+            start_warm_up()
+        try:
+            loaded = await run_blocking(load_snapshot, LOGS)
+        except Exception:
+            pass
+    # then replay the journal on top; records the snapshot already holds are skipped
+    if JOURNAL_DIR:
+        JOURNAL = Journal(JOURNAL_DIR,
+                          segment_bytes=int(os.getenv("ADDVAR_JOURNAL_SEGMENT_MB", "0")) << 20 or SEGMENT_BYTES,
+                          fsync=os.getenv("ADDVAR_JOURNAL_FSYNC", "1") != "0")
+        replayed = await asyncio.get_running_loop().run_in_executor(None, _replay_journal, JOURNAL)
+    # the snapshot may hold logs added after its last index update, too
+    if (loaded or replayed) and SEMANTIC_AVAILABLE:
+        await run_blocking(sync_index)
+
+@app.on_event("shutdown")
+async def write_snapshot():
+    global JOURNAL
+    if SEMANTIC_AVAILABLE:
+        try:
+            await _snapshot()
+        except Exception:
+            pass
+        shutdown()
+    if JOURNAL is not None:
+        JOURNAL.close()
+        JOURNAL = None
+    if _ADAPTER is not None:
+        _ADAPTER.shutdown_pool()
+
+def _result_key(query: str, top_k: int, scoring: str, version) -> tuple:
+    """Cache key for the ranking that will answer this query: semantic ignores `scoring`, keyword does not."""
+    mode = ("semantic", None) if SEMANTIC_AVAILABLE else ("keyword", scoring)
+    return (normalize_query(query), top_k) + mode + (version,)
+
 @app.post("/map")
 async def map_logs(req: MapRequest):
+    key = _result_key(req.query, req.top_k, req.scoring, _cache_version())
+    results = RESULTS.get(key)
+    if results is not MISSING:
+        return {"query": req.query, "results": results}
     if SEMANTIC_AVAILABLE:
         try:
-            results = query_index(req.query, req.top_k)
-            return {"query": req.query, "results": results}
-        except Exception:
-            # fallback to keyword overlap if semantic fails
-            mapped = map_query(req.query, LOGS, req.top_k)
-            return {"query": req.query, "results": mapped}
+            results = await BATCHER.submit(req.query, req.top_k)
+        except Exception as e:
+            # fallback to keyword overlap if semantic fails; not cached, the next call retries semantic
+            FALLBACKS.inc(endpoint="/map", reason=type(e).__name__)
+            return {"query": req.query, "results": map_query(req.query, LOGS, req.top_k, req.scoring)}
     else:
-        mapped = map_query(req.query, LOGS, req.top_k)
-        return {"query": req.query, "results": mapped}
+        results = map_query(req.query, LOGS, req.top_k, req.scoring)
+    RESULTS.put(key, results)
+    return {"query": req.query, "results": results}
+
+@app.post("/map/batch")
+async def map_logs_batch(req: MapBatchRequest):
+    """Answer many queries with one embedding call and one index pass; cached queries are skipped."""
+    version = _cache_version()
+    keys = [_result_key(q, req.top_k, req.scoring, version) for q in req.queries]
+    found = [RESULTS.get(k) for k in keys]
+    missing = list(dict.fromkeys(q for q, r in zip(req.queries, found) if r is MISSING))
+    fresh, cacheable = None, True
+    if missing and SEMANTIC_AVAILABLE:
+        try:
+            fresh = dict(zip(missing, await run_blocking(query_index_batch, missing, req.top_k)))
+        except Exception as e:
+            FALLBACKS.inc(len(missing), endpoint="/map/batch", reason=type(e).__name__)
+            cacheable = False  # keyword results must not be served later under the semantic key
+    if fresh is None:
+        # fallback to keyword overlap if semantic is off or fails
+        fresh = {q: map_query(q, LOGS, req.top_k, req.scoring) for q in missing}
+    results = []
+    for q, key, r in zip(req.queries, keys, found):
+        if r is MISSING:
+            r = fresh[q]
+            if cacheable:
+                RESULTS.put(key, r)
+        results.append({"query": q, "results": r})
+    return {"results": results}
+
+@app.get("/health")
+async def health():
+    status = {"status": "ok", "semantic": SEMANTIC_AVAILABLE, "logs": len(LOGS)}
+    if JOURNAL is not None:
+        status["journal"] = dict(JOURNAL.stats)
+    if SEMANTIC_AVAILABLE:
+        status.update(models=loaded_models(), timings=timings())
+    return status
+
+@app.get("/map/stats")
+async def map_stats():
+    """Micro-batching counters: batch sizes, queueing delay, latency and throughput."""
+    if not SEMANTIC_AVAILABLE:
+        return {"status": "error", "detail": "Semantic modules not available"}
+    return {"status": "ok", "stats": BATCHER.stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of request, stage, fallback and error metrics."""
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profiles")
+async def debug_profiles(limit: int = 5):
+    """cProfile reports of recent slow sampled requests (needs ADDVAR_PROFILE_SAMPLE > 0)."""
+    return {"profiles": recent_profiles(limit)}
+
+@app.get("/map/cache")
+async def map_cache_stats():
+    """Hit/miss/eviction counters of the /map result cache and the query-embedding cache."""
+    stats = {"results": RESULTS.stats(), "version": list(_cache_version())}
+    if SEMANTIC_AVAILABLE:
+        stats["query_vectors"] = query_cache_stats()
+    return {"status": "ok", "stats": stats}
 
 @app.get("/logs")
-async def list_logs():
-    return {"count": len(LOGS), "logs": LOGS}
+async def list_logs(start: int = 0, limit: int = 100, domain: Optional[str] = None):
+    """Page through live logs by id; pass `next` back as `start` for the following page."""
+    if not 0 < limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000")
+    logs, next_start = LOGS.page(start, limit, domain)
+    return {"count": LOGS.count(domain), "logs": logs, "next": next_start}
+
+@app.get("/logs/domains")
+async def list_domains():
+    return {"domains": LOGS.domains()}
 
 @app.post("/build_index")
-async def build_semantic_index():
+async def build_semantic_index(wait: bool = False):
+    """Start a background rebuild; poll GET /build_index, or pass wait=true to block until done.
+
+    /map keeps answering from the previous index until the new one is swapped in.
+    """
+    if not SEMANTIC_AVAILABLE:
+        return {"status": "error", "detail": "Semantic modules not available"}
+    _bump_data_version()  # the swap bumps the index version again when the build lands
+    job, future = start_build(LOGS)
+    if not wait:
+        return {"status": "accepted", "job": job}
+    await asyncio.wrap_future(future)
+    job = build_status()
+    if job["state"] == "error":
+        return {"status": "error", "detail": job["error"], "job": job}
+    return {"status": "ok", "job": job}
+
+@app.get("/build_index")
+async def semantic_index_status():
+    if not SEMANTIC_AVAILABLE:
+        return {"status": "error", "detail": "Semantic modules not available"}
+    return {"status": "ok", "job": build_status()}
+
+
+@app.get("/index/recall")
+async def semantic_index_recall(k: int = 10, sample: int = 200):
+    """Recall@k and per-query latency of the ANN index vs exact search."""
+    if sample < 1:
+        raise HTTPException(status_code=400, detail="sample must be at least 1")
     if not SEMANTIC_AVAILABLE:
         return {"status": "error", "detail": "Semantic modules not available"}
     try:
-        build_index(LOGS)
+        return {"status": "ok", "report": await run_blocking(index_recall, k, sample)}
+    except Exception as e:
+        return {"status": "error", "detail": str(e)}
+
+@app.post("/index/params")
+async def semantic_search_params(params: SearchParams):
+    if not SEMANTIC_AVAILABLE:
+        return {"status": "error", "detail": "Semantic modules not available"}
+    try:
+        set_search_params(nprobe=params.nprobe, ef_search=params.ef_search)
+        return {"status": "ok"}
+    except Exception as e:
+        return {"status": "error", "detail": str(e)}
+
+@app.post("/snapshot")
+async def snapshot_index():
+    if not SEMANTIC_AVAILABLE:
+        return {"status": "error", "detail": "Semantic modules not available"}
+    try:
+        if not await _snapshot():
+            return {"status": "error", "detail": "No index built or ADDVAR_SNAPSHOT_DIR not set"}
         return {"status": "ok"}
     except Exception as e:
         return {"status": "error", "detail": str(e)}
@@ -73,16 +440,46 @@ class ReconcileRequest(BaseModel):
     coherence_vector: List[Dict]
     deltas: Dict
 
+class ReconcileDeltasRequest(BaseModel):
+    deltas: Dict
+    coherence_vector: Optional[List[Dict]] = None  # seeds the held set on first use only
+
+
+def _legacy_adapter():
+    # imported on first use and kept; a failed import is retried on the next request
+    global _ADAPTER
+    if _ADAPTER is None:
+        from src.legacy import addvar_adapter
+        _ADAPTER = addvar_adapter
+    return _ADAPTER
+
 
 @app.post("/reconcile")
 async def reconcile(req: ReconcileRequest):
     try:
-        from src.legacy.addvar_adapter import reconcile_adapter
+        adapter = _legacy_adapter()
+    except Exception:
+        raise HTTPException(status_code=500, detail="Legacy adapter not available")
+    # runs in the adapter's worker process, so a slow reconcile does not block the API
+    with stage("reconcile"):
+        res = await adapter.reconcile_async(req.coherence_vector, req.deltas)
+    if isinstance(res, dict) and res.get('error'):
+        ERRORS.inc(stage="reconcile")
+        raise HTTPException(status_code=504 if res.get('timeout') else 500, detail=res['error'])
+    return {"status": "ok", "result": res}
+
+@app.post("/reconcile/deltas")
+async def reconcile_deltas(req: ReconcileDeltasRequest):
+    """Apply deltas to the coherence set the server holds; O(delta) per call, no vector round trip."""
+    try:
+        adapter = _legacy_adapter()
     except Exception:
         raise HTTPException(status_code=500, detail="Legacy adapter not available")
-    res = reconcile_adapter(req.coherence_vector, req.deltas)
+    with stage("reconcile"):
+        res = await adapter.reconcile_deltas_async(req.deltas, req.coherence_vector)
     if isinstance(res, dict) and res.get('error'):
-        raise HTTPException(status_code=500, detail=res['error'])
+        ERRORS.inc(stage="reconcile")
+        raise HTTPException(status_code=504 if res.get('timeout') else 500, detail=res['error'])
     return {"status": "ok", "result": res}
 
 if __name__ == "__main__":
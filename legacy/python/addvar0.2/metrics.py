@@ -0,0 +1,261 @@
+"""Lightweight in-process metrics with Prometheus text exposition.
+
+Counters and histograms are plain dicts of floats behind one lock, so recording
+costs a dict lookup and a bisect; nothing is imported beyond the stdlib and
+prometheus_client is not needed. render() produces the text format served by
+GET /metrics.
+
+    REQUESTS = counter("addvar_requests_total", "HTTP requests", ("route", "status"))
+    REQUESTS.inc(route="/map", status="200")
+    with STAGE_SECONDS.time(stage="embed"):
+        ...
+
+Profiling is opt-in: with ADDVAR_PROFILE_SAMPLE=0.01 about 1% of requests (and
+any request sent with an `X-Addvar-Profile: 1` header while sampling is on) run
+under cProfile, and those slower than ADDVAR_PROFILE_SLOW_MS keep their top
+functions in a small ring served by GET /debug/profiles. With sampling off the
+hook is a single comparison per request.
+
+A report covers the event-loop thread while the request runs (which includes
+callbacks of other requests interleaved with it) plus every call the request
+hands to a worker through profiled(), i.e. semantic_integration.run_blocking():
+each such call is profiled on its worker thread and merged into the report. Work
+on other threads (the journal writer, background tasks run after the response)
+is not included.
+"""
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+import cProfile
+import functools
+import io
+import os
+import pstats
+import random
+import threading
+import time
+
+# seconds; covers sub-millisecond searches up to multi-minute builds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 120.0)
+
+PROFILE_SAMPLE = float(os.getenv("ADDVAR_PROFILE_SAMPLE", "0"))
+PROFILE_SLOW_MS = float(os.getenv("ADDVAR_PROFILE_SLOW_MS", "250"))
+PROFILE_KEEP = int(os.getenv("ADDVAR_PROFILE_KEEP", "20"))
+
+_lock = threading.Lock()
+_metrics: Dict[str, "_Metric"] = {}
+
+
+def _label_str(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with _lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_label_str(self.labelnames, k)} {v:g}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], list] = {}  # key -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with _lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[i] += 1
+            row[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def render(self) -> List[str]:
+        with _lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = self.header()
+        bounds = ['le="%g"' % b for b in self.buckets] + ['le="+Inf"']
+        for key, row in items:
+            cumulative = 0
+            for bound, n in zip(bounds, row):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, bound)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {row[-1]:g}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+def _register(metric):
+    with _lock:
+        existing = _metrics.get(metric.name)
+        if existing is not None:
+            # modules may be re-imported (tests, reloads); keep one series per name
+            return existing
+        _metrics[metric.name] = metric
+        return metric
+
+
+def counter(name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+    return _register(Counter(name, help, labelnames))
+
+
+def histogram(name: str, help: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram(name, help, labelnames, buckets))
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        metrics = sorted(_metrics.values(), key=lambda m: m.name)
+    return "\n".join(line for m in metrics for line in m.render()) + "\n"
+
+
+# ---- service metrics ----
+
+REQUESTS = counter("addvar_http_requests_total", "HTTP requests by route, method and status",
+                   ("route", "method", "status"))
+REQUEST_SECONDS = histogram("addvar_http_request_duration_seconds", "HTTP request latency",
+                            ("route", "method"))
+STAGE_SECONDS = histogram("addvar_stage_duration_seconds",
+                          "Time spent in a hot-path stage (embed, search, keyword, build, ...)", ("stage",))
+FALLBACKS = counter("addvar_map_fallback_total", "Map queries answered by the keyword fallback", ("endpoint", "reason"))
+ERRORS = counter("addvar_errors_total", "Errors swallowed or reported by a stage", ("stage",))
+
+
+def stage(name: str):
+    """Context manager timing one stage into addvar_stage_duration_seconds."""
+    return STAGE_SECONDS.time(stage=name)
+
+
+# ---- opt-in profiler ----
+
+_profiles: deque = deque(maxlen=max(1, PROFILE_KEEP))
+_profiling = threading.local()
+# the profile of the request being handled; copied into tasks the request creates
+_current_profile: "ContextVar[Optional[RequestProfile]]" = ContextVar("addvar_profile", default=None)
+
+
+def should_profile(forced: bool = False) -> bool:
+    """Cheap per-request check; False unless sampling is enabled."""
+    if PROFILE_SAMPLE <= 0:
+        return False
+    if getattr(_profiling, "active", False):
+        return False  # one cProfile per thread at a time
+    return forced or random.random() < PROFILE_SAMPLE
+
+
+class RequestProfile:
+    """Profile the enclosed code; keep the report if it ran longer than PROFILE_SLOW_MS."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.profiler = cProfile.Profile()
+        self.workers: List[cProfile.Profile] = []  # finished profiles of calls run on worker threads
+        self._workers_lock = threading.Lock()
+
+    def __enter__(self):
+        _profiling.active = True
+        self._token = _current_profile.set(self)
+        self.t0 = time.perf_counter()
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.disable()
+        _current_profile.reset(self._token)
+        _profiling.active = False
+        elapsed_ms = (time.perf_counter() - self.t0) * 1000
+        if elapsed_ms >= PROFILE_SLOW_MS:
+            with self._workers_lock:
+                workers = list(self.workers)
+            out = io.StringIO()
+            stats = pstats.Stats(self.profiler, stream=out)
+            if workers:
+                stats.add(*workers)
+            stats.sort_stats("cumulative").print_stats(25)
+            _profiles.append({"label": self.label, "ms": round(elapsed_ms, 2), "at": time.time(),
+                              "threads": 1 + len(workers), "report": out.getvalue()})
+        return False
+
+    def run(self, fn, *args, **kwargs):
+        """Call fn under its own cProfile on this thread and add it to the report."""
+        if getattr(_profiling, "active", False):
+            return fn(*args, **kwargs)  # this thread is already being profiled
+        profiler = cProfile.Profile()
+        _profiling.active = True
+        profiler.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+            _profiling.active = False
+            with self._workers_lock:
+                self.workers.append(profiler)
+
+
+def profiled(fn):
+    """fn, or a wrapper profiling it into the current request's report on whichever thread runs it.
+
+    Call this on the request's side before handing fn to an executor; without a
+    profiled request it returns fn unchanged.
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        return fn
+    return functools.partial(profile.run, fn)
+
+
+def recent_profiles(limit: Optional[int] = None) -> List[Dict]:
+    items = list(_profiles)
+    return items[-limit:] if limit else items
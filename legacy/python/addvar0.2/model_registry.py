@@ -0,0 +1,83 @@
+"""Process-wide embedding model registry and lazy optional imports.
+
+Heavy optional dependencies (sentence-transformers/torch, faiss, openai) are only
+imported the first time something needs them, so importing the service stays
+cheap. Models are loaded once per process and shared by every SemanticIndex, so
+rebuilding an index never reloads the model. warm_up() loads the model and runs
+one encode ahead of the first request.
+"""
+from typing import Dict, Optional
+import importlib
+import os
+import threading
+import time
+
+# Try OpenAI
+USE_OPENAI = bool(os.getenv("OPENAI_API_KEY"))
+
+OPENAI_MODEL = "text-embedding-3-small"
+LOCAL_MODEL = "all-MiniLM-L6-v2"
+MODEL_NAME = OPENAI_MODEL if USE_OPENAI else LOCAL_MODEL
+
+_imports: Dict[str, object] = {}
+_models: Dict[str, object] = {}
+_timings: Dict[str, float] = {}
+_import_lock = threading.Lock()
+_model_lock = threading.Lock()
+
+
+def optional_import(name: str):
+    """Import module `name` on first use; None if it is not installed. Cached per process."""
+    try:
+        return _imports[name]
+    except KeyError:
+        pass
+    with _import_lock:
+        if name not in _imports:
+            t0 = time.perf_counter()
+            try:
+                _imports[name] = importlib.import_module(name)
+            except Exception:
+                _imports[name] = None
+            _timings["import:" + name] = time.perf_counter() - t0
+    return _imports[name]
+
+
+def get_model(name: Optional[str] = None):
+    """The shared model for `name`; "openai" stands for the OpenAI embeddings API."""
+    name = name or MODEL_NAME
+    if USE_OPENAI:
+        return "openai"
+    model = _models.get(name)
+    if model is not None:
+        return model
+    with _model_lock:
+        if name not in _models:
+            st = optional_import("sentence_transformers")
+            if st is None:
+                raise RuntimeError("No embedding model available. Install openai or sentence-transformers.")
+            t0 = time.perf_counter()
+            _models[name] = st.SentenceTransformer(name)
+            _timings["load:" + name] = time.perf_counter() - t0
+        return _models[name]
+
+
+def warm_up(name: Optional[str] = None) -> Dict[str, float]:
+    """Load the model and run one encode so the first request does not pay for it."""
+    name = name or MODEL_NAME
+    model = get_model(name)
+    optional_import("faiss")
+    if model != "openai":
+        t0 = time.perf_counter()
+        model.encode(["warm-up"], show_progress_bar=False)
+        _timings["warm_up:" + name] = time.perf_counter() - t0
+    return timings()
+
+
+def loaded_models():
+    return sorted(_models)
+
+
+def timings() -> Dict[str, float]:
+    """Seconds spent importing optional modules, loading and warming up models."""
+    return dict(_timings)
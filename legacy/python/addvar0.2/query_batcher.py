@@ -0,0 +1,106 @@
+"""Micro-batching for concurrent /map queries.
+
+QueryBatcher collects queries that arrive within `max_wait_ms` of each other (or
+until `max_batch` are waiting), answers them with one batched search call - one
+encode and one index search - and fans the results back out to the callers.
+Queries with different top_k are searched in separate calls, because ANN indexes
+do not guarantee that the top 3 are a prefix of the top 5 (ties, HNSW/IVF).
+
+Usage:
+    batcher = QueryBatcher(query_index_batch, run=run_blocking, max_batch=32, max_wait_ms=2)
+    results = await batcher.submit("voice journal", top_k=5)
+"""
+from typing import Callable, Dict, List, Optional
+import asyncio
+import os
+import time
+
+MAX_BATCH = int(os.getenv("ADDVAR_BATCH_MAX", "32"))
+MAX_WAIT_MS = float(os.getenv("ADDVAR_BATCH_WAIT_MS", "2"))
+
+
+class QueryBatcher:
+    def __init__(self, search_batch: Callable[[List[str], int], List[List[Dict]]], run=None,
+                 max_batch: int = MAX_BATCH, max_wait_ms: float = MAX_WAIT_MS):
+        """
+        search_batch(queries, top_k) answers a list of queries; it is blocking.
+        run(fn, *args) is an async runner for it (e.g. an executor); without one
+        it is called inline on the event loop.
+        """
+        self.search_batch = search_batch
+        self.run = run
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._pending = []  # (query, top_k, future, enqueued_at)
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._started = time.monotonic()
+        self._stats = {"requests": 0, "batches": 0, "errors": 0, "max_batch_seen": 0,
+                       "unique_queries": 0, "wait_ms_total": 0.0, "latency_ms_total": 0.0,
+                       "search_ms_total": 0.0}
+
+    async def submit(self, query: str, top_k: int = 5) -> List[Dict]:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((query, top_k, fut, time.perf_counter()))
+        self._stats["requests"] += 1
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await fut
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        groups: Dict[int, list] = {}
+        for item in batch:
+            groups.setdefault(item[1], []).append(item)
+        for top_k, group in groups.items():
+            asyncio.ensure_future(self._run_batch(group, top_k))
+
+    async def _run_batch(self, batch, top_k: int):
+        started = time.perf_counter()
+        # identical queries are searched once
+        queries = list(dict.fromkeys(q for q, _, _, _ in batch))
+        stats = self._stats
+        stats["batches"] += 1
+        stats["max_batch_seen"] = max(stats["max_batch_seen"], len(batch))
+        stats["unique_queries"] += len(queries)
+        try:
+            if self.run is not None:
+                results = await self.run(self.search_batch, queries, top_k)
+            else:
+                results = self.search_batch(queries, top_k)
+        except Exception as e:
+            stats["errors"] += 1
+            for _, _, fut, _ in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        done = time.perf_counter()
+        stats["search_ms_total"] += (done - started) * 1000
+        by_query = dict(zip(queries, results))
+        for q, _, fut, enqueued in batch:
+            stats["wait_ms_total"] += (started - enqueued) * 1000
+            stats["latency_ms_total"] += (done - enqueued) * 1000
+            if not fut.done():
+                fut.set_result(by_query[q])
+
+    def stats(self) -> Dict:
+        s = dict(self._stats)
+        answered = max(s["requests"] - len(self._pending), 1)
+        batches = max(s["batches"], 1)
+        elapsed = time.monotonic() - self._started
+        s.update(
+            max_batch=self.max_batch,
+            max_wait_ms=self.max_wait * 1000,
+            pending=len(self._pending),
+            avg_batch_size=answered / batches if s["batches"] else 0.0,
+            avg_wait_ms=s["wait_ms_total"] / answered,
+            avg_latency_ms=s["latency_ms_total"] / answered,
+            avg_search_ms=s["search_ms_total"] / batches,
+            throughput_qps=s["requests"] / elapsed if elapsed > 0 else 0.0,
+        )
+        return s
@@ -0,0 +1,72 @@
+"""Bounded LRU/TTL caches for /map results and query embeddings.
+
+Result keys include a version tuple that the service bumps whenever the logs or
+the index change (POST/DELETE /logs, bulk ingest, builds, index updates), so an
+entry can never be served once the data it was computed from has moved on; old
+versions simply age out of the LRU. Query embeddings depend only on the model
+and the query text, so that cache is kept across index rebuilds.
+"""
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+import os
+import threading
+import time
+
+RESULT_CACHE_SIZE = int(os.getenv("ADDVAR_RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_TTL = float(os.getenv("ADDVAR_RESULT_CACHE_TTL", "300"))
+QUERY_VECTOR_CACHE_SIZE = int(os.getenv("ADDVAR_QUERY_CACHE_SIZE", "4096"))
+
+MISSING = object()
+
+
+def normalize_query(query: str) -> str:
+    """Case-folded, whitespace-collapsed query text used in result cache keys."""
+    return " ".join(query.split()).casefold()
+
+
+class LRUCache:
+    def __init__(self, max_entries: int, ttl_s: Optional[float] = None):
+        """max_entries <= 0 disables the cache; ttl_s (seconds) expires entries by age."""
+        self.max_entries = max_entries
+        self.ttl = ttl_s if ttl_s and ttl_s > 0 else None
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def get(self, key: Hashable, default=MISSING):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and self.ttl is not None and time.monotonic() - item[0] > self.ttl:
+                del self._data[key]
+                self._stats["expired"] += 1
+                item = None
+            if item is None:
+                self._stats["misses"] += 1
+                return default
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return item[1]
+
+    def put(self, key: Hashable, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats, size=len(self._data), max_entries=self.max_entries, ttl_s=self.ttl)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -6,96 +6,398 @@ Otherwise fall back to sentence-transformers local model (all-MiniLM-L6-v2).
 Provides:
 - index_logs(logs): builds a vector index (FAISS) and stores metadata
 - query_index(query, top_k): returns top_k matching log entries
+- SemanticIndex.query_batch(queries, top_k): answers many queries with one
+  embedding call and one index search / matrix product
+- SemanticIndex.update() / remove(log_id): incremental maintenance; only logs
+  appended since the last build are embedded, deletes are tombstoned and the
+  store is compacted once tombstones pass `compact_ratio`
+- SemanticIndex(logs, cache=EmbeddingCache(...)): log texts are embedded through a
+  content-addressed on-disk cache, so unchanged texts are never embedded twice
+- SemanticIndex.save(path) / SemanticIndex.load(path): snapshot the built index
+  (vectors, FAISS index, row metadata and the logs) and reload it without
+  re-embedding; vectors are memory-mapped on load
+- SemanticIndex(logs, index_type=...): FAISS backend, one of INDEX_TYPES; all of
+  them use inner product on unit-length vectors (cosine similarity). IVF indexes
+  are trained on build; nprobe / ef_search trade recall for latency and
+  recall_report() measures that trade-off against exact search
+- the embedding model comes from model_registry: loaded once per process and
+  shared by every index; faiss / sentence-transformers / openai import lazily
 """
+from bisect import bisect_left
 from typing import List, Dict, Optional
+import json
+import math
 import os
+import shutil
+import time
 
 try:
     import numpy as np
 except Exception:
     np = None
 
-# Try OpenAI
-USE_OPENAI = bool(os.getenv("OPENAI_API_KEY"))
+from .model_registry import MODEL_NAME, OPENAI_MODEL, USE_OPENAI, get_model, optional_import
 
-if USE_OPENAI:
-    try:
-        import openai
-    except Exception:
-        openai = None
-else:
-    openai = None
+SNAPSHOT_VERSION = 2
 
-# Try sentence-transformers
-try:
-    from sentence_transformers import SentenceTransformer
-except Exception:
-    SentenceTransformer = None
+# FAISS index types: exact search, inverted lists (flat or product-quantised), graph
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+INDEX_TYPE = os.getenv("ADDVAR_INDEX_TYPE", "flat")
+NPROBE = int(os.getenv("ADDVAR_NPROBE", "16"))
+EF_SEARCH = int(os.getenv("ADDVAR_EF_SEARCH", "64"))
+# below this many vectors approximate indexes are not worth it (or cannot be trained)
+ANN_MIN_ROWS = 10000
+
+
+def _faiss():
+    # FAISS, sentence-transformers and openai are imported on first use
+    return optional_import("faiss")
+
+def top_k_rows(scores, top_k: int) -> List[List[int]]:
+    """Indices of the top_k scores in each row, best first, ties by lower index.
+
+    Same order as a stable full sort, but uses partial selection
+    (np.partition) and only sorts the k selected entries.
+    """
+    n = scores.shape[1]
+    k = min(top_k, n)
+    if k <= 0:
+        return [[] for _ in range(scores.shape[0])]
+    if k == n:
+        return [sorted(range(n), key=lambda i: -row[i]) for row in scores.tolist()]
+    kth = -np.partition(-scores, k - 1, axis=1)[:, k - 1]
+    rows = []
+    for row, v in zip(scores, kth):
+        above = np.flatnonzero(row > v)
+        ties = np.flatnonzero(row == v)[:k - len(above)]
+        idx = np.concatenate([above, ties])
+        rows.append(idx[np.lexsort((idx, -row[idx]))].tolist())
+    return rows
 
-# Try FAISS
-try:
-    import faiss
-except Exception:
-    faiss = None
 
 class SemanticIndex:
-    def __init__(self, logs: List[Dict]):
+    def __init__(self, logs: List[Dict], compact_ratio: float = 0.25, cache=None,
+                 index_type: str = INDEX_TYPE, nlist: Optional[int] = None, pq_m: int = 16,
+                 hnsw_m: int = 32, nprobe: int = NPROBE, ef_search: int = EF_SEARCH):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {index_type}")
+        # `logs` is append-only; a deleted entry is replaced by None
         self.logs = logs
+        self.compact_ratio = compact_ratio
+        self.cache = cache  # optional EmbeddingCache for log texts
+        self.index_type = index_type
+        self.nlist = nlist  # IVF lists; default ~4*sqrt(n), set when the index is trained
+        self.pq_m = pq_m  # IVF-PQ sub-quantizers (rounded down to a divisor of dim)
+        self.hnsw_m = hnsw_m
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self._reset()
+
+    def _reset(self):
         self.embeddings = None
+        self.normed = None  # unit-length embeddings for the numpy path
         self.index = None
-        self._model = None
+        self.row_ids: List[int] = []  # row -> position in logs, ascending
+        self.tombstones = set()  # rows whose log was deleted
+        self.indexed = 0  # logs[:indexed] have been embedded (or skipped as deleted)
+        self._emb_buf = None
+        self._norm_buf = None
+
+    @property
+    def count(self) -> int:
+        return len(self.row_ids)
 
     def _get_model(self):
-        if USE_OPENAI:
-            return "openai"
-        if SentenceTransformer is not None:
-            if self._model is None:
-                self._model = SentenceTransformer("all-MiniLM-L6-v2")
-            return self._model
-        raise RuntimeError("No embedding model available. Install openai or sentence-transformers.")
+        # shared per process, so a rebuild never reloads the model
+        return get_model(MODEL_NAME)
 
-    def build(self):
-        texts = [l.get("text", "") for l in self.logs]
+    def _embed_texts(self, texts: List[str]):
+        if self.cache is not None:
+            return self.cache.embed(texts, self._encode)
+        return self._encode(texts)
+
+    def _encode(self, texts: List[str]):
         model = self._get_model()
-        if USE_OPENAI and openai is not None:
+        openai = optional_import("openai") if USE_OPENAI else None
+        if openai is not None:
             # Use OpenAI embeddings
-            res = openai.Embedding.create(input=texts, model="text-embedding-3-small")
-            embs = [r["embedding"] for r in res.data]
-            self.embeddings = np.array(embs).astype("float32")
-        else:
-            if SentenceTransformer is None:
-                raise RuntimeError("sentence-transformers not installed")
-            embs = model.encode(texts, show_progress_bar=False)
-            self.embeddings = np.array(embs).astype("float32")
+            res = openai.Embedding.create(input=texts, model=OPENAI_MODEL)
+            return np.array([r["embedding"] for r in res.data]).astype("float32")
+        if model == "openai":
+            raise RuntimeError("openai not installed")
+        return np.asarray(model.encode(texts, show_progress_bar=False)).astype("float32")
+
+    def build(self):
+        self._reset()
+        self.update()
+
+    def update(self) -> int:
+        """Embed logs appended since the last build/update and add them to the index.
+
+        Returns the number of newly indexed logs.
+        """
+        return self.apply_update(*self.prepare_update())
+
+    def prepare_update(self):
+        """Embed the pending logs without touching the index.
+
+        Callers that serve queries concurrently run this outside their read lock
+        and only hold it for apply_update().
+        """
+        end = len(self.logs)
+        new = [(i, log) for i, log in enumerate(self.logs[self.indexed:end], self.indexed) if log is not None]
+        new_ids = [i for i, _ in new]
+        embs = self._embed_texts([log.get("text", "") for _, log in new]) if new else None
+        return end, new_ids, embs
+
+    def apply_update(self, end: int, new_ids: List[int], embs) -> int:
+        if new_ids:
+            self._append(embs, new_ids)
+        self.indexed = end
+        return len(new_ids)
+
+    def sync_deleted(self) -> int:
+        """Tombstone rows whose log was deleted behind the index's back (e.g. during a build)."""
+        gone = [log_id for row, log_id in enumerate(self.row_ids)
+                if self.logs[log_id] is None and row not in self.tombstones]
+        # remove() may compact, which renumbers rows, so look ids up one by one
+        return sum(1 for log_id in gone if self.remove(log_id))
+
+    def _append(self, embs, ids: List[int]):
+        n, dim = embs.shape
+        start = self.count
+        if self._emb_buf is None or start + n > len(self._emb_buf):
+            # grow geometrically so appends cost O(change), amortised
+            cap = max(start + n, 2 * (0 if self._emb_buf is None else len(self._emb_buf)), 1024)
+            buf = np.empty((cap, dim), dtype="float32")
+            nbuf = np.empty((cap, dim), dtype="float32")
+            if start:
+                buf[:start] = self._emb_buf[:start]
+                nbuf[:start] = self._norm_buf[:start]
+            self._emb_buf, self._norm_buf = buf, nbuf
+        self._emb_buf[start:start + n] = embs
+        # normalise once so each query is a single matrix product
+        norms = np.linalg.norm(embs, axis=1, keepdims=True)
+        self._norm_buf[start:start + n] = embs / (norms + 1e-10)
+        self.row_ids.extend(ids)
+        self.embeddings = self._emb_buf[:self.count]
+        self.normed = self._norm_buf[:self.count]
 
         # Build FAISS index if available, else keep numpy array
-        if faiss is not None:
-            dim = self.embeddings.shape[1]
-            self.index = faiss.IndexFlatL2(dim)
-            self.index.add(self.embeddings)
+        if _faiss() is not None:
+            normed = self._norm_buf[start:start + n]
+            if self.index is None:
+                self.index = self._make_index(normed)
+            self.index.add(normed)
+
+    def _make_index(self, train):
+        """New FAISS index for self.index_type, trained on `train` if it needs training.
+
+        Small corpora get an exact flat index whatever the type; the next build
+        or compaction past ANN_MIN_ROWS switches to the configured type.
+        """
+        n, dim = train.shape
+        faiss = _faiss()
+        ip = faiss.METRIC_INNER_PRODUCT
+        if self.index_type == "flat" or n < ANN_MIN_ROWS:
+            return faiss.IndexFlatIP(dim)
+        if self.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dim, self.hnsw_m, ip)
         else:
-            self.index = None
+            self.nlist = self.nlist or max(1, min(int(4 * math.sqrt(n)), n // 39))
+            quantizer = faiss.IndexFlatIP(dim)
+            if self.index_type == "ivf_flat":
+                index = faiss.IndexIVFFlat(quantizer, dim, self.nlist, ip)
+            else:
+                m = max(d for d in range(1, min(self.pq_m, dim) + 1) if dim % d == 0)
+                index = faiss.IndexIVFPQ(quantizer, dim, self.nlist, m, 8, ip)
+            index.train(train)
+        self._set_search_params(index)
+        return index
+
+    def _set_search_params(self, index):
+        if isinstance(index, _faiss().IndexHNSW):
+            index.hnsw.efSearch = self.ef_search
+        elif hasattr(index, "nprobe"):
+            index.nprobe = self.nprobe
+
+    def set_search_params(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+        """Tune search-time recall/latency without rebuilding (IVF: nprobe, HNSW: ef_search)."""
+        if nprobe is not None:
+            self.nprobe = nprobe
+        if ef_search is not None:
+            self.ef_search = ef_search
+        if self.index is not None:
+            self._set_search_params(self.index)
+
+    def remove(self, log_id: int) -> bool:
+        """Tombstone the row for logs[log_id]; compacts once tombstones pass compact_ratio."""
+        row = bisect_left(self.row_ids, log_id)
+        if row >= self.count or self.row_ids[row] != log_id or row in self.tombstones:
+            return False
+        self.tombstones.add(row)
+        if len(self.tombstones) > self.compact_ratio * self.count:
+            self.compact()
+        return True
+
+    def compact(self):
+        """Drop tombstoned rows and rebuild the index from the stored embeddings (no re-embedding)."""
+        if not self.tombstones:
+            return
+        keep = np.ones(self.count, dtype=bool)
+        keep[list(self.tombstones)] = False
+        embs = self.embeddings[keep]
+        ids = [i for i, k in zip(self.row_ids, keep.tolist()) if k]
+        indexed = self.indexed
+        self._reset()
+        self.indexed = indexed
+        if ids:
+            self._append(embs, ids)
+
+    def save(self, path: str):
+        """Snapshot the index into directory `path`, replacing any previous snapshot.
+
+        Written to a sibling temp directory first, so a crash never leaves a
+        half-written snapshot in place.
+        """
+        tmp, old = path + ".tmp", path + ".old"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        if self.count:
+            np.save(os.path.join(tmp, "embeddings.npy"), self.embeddings)
+            np.save(os.path.join(tmp, "normed.npy"), self.normed)
+            if self.index is not None:
+                _faiss().write_index(self.index, os.path.join(tmp, "index.faiss"))
+        meta = {
+            "version": SNAPSHOT_VERSION,
+            "model": MODEL_NAME,
+            "row_ids": self.row_ids,
+            "tombstones": sorted(self.tombstones),
+            "indexed": self.indexed,
+            "index_type": self.index_type,
+            "nlist": self.nlist,
+        }
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        with open(os.path.join(tmp, "logs.json"), "w", encoding="utf-8") as f:
+            json.dump(list(self.logs), f, ensure_ascii=False)
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.exists(path):
+            os.rename(path, old)
+        os.rename(tmp, path)
+        shutil.rmtree(old, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: str, compact_ratio: float = 0.25, cache=None, **params) -> "SemanticIndex":
+        """Reload a snapshot written by save().
+
+        Vectors are memory-mapped read-only; the first append copies them into
+        a growable buffer. Raises ValueError if the snapshot was built with a
+        different embedding model.
+        """
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != SNAPSHOT_VERSION or meta.get("model") != MODEL_NAME:
+            raise ValueError(f"Snapshot {path} does not match model {MODEL_NAME}")
+        with open(os.path.join(path, "logs.json"), "r", encoding="utf-8") as f:
+            logs = json.load(f)
+        params.setdefault("index_type", meta["index_type"])
+        params.setdefault("nlist", meta["nlist"])
+        si = cls(logs, compact_ratio=compact_ratio, cache=cache, **params)
+        si.indexed = meta["indexed"]
+        si.row_ids = meta["row_ids"]
+        si.tombstones = set(meta["tombstones"])
+        if si.row_ids:
+            si._emb_buf = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+            si._norm_buf = np.load(os.path.join(path, "normed.npy"), mmap_mode="r")
+            si.embeddings, si.normed = si._emb_buf, si._norm_buf
+            index_path = os.path.join(path, "index.faiss")
+            faiss = _faiss()
+            if faiss is not None:
+                if os.path.exists(index_path) and si.index_type == meta["index_type"]:
+                    si.index = faiss.read_index(index_path)
+                    si._set_search_params(si.index)
+                else:
+                    normed = np.ascontiguousarray(si.normed)
+                    si.index = si._make_index(normed)
+                    si.index.add(normed)
+        return si
+
+    def _embed_queries(self, queries: List[str]):
+        # queries bypass the cache: they are one-off and would only grow it
+        return self._encode(queries)
 
     def query(self, query: str, top_k: int = 5):
-        model = self._get_model()
-        if USE_OPENAI and openai is not None:
-            qres = openai.Embedding.create(input=[query], model="text-embedding-3-small")
-            qvec = np.array(qres.data[0]["embedding"]).astype("float32")
-        else:
-            qvec = model.encode([query])[0].astype("float32")
+        return self.query_batch([query], top_k)[0]
+
+    def query_batch(self, queries: List[str], top_k: int = 5) -> List[List[Dict]]:
+        """Return the top_k matching logs for each query, in query order."""
+        if not queries:
+            return []
+        if self.count - len(self.tombstones) <= 0 or top_k <= 0:
+            return [[] for _ in queries]
+        return self.search_vectors(self.embed_queries(queries), top_k)
 
+    def embed_queries(self, queries: List[str]):
+        """Unit-length float32 query vectors; reads no index state, so needs no lock."""
+        if np is None:
+            raise RuntimeError("Numpy not installed")
+        qvecs = self._embed_queries(queries)
+        qnorms = np.linalg.norm(qvecs, axis=1, keepdims=True)
+        return np.ascontiguousarray(qvecs / (qnorms + 1e-10), dtype="float32")
+
+    def search_vectors(self, qvecs, top_k: int = 5) -> List[List[Dict]]:
+        """Top_k logs for each row of qvecs (as returned by embed_queries)."""
+        live = self.count - len(self.tombstones)
+        if live <= 0 or top_k <= 0:
+            return [[] for _ in range(len(qvecs))]
         if self.index is not None:
-            D, I = self.index.search(np.array([qvec]), top_k)
-            results = [self.logs[int(i)] for i in I[0] if i != -1]
-            return results
+            rows = self._search_index(qvecs, top_k)
         else:
             # fallback to cosine similarity with numpy
-            if np is None:
-                raise RuntimeError("Numpy not installed")
-            embs = self.embeddings
-            # cosine similarity
-            def cos(a, b):
-                return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-10))
-            scores = [(cos(qvec, embs[i]), i) for i in range(len(embs))]
-            scores.sort(key=lambda x: -x[0])
-            return [self.logs[i] for _, i in scores[:top_k]]
+            rows = self._search_exact(qvecs, min(top_k, live))
+        return [[self.logs[self.row_ids[r]] for r in row] for row in rows]
+
+    def _search_index(self, qvecs, top_k: int) -> List[List[int]]:
+        # over-fetch so tombstoned rows can be filtered out
+        D, I = self.index.search(qvecs, min(top_k + len(self.tombstones), self.count))
+        results = []
+        for row in I:
+            rows = [int(r) for r in row if r != -1 and int(r) not in self.tombstones]
+            results.append(rows[:top_k])
+        return results
+
+    def _search_exact(self, qvecs, top_k: int) -> List[List[int]]:
+        scores = qvecs @ self.normed.T
+        if self.tombstones:
+            scores[:, list(self.tombstones)] = -np.inf
+        return top_k_rows(scores, top_k)
+
+    def recall_report(self, k: int = 10, sample: int = 200) -> Dict:
+        """Recall@k of the FAISS index against exact search, plus latency of both.
+
+        Uses up to `sample` stored vectors (evenly spaced) as queries, so nothing
+        is embedded. Run it after changing index_type / nprobe / ef_search.
+        Raises ValueError if sample < 1.
+        """
+        if sample < 1:
+            raise ValueError("sample must be at least 1")
+        live = self.count - len(self.tombstones)
+        report = {"index_type": self.index_type if self.index is not None else "numpy",
+                  "rows": live, "k": k, "nprobe": self.nprobe, "ef_search": self.ef_search}
+        if live <= 0 or k <= 0:
+            return {**report, "queries": 0, "recall": None}
+        step = max(1, self.count // sample)
+        qvecs = np.ascontiguousarray(self.normed[::step][:sample], dtype="float32")
+        k = min(k, live)
+        t0 = time.perf_counter()
+        exact = self._search_exact(qvecs, k)
+        flat_ms = (time.perf_counter() - t0) * 1000 / len(qvecs)
+        if self.index is None:
+            return {**report, "queries": len(qvecs), "recall": 1.0, "ann_ms": flat_ms, "flat_ms": flat_ms}
+        t0 = time.perf_counter()
+        approx = self._search_index(qvecs, k)
+        ann_ms = (time.perf_counter() - t0) * 1000 / len(qvecs)
+        hits = sum(len(set(a) & set(e)) for a, e in zip(approx, exact))
+        return {**report, "queries": len(qvecs), "recall": hits / sum(len(e) for e in exact),
+                "ann_ms": ann_ms, "flat_ms": flat_ms}
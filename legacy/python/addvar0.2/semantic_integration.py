@@ -1,16 +1,247 @@
-from .semantic import SemanticIndex
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .embedding_cache import EmbeddingCache
+from .metrics import ERRORS, profiled, stage
+from .model_registry import warm_up
+from .result_cache import LRUCache, QUERY_VECTOR_CACHE_SIZE
+from .semantic import MODEL_NAME, SemanticIndex, np
+
+# Optional persistence: embeddings cache and index snapshot directories
+CACHE_DIR = os.getenv("ADDVAR_CACHE_DIR")
+SNAPSHOT_DIR = os.getenv("ADDVAR_SNAPSHOT_DIR")
+# threads for embedding / search work; model encode and FAISS release the GIL
+WORKERS = int(os.getenv("ADDVAR_WORKERS", "4"))
 
 # Simple integration helpers
 _index = None
+_cache = None
+# _lock guards reads of the index and the swap; _write_lock serialises everything
+# that changes it, so embedding for an update never blocks queries
+_lock = threading.Lock()
+_write_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+_build = {"job": 0, "state": "idle"}
+_build_future = None
+# bumped (under _lock) whenever search results can change; part of /map cache keys
+_version = 0
+# (model, query) -> unit query vector; independent of the index, so kept across rebuilds
+_query_vectors = LRUCache(QUERY_VECTOR_CACHE_SIZE)
+
+
+def _bump():
+    global _version
+    _version += 1
+
+
+def index_version():
+    return _version
+
+
+def query_cache_stats():
+    return _query_vectors.stats()
+
+
+def _get_executor():
+    """The index executor; created on first use and again after shutdown()."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="addvar-index")
+        return _executor
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run a blocking index call on the index executor without stalling the event loop.
+
+    When the calling request is being profiled, the call is profiled on the worker too.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), profiled(functools.partial(fn, *args, **kwargs)))
+
+
+def start_warm_up():
+    """Load the embedding model in the background; the first query waits for it if needed."""
+    return _get_executor().submit(warm_up)
+
+
+def shutdown():
+    """Stop the index executor once queued work is done.
+
+    The next run_blocking() or start_build() starts a fresh one, so an app shut
+    down and started again in the same process (tests, reloads) keeps working.
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def _get_cache():
+    global _cache
+    if _cache is None and CACHE_DIR:
+        _cache = EmbeddingCache(CACHE_DIR, MODEL_NAME)
+    return _cache
+
 
 def build_index(logs):
+    """Build a fresh index and swap it in; queries use the previous index until then."""
     global _index
-    si = SemanticIndex(logs)
-    si.build()
-    _index = si
+    si = SemanticIndex(logs, cache=_get_cache())
+    with stage("build"):
+        si.build()
+    with _write_lock:
+        # catch up with logs posted or deleted while the build ran
+        si.update()
+        si.sync_deleted()
+        with _lock:
+            _index = si
+            _bump()
 
 
-def query_index(query, top_k=5):
+def _run_build(logs):
+    _build.update(state="running", started=time.time())
+    try:
+        build_index(logs)
+        save_snapshot()
+    except Exception as e:
+        ERRORS.inc(stage="build")
+        _build.update(state="error", error=str(e), finished=time.time())
+        return
+    _build.update(state="done", count=_index.count, finished=time.time())
+
+
+def start_build(logs):
+    """Start a background build; while one is pending or running, return that job instead."""
+    global _build, _build_future
+    with _lock:
+        if _build_future is not None and not _build_future.done():
+            return dict(_build), _build_future
+        _build = {"job": _build["job"] + 1, "state": "pending", "queued": time.time()}
+        _build_future = _get_executor().submit(_run_build, logs)
+        return dict(_build), _build_future
+
+
+def build_status():
+    return dict(_build)
+
+
+def save_snapshot(path=None):
+    """Snapshot the current index (and its logs); returns False if there is nothing to save."""
+    path = path or SNAPSHOT_DIR
+    # saving only reads the index, so queries keep running
+    with _write_lock:
+        if _index is None or not path:
+            return False
+        _index.save(path)
+        return True
+
+
+def load_snapshot(logs, path=None):
+    """Load a snapshot into the index and replace the contents of `logs` with its logs.
+
+    `logs` is updated in place so the caller's list stays the one the index reads.
+    Returns False when no usable snapshot exists.
+    """
+    global _index
+    path = path or SNAPSHOT_DIR
+    if not path or not os.path.exists(os.path.join(path, "meta.json")):
+        return False
+    si = SemanticIndex.load(path, cache=_get_cache())
+    logs.clear()
+    logs.extend(si.logs)
+    si.logs = logs
+    with _write_lock, _lock:
+        _index = si
+        _bump()
+    return True
+
+
+def update_index():
+    """Embed logs appended since the last build; returns how many were added (0 if no index)."""
+    with _write_lock:
+        si = _index
+        if si is None:
+            return 0
+        with stage("index_update"):
+            pending = si.prepare_update()
+        with _lock:
+            added = si.apply_update(*pending)
+            if added:
+                _bump()
+            return added
+
+
+def sync_index():
+    """Catch the index up with logs added or deleted behind its back (e.g. journal replay)."""
+    with _write_lock:
+        si = _index
+        if si is None:
+            return 0
+        pending = si.prepare_update()
+        with _lock:
+            added = si.apply_update(*pending)
+            si.sync_deleted()
+            _bump()
+        return added
+
+
+def remove_from_index(log_id):
+    with _write_lock, _lock:
+        if _index is None:
+            return False
+        removed = _index.remove(log_id)
+        if removed:
+            _bump()
+        return removed
+
+
+def index_recall(k=10, sample=200):
+    """Recall@k of the configured FAISS index type against exact search."""
     if _index is None:
         raise RuntimeError("Index not built")
-    return _index.query(query, top_k)
+    with _lock:
+        return _index.recall_report(k, sample)
+
+
+def set_search_params(nprobe=None, ef_search=None):
+    if _index is None:
+        raise RuntimeError("Index not built")
+    with _lock:
+        _index.set_search_params(nprobe=nprobe, ef_search=ef_search)
+        _bump()
+
+
+def query_index(query, top_k=5):
+    return query_index_batch([query], top_k)[0]
+
+
+def query_index_batch(queries, top_k=5):
+    si = _index
+    if si is None:
+        raise RuntimeError("Index not built")
+    # embed outside the lock; the vectors are valid for whichever index is current
+    if not queries or top_k <= 0:
+        return [[] for _ in queries]
+    with stage("embed"):
+        qvecs = _embed_queries(si, queries)
+    with stage("search"), _lock:
+        return _index.search_vectors(qvecs, top_k)
+
+
+def _embed_queries(si, queries):
+    """Query vectors via the query cache; only unseen queries are encoded (in one call)."""
+    vecs = [_query_vectors.get((MODEL_NAME, q), None) for q in queries]
+    missing = list(dict.fromkeys(q for q, v in zip(queries, vecs) if v is None))
+    if missing:
+        fresh = dict(zip(missing, si.embed_queries(missing)))
+        for q, v in fresh.items():
+            _query_vectors.put((MODEL_NAME, q), v)
+        vecs = [fresh[q] if v is None else v for q, v in zip(queries, vecs)]
+    return np.stack(vecs)
@@ -0,0 +1,12 @@
+"""Make the package importable as `addvar`; its directory name (addvar0.2) is not a valid module name."""
+import importlib.util
+import os
+import sys
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if "addvar" not in sys.modules:
+    _spec = importlib.util.spec_from_file_location("addvar", os.path.join(PACKAGE_DIR, "__init__.py"),
+                                                   submodule_search_locations=[PACKAGE_DIR])
+    sys.modules["addvar"] = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(sys.modules["addvar"])
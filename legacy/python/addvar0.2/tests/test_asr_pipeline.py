@@ -0,0 +1,121 @@
+import wave
+
+import numpy as np
+import pytest
+
+from addvar.asr_pipeline import StreamingASR, StubTranscriber
+from addvar.audio_buffer import OverrunError, RingBuffer, VoiceActivityChunker, WavSource, Window
+
+RATE = 16000
+FRAME = RATE * 30 // 1000  # VAD frame: 480 samples
+PRE_ROLL = RATE * 150 // 1000
+# tone bursts (start, end) in samples, on frame boundaries
+BURSTS = [(32 * FRAME, 128 * FRAME), (160 * FRAME, 192 * FRAME)]
+VAD = dict(window_s=1.0, hop_s=0.5)
+
+
+@pytest.fixture(scope="module")
+def wav_path(tmp_path_factory):
+    audio = np.zeros(7 * RATE, dtype=np.int16)
+    for start, end in BURSTS:
+        t = np.arange(end - start) / RATE
+        audio[start:end] = (np.sin(2 * np.pi * 220 * t) * 8000).astype(np.int16)
+    path = tmp_path_factory.mktemp("audio") / "bursts.wav"
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(RATE)
+        w.writeframes(audio.tobytes())
+    return str(path)
+
+
+def expected_windows():
+    window, hop = RATE, RATE // 2
+    hangover = RATE * 450 // 1000 // FRAME  # quiet frames that close a segment
+    out = []
+    for segment, (start, end) in enumerate(BURSTS):
+        start -= PRE_ROLL
+        closed_at = end + hangover * FRAME
+        final_end = end + FRAME  # the final window ends one frame after the speech
+        next_end = start + window
+        # sliding windows keep coming until the segment closes
+        while next_end <= closed_at:
+            out.append(Window(next_end - window, next_end, False, segment))
+            next_end += hop
+        out.append(Window(max(start, final_end - window), final_end, True, segment))
+    return out
+
+
+def run(path, transcriber=None, **kwargs):
+    asr = StreamingASR(WavSource(path), transcriber or StubTranscriber(), **VAD, **kwargs)
+    asr.start()
+    results = list(asr.iter_results())
+    asr.join(5)
+    return asr, results
+
+
+def test_window_boundaries(wav_path):
+    asr, results = run(wav_path)
+    got = [(r.segment, round(r.start_s * RATE), round(r.end_s * RATE), r.final) for r in results]
+    assert got == [(w.segment, w.start, w.end, w.final) for w in expected_windows()]
+    assert asr.stats["overruns"] == 0
+    assert asr.stats["windows"] == len(results)
+
+
+def smallest_ring():
+    lag = VoiceActivityChunker(RingBuffer(60.0, RATE), **VAD).lag
+    frames = -(-(lag + 2 * FRAME) // FRAME)
+    return RingBuffer(frames * FRAME / RATE, RATE)
+
+
+def test_small_ring_backpressure_is_lossless(wav_path):
+    _, reference = run(wav_path)
+    # the smallest ring StreamingASR accepts: capture has to wait for recognition
+    ring = smallest_ring()
+    asr, results = run(wav_path, StubTranscriber(delay_s=0.005), ring=ring, batch_size=1)
+    assert ring.written == 7 * RATE
+    assert asr.stats["overruns"] == 0
+    assert results == reference  # same windows, same audio (rms) in each
+
+
+def test_ring_too_small_for_file_source(wav_path):
+    ring = smallest_ring()
+    with pytest.raises(ValueError):
+        StreamingASR(WavSource(wav_path), StubTranscriber(), ring=RingBuffer((ring.capacity - FRAME) / RATE, RATE),
+                     **VAD)
+
+
+def test_transcriber_error_reaches_iter_results(wav_path):
+    class Broken:
+        def transcribe_batch(self, audio, lengths, sample_rate):
+            raise RuntimeError("model crashed")
+
+    asr = StreamingASR(WavSource(wav_path), Broken(), ring=smallest_ring(), **VAD)
+    asr.start()
+    with pytest.raises(RuntimeError, match="model crashed"):
+        list(asr.iter_results())
+    asr.join(5)
+    assert not any(t.is_alive() for t in asr._threads)
+
+
+class _LiveSource:
+    sample_rate, channels, live = RATE, 1, True
+
+    def readinto(self, view):
+        return 0
+
+
+def test_fill_detects_overwrite_during_copy():
+    ring = RingBuffer(2.0, RATE)
+    asr = StreamingASR(_LiveSource(), StubTranscriber(), ring=ring, **VAD)
+    view = ring.writable(ring.capacity)
+    view[:] = 1000
+    ring.commit(len(view))
+    window = Window(0, RATE, False, 0)
+    row = np.zeros(RATE, dtype=np.float32)
+    assert asr._fill(row, window) == RATE
+    # the writer claims the next frame (samples 0..479 of the ring) while the row is copied
+    ring.writable(FRAME)
+    assert ring.oldest == 0  # nothing is published yet, so segments() alone cannot tell
+    with pytest.raises(OverrunError):
+        asr._fill(row, window)
@@ -0,0 +1,114 @@
+import time
+
+import pytest
+
+from addvar.voice import LOW, NORMAL, URGENT, PhraseCache, SilentEngine, TTSWorker
+
+# 1 ms of "audio" per character
+FAST = dict(rate=32000, bytes_per_char=32)
+
+
+def wait_until(pred, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not pred():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.002)
+    return True
+
+
+@pytest.fixture
+def worker():
+    w = TTSWorker(SilentEngine(**FAST))
+    yield w
+    w.close()
+
+
+def hold(worker):
+    """Start a long utterance and wait until it is speaking, so later ones stay queued."""
+    utt = worker.say("x" * 10000)  # ~10 s unless stopped
+    assert wait_until(lambda: utt.state == "speaking")
+    return utt
+
+
+def test_priority_order(worker):
+    first = hold(worker)
+    worker.say("low", LOW)
+    worker.say("normal", NORMAL)
+    worker.say("urgent", URGENT)
+    worker.say("normal again", NORMAL)
+    worker.cancel(first)
+    assert worker.wait_idle(2)
+    assert worker.engine.played[1:] == ["urgent", "normal", "normal again", "low"]
+
+
+def test_cancel_queued(worker):
+    first = hold(worker)
+    queued = worker.say("never spoken")
+    assert worker.cancel(queued)
+    assert queued.state == "cancelled" and queued.done.is_set()
+    worker.cancel(first)
+    assert worker.wait_idle(2)
+    assert "never spoken" not in worker.engine.played
+    assert not worker.cancel(queued)  # already finished
+
+
+def test_cancel_while_speaking(worker):
+    utt = hold(worker)
+    t0 = time.monotonic()
+    assert worker.cancel(utt)
+    assert utt.wait(1)
+    assert time.monotonic() - t0 < 1
+    assert utt.state == "cancelled"
+    assert worker.stats["spoken"] == 0
+
+
+def test_barge_in(worker):
+    current = hold(worker)
+    queued = [worker.say(f"queued {i}") for i in range(3)]
+    worker.barge_in()
+    assert current.wait(1)
+    assert [u.state for u in [current] + queued] == ["cancelled"] * 4
+    after = worker.say("after barge-in")
+    assert after.wait(2) and after.state == "done"
+    assert worker.engine.played[1:] == ["after barge-in"]
+
+
+def test_phrase_cache_hit():
+    cache = PhraseCache()
+    worker = TTSWorker(SilentEngine(**FAST), cache=cache)
+    try:
+        worker.say("noted").wait(2)
+        worker.say("  noted ").wait(2)  # same phrase after whitespace normalisation
+        assert worker.stats["cache_hits"] == 1
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert worker.stats["spoken"] == 2
+    finally:
+        worker.close()
+
+
+def test_phrase_cache_evicts_by_bytes():
+    cache = PhraseCache(max_bytes=10)
+    cache.put("a", b"12345")
+    cache.put("b", b"12345")
+    cache.get("a")  # a is now the most recently used
+    cache.put("c", b"12345")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"12345" and cache.get("c") == b"12345"
+
+
+def test_start_error_propagates():
+    class Broken(SilentEngine):
+        def start(self):
+            raise OSError("no audio device")
+
+    with pytest.raises(OSError, match="no audio device"):
+        TTSWorker(Broken())
+
+
+def test_closed_worker_rejects_say():
+    worker = TTSWorker(SilentEngine(**FAST))
+    worker.close()
+    with pytest.raises(RuntimeError):
+        worker.say("too late")
+    assert not worker._thread.is_alive()
@@ -1,23 +1,401 @@
-"""Voice I/O stubs for addvar.
+"""Voice I/O for addvar.
 
-These are minimal helpers. Replace or extend with real audio capture and ASR/voice model integration.
+Speech output goes through one long-lived TTSWorker: a thread that creates its
+engine once and speaks utterances taken from a priority queue, so callers never
+pay engine start-up and never block unless they ask to. Utterances can be
+cancelled while queued or speaking, and barge_in() (the user started talking)
+stops the current one and drops everything queued. Engines that can render
+audio ahead of playback get their output cached per phrase, so frequent replies
+("noted", "saved to journal") start playing immediately.
+
+The engine is pluggable: Pyttsx3Engine for real output, SilentEngine as a local
+stand-in that "plays" rendered audio in real time without a sound device.
+
+record() captures a fixed duration through the ring buffer in audio_buffer.py;
+asr_pipeline.StreamingASR does continuous capture with streaming recognition.
 """
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+import io
+import itertools
+import os
+import queue
+import tempfile
+import threading
+import time
 
 try:
     import pyttsx3
 except Exception:
     pyttsx3 = None
 
+try:
+    import simpleaudio
+except Exception:
+    simpleaudio = None
+
+URGENT, NORMAL, LOW = 0, 10, 20
+PHRASE_CACHE_BYTES = int(os.getenv("ADDVAR_TTS_CACHE_MB", "32")) << 20
+# longer texts are spoken directly: rendering them up front would delay the first audio
+PHRASE_MAX_CHARS = int(os.getenv("ADDVAR_TTS_CACHE_CHARS", "200"))
+
+
+class SilentEngine:
+    """Stand-in engine: renders `bytes_per_char` zero bytes per character and plays them at `rate` bytes/s."""
+
+    can_render = True
+
+    def __init__(self, rate: int = 32000, bytes_per_char: int = 2000, render_s_per_char: float = 0.0):
+        self.rate = rate
+        self.bytes_per_char = bytes_per_char
+        self.render_s_per_char = render_s_per_char  # simulated synthesis cost
+        self.played = []  # texts in the order their audio started
+
+    def start(self):
+        pass
+
+    def render(self, text: str) -> bytes:
+        if self.render_s_per_char:
+            time.sleep(self.render_s_per_char * len(text))
+        return bytes(self.bytes_per_char * max(1, len(text)))
+
+    def play(self, text: str, audio: bytes, stop: threading.Event, on_start: Callable[[], None]):
+        self.played.append(text)
+        on_start()
+        stop.wait(len(audio) / self.rate)
+
+    def speak(self, text: str, stop: threading.Event, on_start: Callable[[], None]):
+        # streams: audio starts right away, synthesis cost is spread over playback
+        self.played.append(text)
+        on_start()
+        stop.wait(self.bytes_per_char * max(1, len(text)) / self.rate)
+
+    def close(self):
+        pass
+
+
+class Pyttsx3Engine:
+    """pyttsx3 output. With simpleaudio installed, phrases are rendered to WAV first so they can be cached."""
+
+    def __init__(self, rate: Optional[int] = None, voice: Optional[str] = None):
+        if pyttsx3 is None:
+            raise RuntimeError("pyttsx3 not installed")
+        self.rate = rate
+        self.voice = voice
+        self.engine = None
+        self.can_render = simpleaudio is not None
+        self._on_start = None
+
+    def start(self):
+        # pyttsx3 engines belong to the thread that created them: call from the worker
+        self.engine = pyttsx3.init()
+        if self.rate:
+            self.engine.setProperty("rate", self.rate)
+        if self.voice:
+            self.engine.setProperty("voice", self.voice)
+        self.engine.connect("started-utterance", lambda name: self._on_start and self._on_start())
+
+    def render(self, text: str) -> bytes:
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            self.engine.save_to_file(text, path)
+            self.engine.runAndWait()
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+    def play(self, text: str, audio: bytes, stop: threading.Event, on_start: Callable[[], None]):
+        wave = simpleaudio.WaveObject.from_wave_file(io.BytesIO(audio))
+        play = wave.play()
+        on_start()
+        while play.is_playing():
+            if stop.wait(0.02):
+                play.stop()
+                break
+
+    def speak(self, text: str, stop: threading.Event, on_start: Callable[[], None]):
+        # no rendering: speak directly; barge-in interrupts via engine.stop()
+        self._on_start = on_start
+        try:
+            self.engine.say(text)
+            self.engine.runAndWait()
+        finally:
+            self._on_start = None
+
+    def interrupt(self):
+        if self.engine is not None:
+            self.engine.stop()
+
+    def close(self):
+        if self.engine is not None:
+            self.engine.stop()
+
+
+class PhraseCache:
+    """LRU of rendered audio by phrase text, bounded by total bytes."""
+
+    def __init__(self, max_bytes: int = PHRASE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    @staticmethod
+    def key(text: str) -> str:
+        return " ".join(text.split())
+
+    def get(self, text: str) -> Optional[bytes]:
+        with self._lock:
+            audio = self._data.get(self.key(text))
+            if audio is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(self.key(text))
+            self.hits += 1
+            return audio
+
+    def put(self, text: str, audio: bytes):
+        if len(audio) > self.max_bytes:
+            return
+        key = self.key(text)
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._data[key] = audio
+            self._bytes += len(audio)
+            while self._bytes > self.max_bytes:
+                _, dropped = self._data.popitem(last=False)
+                self._bytes -= len(dropped)
 
-def speak(text: str):
-    """Speak text via pyttsx3 if available."""
-    if pyttsx3 is None:
+
+class Utterance:
+    def __init__(self, uid: int, text: str, priority: int):
+        self.id = uid
+        self.text = text
+        self.priority = priority
+        self.state = "queued"  # queued -> speaking -> done | cancelled | error
+        self.error: Optional[str] = None
+        self.queued_at = time.perf_counter()
+        self.first_audio_at: Optional[float] = None
+        self.preload = False  # render into the phrase cache only
+        self.done = threading.Event()
+        self._stop = threading.Event()
+
+    @property
+    def latency(self) -> Optional[float]:
+        """Seconds from say() to the first audio."""
+        return None if self.first_audio_at is None else self.first_audio_at - self.queued_at
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self.done.wait(timeout)
+
+
+class TTSWorker:
+    def __init__(self, engine=None, cache: Optional[PhraseCache] = None):
+        """
+        engine: SilentEngine, Pyttsx3Engine or anything with the same start/render/
+        play/speak/close methods; defaults to Pyttsx3Engine.
+        cache: phrase cache for engines that can render (can_render) audio.
+        """
+        self.engine = engine if engine is not None else Pyttsx3Engine()
+        self.cache = cache if cache is not None else PhraseCache()
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._current: Optional[Utterance] = None
+        self._pending: Dict[int, Utterance] = {}
+        self._closed = False
+        self.stats = {"spoken": 0, "cancelled": 0, "errors": 0, "cache_hits": 0, "latency_s_total": 0.0}
+        self._started = threading.Event()
+        self._start_error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name="addvar-tts", daemon=True)
+        self._thread.start()
+        self._started.wait()
+        if self._start_error is not None:
+            # e.g. pyttsx3.init() with no audio device: fail here, not as say() calls that never finish
+            raise self._start_error
+
+    # ---- API ----
+
+    def say(self, text: str, priority: int = NORMAL, interrupt: bool = False) -> Utterance:
+        """Queue text; lower priority values are spoken first. interrupt=True barges in first."""
+        if interrupt:
+            self.barge_in()
+        return self._enqueue(text, priority)
+
+    def _enqueue(self, text: str, priority: int, preload: bool = False) -> Utterance:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("TTS worker is closed")
+            utt = Utterance(next(self._ids), text, priority)
+            utt.preload = preload
+            self._pending[utt.id] = utt
+        self._queue.put((priority, utt.id, utt))
+        return utt
+
+    def cancel(self, utt: Utterance) -> bool:
+        """Cancel a queued utterance or stop it mid-speech; False if it already finished."""
+        with self._lock:
+            if utt.done.is_set():
+                return False
+            if self._pending.pop(utt.id, None) is not None:
+                self._finish(utt, "cancelled")  # skipped when dequeued
+                return True
+            if self._current is utt:
+                utt._stop.set()
+                self._interrupt_engine()
+                return True
+        return False
+
+    def barge_in(self):
+        """Stop the current utterance and drop everything queued."""
+        with self._lock:
+            for utt in list(self._pending.values()):
+                self._finish(utt, "cancelled")
+            self._pending.clear()
+            current = self._current
+            if current is not None:
+                current._stop.set()
+        if current is not None:
+            self._interrupt_engine()
+
+    def preload(self, phrases):
+        """Render frequent phrases into the cache ahead of time (engines that can render only)."""
+        for text in phrases:
+            self._enqueue(text, LOW, preload=True)
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if not self._pending and self._current is None:
+                    return True
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.005)
+
+    def close(self, wait: bool = True):
+        with self._lock:
+            self._closed = True
+        self.barge_in()
+        self._queue.put((-1, 0, None))
+        if wait:
+            self._thread.join()
+
+    # ---- worker ----
+
+    def _interrupt_engine(self):
+        interrupt = getattr(self.engine, "interrupt", None)
+        if interrupt is not None:
+            interrupt()
+
+    def _finish(self, utt: Utterance, state: str):
+        utt.state = state
+        if state == "cancelled":
+            self.stats["cancelled"] += 1
+        utt.done.set()
+
+    def _run(self):
+        try:
+            self.engine.start()
+        except BaseException as e:
+            self._start_error = e
+            return
+        finally:
+            self._started.set()
+        while True:
+            _, _, utt = self._queue.get()
+            if utt is None:
+                break
+            with self._lock:
+                if self._pending.pop(utt.id, None) is None:
+                    continue  # cancelled while queued
+                self._current = utt
+                utt.state = "speaking"
+            try:
+                self._speak(utt)
+                with self._lock:
+                    self._finish(utt, "cancelled" if utt._stop.is_set() else "done")
+                    if utt.state == "done" and not utt.preload:
+                        self.stats["spoken"] += 1
+            except Exception as e:
+                utt.error = str(e)
+                self.stats["errors"] += 1
+                with self._lock:
+                    self._finish(utt, "error")
+            finally:
+                with self._lock:
+                    self._current = None
+        self.engine.close()
+
+    def _on_start(self, utt: Utterance):
+        if utt.first_audio_at is None:
+            utt.first_audio_at = time.perf_counter()
+            self.stats["latency_s_total"] += utt.latency
+
+    def _speak(self, utt: Utterance):
+        on_start = lambda: self._on_start(utt)
+        if not getattr(self.engine, "can_render", False) or len(utt.text) > PHRASE_MAX_CHARS:
+            if not utt.preload:
+                self.engine.speak(utt.text, utt._stop, on_start)
+            return
+        audio = self.cache.get(utt.text)
+        if audio is None:
+            audio = self.engine.render(utt.text)
+            self.cache.put(utt.text, audio)
+        else:
+            self.stats["cache_hits"] += 1
+        if utt.preload or utt._stop.is_set():
+            return
+        self.engine.play(utt.text, audio, utt._stop, on_start)
+
+
+_worker: Optional[TTSWorker] = None
+_worker_lock = threading.Lock()
+
+
+def get_worker(engine=None) -> TTSWorker:
+    """The process-wide TTS worker, started on first use (with `engine` if given)."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = TTSWorker(engine)
+        return _worker
+
+
+def speak(text: str, block: bool = True, priority: int = NORMAL, interrupt: bool = False) -> Utterance:
+    """Speak text through the shared worker; block=False returns as soon as it is queued."""
+    if pyttsx3 is None and _worker is None:
         raise RuntimeError("pyttsx3 not installed")
-    engine = pyttsx3.init()
-    engine.say(text)
-    engine.runAndWait()
+    utt = get_worker().say(text, priority, interrupt)
+    if block:
+        utt.wait()
+    return utt
+
+
+def record(duration: float = 3.0, source=None, sample_rate: int = 16000):
+    """Capture `duration` seconds as an int16 array (samples x channels).
+
+    Reads from the microphone (sounddevice) unless a source such as
+    audio_buffer.WavSource is given. For continuous capture with transcription
+    use asr_pipeline.StreamingASR.
+    """
+    from .audio_buffer import CaptureThread, RingBuffer, SoundDeviceSource, np
+    own = source is None
+    source = source or SoundDeviceSource(sample_rate)
+    try:
+        ring = RingBuffer(duration + 1.0, source.sample_rate, source.channels)
+        CaptureThread(source, ring, max_duration=duration).run()  # in this thread: returns when done
+        return np.concatenate(ring.segments(ring.oldest, ring.written)) if ring.written else ring.data[:0].copy()
+    finally:
+        if own:
+            source.close()
 
 
 def record_placeholder(duration: float = 3.0):
-    """Placeholder for audio recording. Implement using sounddevice or other library."""
-    raise NotImplementedError("Audio recording is a placeholder. Install `sounddevice` and implement capture.")
+    """Kept for existing callers; see record()."""
+    return record(duration)
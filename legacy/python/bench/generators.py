@@ -0,0 +1,111 @@
+"""
+Deterministic synthetic data for the benchmark suite.
+
+Every generator takes a seed and a size and returns the same data for the same
+arguments on every machine (random.Random only, no hash randomisation), so
+results from different runs are comparable.
+"""
+import json
+import os
+import random
+
+WORDS = ('the', 'memory', 'ledger', 'voice', 'journal', 'semantic', 'we', 'my', 'pipeline',
+         'resonance', 'translation', 'index', 'with', 'and', 'of', 'note', 'café', 'naïve',
+         'I', 'me', 'tangent', 'doctrine', 'signal', 'drift', 'recall', 'anchor')
+DOMAINS = ('journal', 'voice', 'ledger', 'tangents', 'doctrine', 'unknown')
+
+
+def _sentence(rnd, lo=4, hi=24):
+    return ' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(lo, hi)))
+
+
+def _tangent_line(rnd, density):
+    r = rnd.random()
+    if r < density:
+        return f'| Tangent_{rnd.randint(1, 5000)} | 2025{rnd.randint(1, 12):02d}{rnd.randint(1, 28):02d}T{rnd.randint(0, 2359):04d} | open |'
+    words = _sentence(rnd).split()
+    if r < 3 * density:
+        words.insert(rnd.randrange(len(words)), f'Tangent_{rnd.choice("ABCDEFG")}{rnd.randint(1, 99)}')
+    if r < 2 * density:
+        words.insert(rnd.randrange(len(words)), rnd.choice(('tangent.commit', 'tangent.scan', 'Tangent.Resolve')))
+    return ' '.join(words)
+
+
+def chat_export_tree(root, files=40, kb_per_file=256, seed=0, density=0.02):
+    """
+    Write a chat-export directory: conversations.json-style JSON exports and
+    markdown transcripts (half each, in nested folders) with tangent ids, calls,
+    timestamps and table rows. Returns the total bytes written.
+    """
+    rnd = random.Random(seed)
+    total = 0
+    for i in range(files):
+        folder = os.path.join(root, f'export_{i % 4}', f'part_{i % 3}')
+        os.makedirs(folder, exist_ok=True)
+        target = kb_per_file * 1024
+        if i % 2:
+            messages, size = [], 0
+            while size < target:
+                text = _tangent_line(rnd, density)
+                messages.append({'author': {'role': rnd.choice(('user', 'assistant'))},
+                                 'content': {'parts': [text]}, 'create_time': 1760000000 + len(messages)})
+                size += len(text) + 80
+            data = json.dumps({'title': f'conversation {i}', 'messages': messages}, ensure_ascii=False)
+            path = os.path.join(folder, f'conversation_{i}.json')
+        else:
+            lines, size = [], 0
+            while size < target:
+                line = rnd.choice(('user: ', 'assistant: ', '')) + _tangent_line(rnd, density)
+                lines.append(line)
+                size += len(line) + 1
+            data = '\n'.join(lines)
+            path = os.path.join(folder, f'transcript_{i}.md')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        total += len(data.encode('utf-8'))
+    return total
+
+
+def transcript_messages(n, seed=0, speakers=('Justin', 'Guide')):
+    """Parsed-transcript messages ({'speaker', 'text', 'timestamp'}) from named speakers."""
+    rnd = random.Random(seed)
+    out = []
+    for i in range(n):
+        speaker = speakers[i % len(speakers)]
+        text = _sentence(rnd, 8, 60)
+        if speaker == speakers[0] and rnd.random() < 0.6:
+            text = 'I think my ' + text  # the user leans first-person
+        out.append({'speaker': speaker, 'text': text, 'timestamp': ''})
+    return out
+
+
+def journal_logs(n, seed=0):
+    """Log entries ({'domain', 'text'}) like the ones POST /logs receives."""
+    rnd = random.Random(seed)
+    return [{'domain': rnd.choice(DOMAINS), 'text': _sentence(rnd, 6, 40)} for _ in range(n)]
+
+
+def queries(n, seed=0):
+    rnd = random.Random(seed + 1)
+    return [_sentence(rnd, 2, 6) for _ in range(n)]
+
+
+def coherence_vector(n, seed=0):
+    rnd = random.Random(seed)
+    return [{'id': f'c{i}', 'score': round(rnd.random(), 6), 'label': rnd.choice(WORDS)} for i in range(n)]
+
+
+def deltas_stream(vector, rounds, changes=10, seed=0):
+    """`rounds` delta dicts against `vector`, each adding, removing and changing ~`changes` ids."""
+    rnd = random.Random(seed)
+    live = [item['id'] for item in vector]
+    next_id = len(vector)
+    out = []
+    for _ in range(rounds):
+        removed = [live.pop(rnd.randrange(len(live))) for _ in range(min(changes, len(live) // 2))]
+        changed = [{'id': rnd.choice(live), 'score': round(rnd.random(), 6)} for _ in range(changes)] if live else []
+        added = [{'id': f'c{next_id + k}', 'score': round(rnd.random(), 6)} for k in range(changes)]
+        next_id += changes
+        live.extend(item['id'] for item in added)
+        out.append({'added': added, 'removed': removed, 'changed': changed})
+    return out
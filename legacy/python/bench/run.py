@@ -0,0 +1,269 @@
+"""
+Benchmark suite for the addvar hot paths, runnable offline.
+
+    python bench/run.py                         # small scale, print results
+    python bench/run.py --scale medium --out results.json
+    python bench/run.py --compare bench/baseline.json          # exit 1 on regression
+    python bench/run.py --save-baseline bench/baseline.json
+
+Covered: walk_and_collect/scan_file over a generated chat-export tree,
+infer_user_label on a long transcript, the keyword map_query path and
+SemanticIndex build/query as the log count grows, and ReconcileEngine seed/apply
+on large coherence vectors. All data comes from bench/generators.py with a fixed
+seed, and embeddings from a hashing stub model, so no network or model download
+is needed and two runs see identical inputs.
+
+Each metric is the median of --repeat runs. Metrics ending in `_s` are
+seconds (lower is better) and are the ones compared against a baseline; the
+others (throughput, sizes) are informational. A benchmark that raises, or a
+baseline metric the current run did not produce, fails the comparison too. A baseline only makes sense on
+the machine it was recorded on, so record one there before comparing.
+"""
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+ADDVAR01 = os.path.join(ROOT, 'addvar0.1')
+ADDVAR02 = os.path.join(ROOT, 'addvar0.2')
+sys.path.insert(0, HERE)
+sys.path.insert(0, ADDVAR01)
+
+import generators as gen  # noqa: E402
+
+SCALES = {
+    # files x KB per file, transcript messages, log counts, coherence vector sizes
+    'small': {'files': 16, 'kb': 128, 'messages': 20000, 'logs': (1000, 10000), 'vector': (10000, 100000)},
+    'medium': {'files': 40, 'kb': 512, 'messages': 100000, 'logs': (10000, 50000), 'vector': (100000, 500000)},
+    'large': {'files': 80, 'kb': 2048, 'messages': 500000, 'logs': (50000, 200000), 'vector': (500000, 2000000)},
+}
+STUB_DIM = 64
+
+
+class StubModel:
+    """Deterministic bag-of-hashed-tokens encoder standing in for sentence-transformers."""
+
+    def encode(self, texts, show_progress_bar=False, **kwargs):
+        import numpy as np
+        out = np.zeros((len(texts), STUB_DIM), dtype='float32')
+        for i, text in enumerate(texts):
+            for tok in text.lower().split():
+                out[i, int.from_bytes(hashlib.md5(tok.encode('utf-8')).digest()[:4], 'little') % STUB_DIM] += 1.0
+        return out
+
+
+def _load(name, path, package_dir=None):
+    kwargs = {'submodule_search_locations': [package_dir]} if package_dir else {}
+    spec = importlib.util.spec_from_file_location(name, path, **kwargs)
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[name] = mod
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def _service():
+    """The addvar0.2 package (loaded by path) with the stub model registered."""
+    if 'addvar_service' not in sys.modules:
+        os.environ.pop('OPENAI_API_KEY', None)
+        _load('addvar_service', os.path.join(ADDVAR02, '__init__.py'), ADDVAR02)
+        registry = importlib.import_module('addvar_service.model_registry')
+        registry._models[registry.MODEL_NAME] = StubModel()
+    return sys.modules['addvar_service']
+
+
+def timed(fn, repeat):
+    """(median seconds, last result) over `repeat` calls."""
+    times, out = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times), out
+
+
+# ---- benchmarks: each returns {metric: value} ----
+
+def bench_scan(cfg, seed, repeat, tmp):
+    import collect_tangents
+    root = os.path.join(tmp, 'exports')
+    size = gen.chat_export_tree(root, cfg['files'], cfg['kb'], seed)
+    secs, rows = timed(lambda: collect_tangents.walk_and_collect(root), repeat)
+    mb = size / (1024 * 1024)
+    return {'walk_and_collect_s': secs, 'walk_and_collect_mbps': mb / secs, 'tree_mb': mb, 'rows': len(rows)}
+
+
+def bench_labels(cfg, seed, repeat, tmp):
+    mod = sys.modules.get('collect_tangents_edit') or _load(
+        'collect_tangents_edit', os.path.join(ADDVAR01, 'collect_tangents_edit.1.py'))
+    messages = gen.transcript_messages(cfg['messages'], seed)
+    secs, _ = timed(lambda: mod.infer_user_label(messages), repeat)
+    return {'infer_user_label_s': secs, 'messages': len(messages)}
+
+
+def bench_keyword(cfg, seed, repeat, tmp):
+    _service()
+    store_mod = importlib.import_module('addvar_service.log_store')
+    kw_mod = importlib.import_module('addvar_service.keyword_index')
+    qs = gen.queries(50, seed)
+    out = {}
+    for n in cfg['logs']:
+        logs = store_mod.LogStore(gen.journal_logs(n, seed))
+        index = kw_mod.InvertedIndex(logs)
+        secs, _ = timed(index.update, 1)
+        out[f'keyword_build@{n}_s'] = secs
+        for scoring in ('overlap', 'bm25'):
+            secs, _ = timed(lambda: [index.search(q, 5, scoring) for q in qs], repeat)
+            out[f'map_query_{scoring}@{n}_s'] = secs / len(qs)
+    return out
+
+
+def bench_semantic(cfg, seed, repeat, tmp):
+    _service()
+    semantic = importlib.import_module('addvar_service.semantic')
+    store_mod = importlib.import_module('addvar_service.log_store')
+    qs = gen.queries(50, seed)
+    out = {}
+    for n in cfg['logs']:
+        logs = store_mod.LogStore(gen.journal_logs(n, seed))
+        si = semantic.SemanticIndex(logs)
+        secs, _ = timed(si.build, 1)
+        out[f'semantic_build@{n}_s'] = secs
+        secs, _ = timed(lambda: [si.query(q, 5) for q in qs], repeat)
+        out[f'semantic_query@{n}_s'] = secs / len(qs)
+        secs, _ = timed(lambda: si.query_batch(qs, 5), repeat)
+        out[f'semantic_query_batch50@{n}_s'] = secs
+    return out
+
+
+def bench_reconcile(cfg, seed, repeat, tmp):
+    mod = sys.modules.get('legacy_addvar') or _load('legacy_addvar', os.path.join(ADDVAR01, 'addvar.py'))
+    out = {}
+    for n in cfg['vector']:
+        vector = gen.coherence_vector(n, seed)
+        rounds = gen.deltas_stream(vector, 50, 10, seed)
+        path = os.path.join(tmp, f'reconcile_{n}.jsonl')
+
+        def seed_engine():
+            if os.path.exists(path):
+                os.remove(path)
+            engine = mod.ReconcileEngine(path)
+            engine.seed(vector)
+            return engine
+        secs, engine = timed(seed_engine, repeat)
+        out[f'reconcile_seed@{n}_s'] = secs
+        t0 = time.perf_counter()
+        for deltas in rounds:
+            engine.apply(deltas)
+        out[f'reconcile_apply@{n}_s'] = (time.perf_counter() - t0) / len(rounds)
+    return out
+
+
+BENCHMARKS = {
+    'scan': bench_scan,
+    'labels': bench_labels,
+    'keyword': bench_keyword,
+    'semantic': bench_semantic,
+    'reconcile': bench_reconcile,
+}
+
+
+def run(scale='small', seed=0, repeat=3, only=None):
+    cfg = SCALES[scale]
+    results, errors = {}, {}
+    with tempfile.TemporaryDirectory(prefix='addvar-bench-') as tmp:
+        for name, fn in BENCHMARKS.items():
+            if only and name not in only:
+                continue
+            try:
+                for metric, value in fn(cfg, seed, repeat, tmp).items():
+                    results[f'{name}.{metric}'] = value
+            except Exception as e:
+                errors[name] = f'{type(e).__name__}: {e}'
+    return {
+        'meta': {'scale': scale, 'seed': seed, 'repeat': repeat, 'python': platform.python_version(),
+                 'machine': platform.machine(), 'system': platform.system(),
+                 'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S')},
+        'results': results,
+        'errors': errors,
+    }
+
+
+def compare(current, baseline, tolerance, only=None):
+    """Rows (metric, baseline, current, ratio, regressed) for the baseline's timed metrics.
+
+    A metric missing from the current run gets current and ratio None and counts as
+    regressed, unless its benchmark was left out with `only`.
+    """
+    rows = []
+    for metric, base in sorted(baseline['results'].items()):
+        if not metric.endswith('_s') or not base or (only and metric.split('.', 1)[0] not in only):
+            continue
+        if metric not in current['results']:
+            rows.append((metric, base, None, None, True))
+            continue
+        value = current['results'][metric]
+        ratio = value / base
+        rows.append((metric, base, value, ratio, ratio > 1 + tolerance))
+    return rows
+
+
+def main():
+    p = argparse.ArgumentParser(description='Run the addvar benchmark suite.')
+    p.add_argument('--scale', choices=sorted(SCALES), default='small')
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--repeat', type=int, default=3)
+    p.add_argument('--only', default=None, help='comma-separated subset of: ' + ', '.join(BENCHMARKS))
+    p.add_argument('--out', default=None, help='write results JSON here')
+    p.add_argument('--compare', default=None, help='baseline JSON to compare against')
+    p.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown before a metric counts as a regression')
+    p.add_argument('--save-baseline', default=None, help='write these results as the new baseline')
+    args = p.parse_args()
+
+    only = set(args.only.split(',')) if args.only else None
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline['meta']['scale'] != args.scale or baseline['meta']['seed'] != args.seed:
+            raise SystemExit(f"baseline was recorded at scale={baseline['meta']['scale']} seed={baseline['meta']['seed']}")
+    current = run(args.scale, args.seed, args.repeat, only)
+
+    for metric, value in current['results'].items():
+        print(f'{metric:45s} {value:14.6f}' if isinstance(value, float) else f'{metric:45s} {value!s:>14}')
+    for name, err in current['errors'].items():
+        print(f'{name}: failed ({err})', file=sys.stderr)
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(current, f, indent=2, sort_keys=True)
+    if baseline is not None:
+        rows = compare(current, baseline, args.tolerance, only)
+        regressed = [r for r in rows if r[4] and r[2] is not None]
+        missing = [r for r in rows if r[2] is None]
+        print(f'\n{"metric":45s} {"baseline":>12s} {"current":>12s} {"ratio":>7s}')
+        for metric, base, value, ratio, bad in rows:
+            if value is None:
+                print(f'{metric:45s} {base:12.6f} {"-":>12s} {"-":>7s}  MISSING')
+            else:
+                print(f'{metric:45s} {base:12.6f} {value:12.6f} {ratio:6.2f}x{"  REGRESSION" if bad else ""}')
+        problems = []
+        if current['errors']:
+            problems.append(f"{len(current['errors'])} benchmark(s) failed: {', '.join(sorted(current['errors']))}")
+        if missing:
+            problems.append(f'{len(missing)} baseline metric(s) missing from this run')
+        if regressed:
+            problems.append(f'{len(regressed)} metric(s) slower than baseline by more than {args.tolerance:.0%}')
+        if problems:
+            raise SystemExit('; '.join(problems))
+
+
+if __name__ == '__main__':
+    main()
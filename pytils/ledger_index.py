@@ -0,0 +1,268 @@
+"""
+In-memory indexes over a semantic ledger (see schema/semanticledgar.json).
+
+LedgerIndex builds, once at load time:
+
+- tags:      tag name -> its semantic_tags record
+- by_class:  class    -> tag names of that class, in ledger order
+- by_id:     entry id -> entry
+- by_tag:    tag name -> ids of the entries carrying it (an entry's "tags"
+             list and/or its "tag" string)
+
+and keeps them current as entries and tags are added or removed, so
+"entries tagged X" and "tags of class Pillar" are dict lookups instead of a scan
+of the ledger. Positions in the ledger lists are indexed too: replacing an entry
+or tag is O(1), and a removed entry leaves a None hole in ledger["entries"] that
+compact() (run by save() and once holes outnumber entries) squeezes out.
+Entries without an "id" stay in the ledger but are not indexed (`skipped`);
+add_entry() rejects them with ValueError.
+
+save() writes the ledger plus a `<ledger>.index.json` sidecar with by_class,
+by_tag and the content hash of the ledger they were built from. load() reuses a
+matching sidecar for those two maps, which saves walking every entry's tags;
+the id and name maps still take one pass over the parsed ledger.
+
+    python pytils/ledger_index.py schema/semanticledgar.json --class Pillar
+    python pytils/ledger_index.py ledger.json --tag Resonance
+"""
+import argparse
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, List, Optional
+
+INDEX_VERSION = 1
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def entry_tags(entry: Dict) -> List[str]:
+    tags = entry.get('tags')
+    tags = list(tags) if isinstance(tags, list) else []
+    if isinstance(entry.get('tag'), str) and entry['tag'] not in tags:
+        tags.append(entry['tag'])
+    return tags
+
+
+def _has_id(entry) -> bool:
+    return isinstance(entry, dict) and 'id' in entry
+
+
+class LedgerIndex:
+    def __init__(self, ledger: Optional[Dict] = None, validator=None):
+        """
+        ledger: decoded ledger document (meta, semantic_tags, entries, ...).
+        validator: optional pytils.ledger_validate.Validator; entries added later
+        are checked against its entry schema and rejected with ValidationError.
+        """
+        self.ledger = ledger if ledger is not None else {}
+        self.ledger.setdefault('semantic_tags', [])
+        self.ledger.setdefault('entries', [])
+        self.validator = validator
+        self._rebuild()
+
+    def _rebuild(self, sidecar: Optional[Dict] = None):
+        self.tags: Dict[str, Dict] = {}
+        self.by_id: Dict[str, Dict] = {}
+        self._tag_pos: Dict[str, int] = {}  # tag name -> position in ledger['semantic_tags']
+        self._entry_pos: Dict[str, int] = {}  # entry id -> position in ledger['entries']
+        self._holes = 0
+        self.skipped = 0  # entries without an id
+        if sidecar is not None:
+            # dicts as ordered sets
+            self.by_class: Dict[str, Dict[str, None]] = {c: dict.fromkeys(n) for c, n in sidecar['by_class'].items()}
+            self.by_tag: Dict[str, Dict[str, None]] = {t: dict.fromkeys(i) for t, i in sidecar['by_tag'].items()}
+        else:
+            self.by_class, self.by_tag = {}, {}
+        for pos, tag in enumerate(self.ledger['semantic_tags']):
+            if sidecar is None:
+                self._index_tag(tag, pos)
+            else:
+                self.tags[tag['tag']] = tag
+                self._tag_pos[tag['tag']] = pos
+        for pos, entry in enumerate(self.ledger['entries']):
+            if not _has_id(entry):
+                self.skipped += entry is not None
+                continue
+            if sidecar is None:
+                self._index_entry(entry, pos)
+            else:
+                self.by_id[entry['id']] = entry
+                self._entry_pos[entry['id']] = pos
+
+    # ---- indexing ----
+
+    def _index_tag(self, tag: Dict, pos: int):
+        name = tag['tag']
+        if name not in self.tags:
+            self.by_class.setdefault(tag.get('class', ''), {})[name] = None
+        self.tags[name] = tag
+        self._tag_pos[name] = pos
+
+    def _index_entry(self, entry: Dict, pos: int):
+        self.by_id[entry['id']] = entry
+        self._entry_pos[entry['id']] = pos
+        for name in entry_tags(entry):
+            self.by_tag.setdefault(name, {})[entry['id']] = None
+
+    def _unindex_entry(self, entry: Dict):
+        del self.by_id[entry['id']]
+        del self._entry_pos[entry['id']]
+        for name in entry_tags(entry):
+            ids = self.by_tag.get(name)
+            if ids is not None:
+                ids.pop(entry['id'], None)
+                if not ids:
+                    del self.by_tag[name]
+
+    # ---- updates ----
+
+    def add_tag(self, tag: Dict):
+        """Add a semantic tag, or replace the one with the same name (keeping its class slot)."""
+        name = tag['tag']
+        tags = self.ledger['semantic_tags']
+        old = self.tags.get(name)
+        if old is not None:
+            if old.get('class', '') != tag.get('class', ''):
+                names = self.by_class[old.get('class', '')]
+                del names[name]
+                if not names:
+                    del self.by_class[old.get('class', '')]
+                self.by_class.setdefault(tag.get('class', ''), {})[name] = None
+            pos = self._tag_pos[name]
+            tags[pos] = tag
+        else:
+            pos = len(tags)
+            tags.append(tag)
+        self._index_tag(tag, pos)
+
+    def add_entry(self, entry: Dict):
+        """Add an entry, or replace the entry with the same id."""
+        if not _has_id(entry):
+            raise ValueError("ledger entry has no 'id'")
+        if self.validator is not None:
+            self.validator.entry_validator().validate(entry)
+        entries = self.ledger['entries']
+        old = self.by_id.get(entry['id'])
+        if old is not None:
+            pos = self._entry_pos[entry['id']]
+            self._unindex_entry(old)
+            entries[pos] = entry
+        else:
+            pos = len(entries)
+            entries.append(entry)
+        self._index_entry(entry, pos)
+
+    def extend(self, entries: Iterable[Dict]):
+        for entry in entries:
+            self.add_entry(entry)
+
+    def remove_entry(self, entry_id: str) -> bool:
+        entry = self.by_id.get(entry_id)
+        if entry is None:
+            return False
+        pos = self._entry_pos[entry_id]
+        self._unindex_entry(entry)
+        entries = self.ledger['entries']
+        entries[pos] = None  # hole, squeezed out by compact()
+        self._holes += 1
+        if self._holes * 2 > len(entries):
+            self.compact()
+        return True
+
+    def compact(self):
+        """Drop the holes removed entries left in ledger['entries'] and renumber positions."""
+        if not self._holes:
+            return
+        entries = self.ledger['entries']
+        entries[:] = [entry for entry in entries if entry is not None]
+        for pos, entry in enumerate(entries):
+            if _has_id(entry) and self.by_id.get(entry['id']) is entry:
+                self._entry_pos[entry['id']] = pos
+        self._holes = 0
+
+    # ---- queries ----
+
+    def entries_tagged(self, tag: str) -> List[Dict]:
+        return [self.by_id[i] for i in self.by_tag.get(tag, ())]
+
+    def tags_of_class(self, cls: str) -> List[Dict]:
+        return [self.tags[name] for name in self.by_class.get(cls, ())]
+
+    def entry(self, entry_id: str) -> Optional[Dict]:
+        return self.by_id.get(entry_id)
+
+    def tag(self, name: str) -> Optional[Dict]:
+        return self.tags.get(name)
+
+    # ---- persistence ----
+
+    def to_sidecar(self, digest: str) -> Dict:
+        return {
+            'version': INDEX_VERSION,
+            'ledger_sha1': digest,
+            'by_class': {cls: list(names) for cls, names in self.by_class.items()},
+            'by_tag': {name: list(ids) for name, ids in self.by_tag.items()},
+        }
+
+    def save(self, path: str):
+        """Write the ledger and its `.index.json` sidecar (each via a temp file)."""
+        self.compact()
+        data = json.dumps(self.ledger, indent=2, ensure_ascii=False).encode('utf-8')
+        for target, payload in ((path, data),
+                                (path + '.index.json',
+                                 json.dumps(self.to_sidecar(_digest(data)), ensure_ascii=False,
+                                            separators=(',', ':')).encode('utf-8'))):
+            tmp = target + '.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp, target)
+
+    @classmethod
+    def load(cls, path: str, validator=None) -> 'LedgerIndex':
+        """Load a ledger; its sidecar supplies the tag/class maps if it matches the file."""
+        with open(path, 'rb') as f:
+            data = f.read()
+        ledger = json.loads(data)
+        sidecar = None
+        try:
+            with open(path + '.index.json', 'r', encoding='utf-8') as f:
+                sidecar = json.load(f)
+        except (OSError, ValueError):
+            pass
+        if not sidecar or sidecar.get('version') != INDEX_VERSION or sidecar.get('ledger_sha1') != _digest(data):
+            return cls(ledger, validator)
+        index = cls.__new__(cls)
+        index.ledger = ledger
+        ledger.setdefault('semantic_tags', [])
+        ledger.setdefault('entries', [])
+        index.validator = validator
+        index._rebuild(sidecar)
+        return index
+
+
+def main():
+    p = argparse.ArgumentParser(description='Query a semantic ledger through its tag indexes.')
+    p.add_argument('path')
+    p.add_argument('--tag', help='print the entries carrying this tag')
+    p.add_argument('--class', dest='cls', help='print the tags of this class')
+    p.add_argument('--write-index', action='store_true', help='(re)write the .index.json sidecar')
+    args = p.parse_args()
+    index = LedgerIndex.load(args.path)
+    if args.tag:
+        for entry in index.entries_tagged(args.tag):
+            print(json.dumps(entry, ensure_ascii=False))
+    if args.cls:
+        for tag in index.tags_of_class(args.cls):
+            print(json.dumps(tag, ensure_ascii=False))
+    if args.write_index:
+        with open(args.path, 'rb') as f:
+            digest = _digest(f.read())
+        with open(args.path + '.index.json', 'w', encoding='utf-8') as f:
+            json.dump(index.to_sidecar(digest), f, ensure_ascii=False, separators=(',', ':'))
+
+
+if __name__ == '__main__':
+    main()
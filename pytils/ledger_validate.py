@@ -0,0 +1,370 @@
+"""
+Compiled validators for the ledger and doctrine schemas in /schema.
+
+Each schema is compiled once into a tree of small check functions: `$ref`s into
+`$defs` (or any local JSON pointer) are resolved at compile time, `pattern`s are
+precompiled regexes, and the result is cached per file (keyed by path and
+mtime), so validating many documents or entries costs only the checks
+themselves. Supported keywords are the ones the ledger schemas use plus the
+usual simple ones: type, required, properties, additionalProperties, items,
+enum, const, pattern, min/maxLength, min/maxItems, minimum/maximum, $ref.
+A schema using anything else is handed to `jsonschema` if it is installed.
+
+schema-doctrine.json is a doctrine definition rather than a JSON Schema; its
+`schema_fields` become the required string fields of a doctrine record.
+
+    python pytils/ledger_validate.py schema/semanticledgar.json
+    python pytils/ledger_validate.py big_ledger.json --entries   # stream entries only
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import ijson
+except Exception:
+    ijson = None
+
+try:
+    import jsonschema
+except Exception:
+    jsonschema = None
+
+SCHEMA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'schema')
+BASE_SCHEMA = os.path.join(SCHEMA_DIR, 'ledgar-base.schema.json')
+DOCTRINE_SCHEMA = os.path.join(SCHEMA_DIR, 'schema-doctrine.json')
+
+# keywords that only annotate and never fail
+_ANNOTATIONS = {'$schema', '$id', '$defs', 'definitions', 'title', 'description', '$comment', 'default', 'examples'}
+_TYPES = {
+    'object': lambda v: isinstance(v, dict),
+    'array': lambda v: isinstance(v, list),
+    'string': lambda v: isinstance(v, str),
+    'boolean': lambda v: isinstance(v, bool),
+    'null': lambda v: v is None,
+    'number': lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    'integer': lambda v: (isinstance(v, int) and not isinstance(v, bool)) or (isinstance(v, float) and v.is_integer()),
+}
+_CLASSES = {'object': dict, 'array': list, 'string': str, 'null': type(None)}
+
+Check = Callable[[object, str, list], None]
+
+
+class SchemaError(Exception):
+    pass
+
+
+class ValidationError(ValueError):
+    def __init__(self, errors: List[Tuple[str, str]]):
+        self.errors = errors
+        super().__init__('; '.join(f"{path or '/'}: {msg}" for path, msg in errors))
+
+
+def _pointer(root: Dict, pointer: str):
+    """The node a local `$ref` points at."""
+    if not pointer.startswith('#'):
+        raise SchemaError(f'only local $refs are supported: {pointer}')
+    node = root
+    for part in filter(None, pointer[1:].split('/')):
+        part = part.replace('~1', '/').replace('~0', '~')
+        try:
+            node = node[part]
+        except (KeyError, TypeError):
+            raise SchemaError(f'unresolvable $ref {pointer}')
+    return node
+
+
+def _deref(root: Dict, node):
+    """Follow `$ref`s until a schema that has its own keywords."""
+    seen = set()
+    while isinstance(node, dict) and '$ref' in node and node['$ref'] not in seen:
+        seen.add(node['$ref'])
+        node = _pointer(root, node['$ref'])
+    return node
+
+
+def json_equal(a, b) -> bool:
+    """Equality as JSON Schema defines it for enum/const: true is not 1, but 1 equals 1.0."""
+    if isinstance(a, bool) or isinstance(b, bool):
+        return isinstance(a, bool) and isinstance(b, bool) and a == b
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return a == b
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(json_equal(x, y) for x, y in zip(a, b))
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(json_equal(a[k], b[k]) for k in a)
+    return type(a) is type(b) and a == b
+
+
+class _Compiler:
+    def __init__(self, root: Dict):
+        self.root = root
+        self.refs: Dict[str, Check] = {}
+
+    def ref(self, pointer: str) -> Check:
+        if pointer not in self.refs:
+            self.refs[pointer] = None  # placeholder, so recursive refs terminate
+            self.refs[pointer] = self.compile(_pointer(self.root, pointer))
+        refs = self.refs
+        return lambda v, path, errors: refs[pointer](v, path, errors)
+
+    def compile(self, schema) -> Check:
+        if schema is True or schema == {}:
+            return lambda v, path, errors: None
+        if schema is False:
+            return lambda v, path, errors: errors.append((path, 'no value is allowed here'))
+        unknown = set(schema) - _ANNOTATIONS - {
+            'type', 'required', 'properties', 'additionalProperties', 'items', 'enum', 'const',
+            'pattern', 'minLength', 'maxLength', 'minItems', 'maxItems', 'minimum', 'maximum', '$ref'}
+        if unknown:
+            raise SchemaError('unsupported keywords: ' + ', '.join(sorted(unknown)))
+        checks: List[Check] = []
+        if '$ref' in schema:
+            checks.append(self.ref(schema['$ref']))
+        if 'type' in schema:
+            checks.append(self._type(schema['type']))
+        if 'enum' in schema:
+            options = schema['enum']
+            if all(isinstance(o, str) for o in options):
+                # the usual case, string-only enums: one set lookup
+                names = frozenset(options)
+                checks.append(lambda v, path, errors: None if isinstance(v, str) and v in names
+                              else errors.append((path, f'not one of {options}')))
+            else:
+                checks.append(lambda v, path, errors: None if any(json_equal(v, o) for o in options)
+                              else errors.append((path, f'not one of {options}')))
+        if 'const' in schema:
+            const = schema['const']
+            checks.append(lambda v, path, errors: None if json_equal(v, const)
+                          else errors.append((path, f'expected {const!r}')))
+        checks.extend(self._string(schema))
+        checks.extend(self._number(schema))
+        checks.extend(self._array(schema))
+        checks.extend(self._object(schema))
+        if len(checks) == 1:
+            return checks[0]
+
+        def check_all(v, path, errors):
+            for c in checks:
+                c(v, path, errors)
+        return check_all
+
+    def _type(self, names) -> Check:
+        names = names if isinstance(names, list) else [names]
+        expected = ' or '.join(names)
+        if not {'number', 'integer', 'boolean'} & set(names):
+            # plain isinstance is the hot path for string/object/array fields
+            classes = tuple(_CLASSES[n] for n in names)
+            return lambda v, path, errors: None if isinstance(v, classes) else errors.append((path, f'expected {expected}'))
+        tests = [_TYPES[n] for n in names]
+        return lambda v, path, errors: None if any(t(v) for t in tests) else errors.append((path, f'expected {expected}'))
+
+    def _string(self, schema) -> List[Check]:
+        checks = []
+        if 'pattern' in schema:
+            search = re.compile(schema['pattern']).search
+            pattern = schema['pattern']
+            checks.append(lambda v, path, errors: None if not isinstance(v, str) or search(v)
+                          else errors.append((path, f'does not match {pattern}')))
+        lo, hi = schema.get('minLength'), schema.get('maxLength')
+        if lo is not None or hi is not None:
+            lo, hi = lo or 0, float('inf') if hi is None else hi
+
+            def length(v, path, errors):
+                if isinstance(v, str) and not lo <= len(v) <= hi:
+                    errors.append((path, f'length {len(v)} outside [{lo}, {hi}]'))
+            checks.append(length)
+        return checks
+
+    def _number(self, schema) -> List[Check]:
+        lo, hi = schema.get('minimum'), schema.get('maximum')
+        if lo is None and hi is None:
+            return []
+
+        def bounds(v, path, errors):
+            if _TYPES['number'](v) and ((lo is not None and v < lo) or (hi is not None and v > hi)):
+                errors.append((path, f'{v} outside [{lo}, {hi}]'))
+        return [bounds]
+
+    def _array(self, schema) -> List[Check]:
+        checks = []
+        lo, hi = schema.get('minItems'), schema.get('maxItems')
+        if lo is not None or hi is not None:
+            lo, hi = lo or 0, float('inf') if hi is None else hi
+
+            def size(v, path, errors):
+                if isinstance(v, list) and not lo <= len(v) <= hi:
+                    errors.append((path, f'{len(v)} items outside [{lo}, {hi}]'))
+            checks.append(size)
+        if 'items' in schema:
+            item = self.compile(schema['items'])
+
+            def items(v, path, errors):
+                if isinstance(v, list):
+                    for i, x in enumerate(v):
+                        item(x, f'{path}/{i}', errors)
+            checks.append(items)
+        return checks
+
+    def _object(self, schema) -> List[Check]:
+        checks = []
+        required = schema.get('required')
+        if required:
+            def present(v, path, errors):
+                if isinstance(v, dict):
+                    for key in required:
+                        if key not in v:
+                            errors.append((f'{path}/{key}', 'required property missing'))
+            checks.append(present)
+        props = {k: self.compile(s) for k, s in schema.get('properties', {}).items()}
+        extra = schema.get('additionalProperties', True)
+        extra = None if extra is True else self.compile(extra)
+        if props or extra is not None:
+            def members(v, path, errors):
+                if not isinstance(v, dict):
+                    return
+                for key, value in v.items():
+                    check = props.get(key, extra)
+                    if check is not None:
+                        check(value, f'{path}/{key}', errors)
+            checks.append(members)
+        return checks
+
+
+class Validator:
+    """A compiled schema. errors() lists (json-pointer, message) pairs for an instance."""
+
+    def __init__(self, schema: Dict, root: Optional[Dict] = None):
+        """root: the document `schema` was taken from, when its $refs point into it."""
+        self.schema = schema
+        self._jsonschema = None
+        root = schema if root is None else root
+        try:
+            self._check = _Compiler(root).compile(schema)
+        except SchemaError:
+            if jsonschema is None:
+                raise
+            if root is not schema and '$defs' in root:
+                schema = dict(schema, **{'$defs': root['$defs']})  # keep #/$defs refs resolvable
+            cls = jsonschema.validators.validator_for(schema)
+            self._jsonschema = cls(schema)
+            self._check = self._check_jsonschema
+        self._entry: Optional['Validator'] = None
+
+    def _check_jsonschema(self, v, path, errors):
+        for e in self._jsonschema.iter_errors(v):
+            errors.append((path + ''.join(f'/{p}' for p in e.absolute_path), e.message))
+
+    def errors(self, instance, path: str = '') -> List[Tuple[str, str]]:
+        errors: List[Tuple[str, str]] = []
+        self._check(instance, path, errors)
+        return errors
+
+    def is_valid(self, instance) -> bool:
+        return not self.errors(instance)
+
+    def validate(self, instance):
+        errors = self.errors(instance)
+        if errors:
+            raise ValidationError(errors)
+
+    def entry_validator(self) -> 'Validator':
+        """Validator for one item of the ledger's `entries` array."""
+        if self._entry is None:
+            root = _deref(self.schema, self.schema)
+            entries = _deref(self.schema, root.get('properties', {}).get('entries', {}))
+            self._entry = Validator(_deref(self.schema, entries.get('items', {})), root=self.schema)
+        return self._entry
+
+    def validate_entries(self, entries: Iterable, start: int = 0) -> Iterator[Tuple[int, List[Tuple[str, str]]]]:
+        """Yield (index, errors) for each invalid entry; works on any iterable, so it streams."""
+        check = self.entry_validator()._check
+        for i, entry in enumerate(entries, start):
+            errors: List[Tuple[str, str]] = []
+            check(entry, f'/entries/{i}', errors)
+            if errors:
+                yield i, errors
+
+
+def doctrine_schema(doctrine: Dict) -> Dict:
+    """JSON Schema for doctrine records: every `schema_fields` key is a required string."""
+    fields = doctrine.get('schema_fields', {})
+    return {
+        'type': 'object',
+        'required': list(fields),
+        'properties': {name: {'type': 'string', 'description': desc} for name, desc in fields.items()},
+        'additionalProperties': True,
+    }
+
+
+_cache: Dict[str, Tuple[int, Validator]] = {}
+
+
+def load_validator(path: str = BASE_SCHEMA) -> Validator:
+    """Compiled validator for a schema file, cached until the file changes."""
+    path = os.path.abspath(path)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'r', encoding='utf-8') as f:
+        schema = json.load(f)
+    if schema.get('object_type') == 'doctrine':
+        schema = doctrine_schema(schema)
+    validator = Validator(schema)
+    _cache[path] = (mtime, validator)
+    return validator
+
+
+def schema_for(document: Dict, document_path: str) -> str:
+    """Schema file a ledger names in "$schema" (relative to the ledger), else the base schema."""
+    ref = document.get('$schema')
+    if isinstance(ref, str) and not ref.startswith(('http://', 'https://')):
+        candidate = os.path.join(os.path.dirname(os.path.abspath(document_path)), ref)
+        if os.path.exists(candidate):
+            return candidate
+    return BASE_SCHEMA
+
+
+def validate_file(path: str, schema_path: Optional[str] = None) -> List[Tuple[str, str]]:
+    """All errors in a ledger file, checked against its own or the given schema."""
+    with open(path, 'r', encoding='utf-8') as f:
+        document = json.load(f)
+    return load_validator(schema_path or schema_for(document, path)).errors(document)
+
+
+def iter_entry_errors(path: str, schema_path: str = BASE_SCHEMA) -> Iterator[Tuple[int, List[Tuple[str, str]]]]:
+    """Stream a ledger's `entries` (with ijson when installed) and yield (index, errors) per bad entry."""
+    validator = load_validator(schema_path)
+    with open(path, 'rb') as f:
+        if ijson is not None:
+            yield from validator.validate_entries(ijson.items(f, 'entries.item', use_float=True))
+        else:
+            yield from validator.validate_entries(json.load(f).get('entries', []))
+
+
+def main():
+    p = argparse.ArgumentParser(description='Validate ledgers against the compiled ledger schemas.')
+    p.add_argument('paths', nargs='+')
+    p.add_argument('--schema', default=None, help="schema file (default: the ledger's $schema, else the base schema)")
+    p.add_argument('--entries', action='store_true', help='only stream and check the entries array')
+    args = p.parse_args()
+    bad = 0
+    for path in args.paths:
+        if args.entries:
+            errors = [e for _, errs in iter_entry_errors(path, args.schema or BASE_SCHEMA) for e in errs]
+        else:
+            errors = validate_file(path, args.schema)
+        for pointer, msg in errors:
+            print(f'{path}:{pointer or "/"}: {msg}')
+        bad += bool(errors)
+        if not errors:
+            print(f'{path}: ok')
+    sys.exit(1 if bad else 0)
+
+
+if __name__ == '__main__':
+    main()